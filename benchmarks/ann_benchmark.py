@@ -0,0 +1,92 @@
+"""Compare ANN backends against exact search
+
+reports build time, index memory, single-query p50/p99 latency and recall@k for each
+backend. Vectors come from a stored index (--embeddings index_store/embeddings.npy) or
+are generated as clustered random vectors, e.g. to size the 500k catalogue:
+
+    python benchmarks/ann_benchmark.py --num 500000 --dim 384
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ann import IndexConfig, build_ann_index, index_memory  # noqa: E402
+from src.embedding import normalize_rows  # noqa: E402
+
+
+def synthetic_vectors(num, dim, seed=0):
+    """clustered gaussian vectors, closer to sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, num // 100), dim)).astype('float32')
+    vectors = centers[rng.integers(0, len(centers), num)] + 0.3 * rng.normal(size=(num, dim)).astype('float32')
+    return vectors.astype('float32')
+
+
+def recall_at_k(found, expected):
+    hits = sum(len(set(f[f >= 0]) & set(e)) for f, e in zip(found, expected))
+    return hits / expected.size
+
+
+def run(backend, vectors, queries, expected, k, args):
+    config = IndexConfig(backend=backend, ef_search=args.ef_search, nprobe=args.nprobe)
+    start = time.perf_counter()
+    index, _ = build_ann_index(config, vectors.shape[1], vectors)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    found = np.empty((len(queries), k), dtype='int64')
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, labels = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        found[i] = labels[0]
+
+    return {
+        'backend': backend,
+        'build_s': build_seconds,
+        'memory_mb': index_memory(index) / 2 ** 20,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        f'recall@{k}': recall_at_k(found, expected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', help='.npy file of vectors, e.g. index_store/embeddings.npy')
+    parser.add_argument('--num', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--ef-search', type=int, default=64)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--backends', default='flat,hnsw,ivfpq,sq8')
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = normalize_rows(np.load(args.embeddings))
+    else:
+        vectors = normalize_rows(synthetic_vectors(args.num, args.dim))
+    rng = np.random.default_rng(1)
+    # queries are perturbed corpus vectors, like a query close to a known profile
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = normalize_rows(queries + 0.05 * rng.normal(size=queries.shape))
+
+    exact, _ = build_ann_index(IndexConfig(backend='flat'), vectors.shape[1], vectors)
+    _, expected = exact.search(queries, args.k)
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, "
+          f"auto backend: {IndexConfig().resolve(len(vectors))}")
+    print(f"{'backend':<8} {'build s':>9} {'memory MB':>10} {'p50 ms':>8} {'p99 ms':>8} {'recall@' + str(args.k):>10}")
+    for backend in args.backends.split(','):
+        row = run(backend, vectors, queries, expected, args.k, args)
+        print(f"{row['backend']:<8} {row['build_s']:>9.2f} {row['memory_mb']:>10.1f} "
+              f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {row[f'recall@{args.k}']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Export the model to ONNX and check it against the PyTorch encoder
+
+reports cosine agreement between the two encoders' query vectors, recall@k over the
+stored index vectors (--embeddings index_store/embeddings.npy, built with PyTorch),
+single-query encode latency and the memory each encoder adds to the process. Serve
+the export with ENCODER_BACKEND=onnx ENCODER_PATH=onnx_encoder once the numbers hold:
+
+    python benchmarks/encoder_consistency.py --export --embeddings index_store/embeddings.npy
+"""
+import os
+import sys
+import json
+import argparse
+import resource
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.encoders import OnnxEncoder, check_consistency, export_onnx, load_encoder  # noqa: E402
+
+# used when no --queries file is given, the kind of text /search receives
+SAMPLE_QUERIES = [
+    "left-footed Brazilian strikers under 25", "Show me strikers from Brazil", "Players who played for Barcelona",
+    "Top scorers in Premier League", "Defenders born after 1995", "tall centre back good in the air",
+    "creative attacking midfielder with many assists", "young goalkeeper", "Lionel Messi", "Cristiano Ronaldo",
+    "Kylian Mbappe", "Erling Haaland", "box-to-box midfielder who wins duels", "fast winger who dribbles a lot",
+    "French defender playing in Spain", "German midfielders", "experienced right back", "clinical finisher",
+    "players with many yellow cards", "Argentinian forward at Manchester City", "Dutch centre halves",
+    "Portuguese playmaker", "high xG striker", "ball-winning defensive midfielder",
+]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--onnx-dir', default='onnx_encoder')
+    parser.add_argument('--export', action='store_true', help='export the model to --onnx-dir first')
+    parser.add_argument('--no-quantize', action='store_true', help='export the float graph only')
+    parser.add_argument('--queries', help='text file, one query per line')
+    parser.add_argument('--embeddings', help='.npy index vectors to measure recall over')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=0, help='ONNX Runtime intra-op threads, 0 for its default')
+    args = parser.parse_args()
+
+    if args.export:
+        config = export_onnx(args.model, args.onnx_dir, quantize=not args.no_quantize)
+        print(f"exported to {args.onnx_dir}: {json.dumps(config)}")
+        # a fresh process measures memory without the exporter's torch model
+        return
+
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as file:
+            queries = [line.strip() for line in file if line.strip()]
+    else:
+        queries = SAMPLE_QUERIES
+    corpus = np.load(args.embeddings, mmap_mode='r') if args.embeddings else None
+
+    # the ONNX encoder loads first, so each peak RSS step is that encoder's own footprint
+    baseline = peak_rss_mb()
+    candidate = OnnxEncoder(args.onnx_dir, threads=args.threads or None)
+    candidate.encode(queries[:1])
+    onnx_mb = peak_rss_mb() - baseline
+    reference = load_encoder(args.model)
+    reference.encode(queries[:1])
+    torch_mb = peak_rss_mb() - baseline - onnx_mb
+
+    report = check_consistency(reference, candidate, queries, corpus, k=args.k)
+    report.update(
+        onnx_file='int8' if candidate.quantized else 'float',
+        reference_mb=round(torch_mb, 1),
+        candidate_mb=round(onnx_mb, 1),
+    )
+    for key, value in report.items():
+        print(f"{key:<24} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Resident memory of player metadata: raw dicts vs the columnar PlayerStore
+
+loads the player file twice under tracemalloc, once kept as the parsed dicts the
+engine used to hold and once compacted into a PlayerStore, then checks every record
+round-trips unchanged:
+
+    python benchmarks/metadata_memory.py summary_player_info.json
+"""
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.player_store import PlayerStore  # noqa: E402
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_path', nargs='?', default='summary_player_info.json')
+    args = parser.parse_args()
+
+    def load():
+        with open(args.data_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def compact():
+        players = load()
+        store = PlayerStore()
+        store.extend([player.get('playerId', '') for player in players], players)
+        return store
+
+    players, dict_bytes, dict_seconds = measure(load)
+    store, store_bytes, store_seconds = measure(compact)
+
+    mismatches = sum(store.record(row) != player for row, player in enumerate(players))
+    count = len(players)
+    print(f"{count} players, {store.stats.num_rows} season rows")
+    print(f"{'layout':<12} {'total MB':>9} {'bytes/player':>13} {'build s':>8}")
+    print(f"{'dicts':<12} {dict_bytes / 2 ** 20:>9.1f} {dict_bytes / count:>13.0f} {dict_seconds:>8.2f}")
+    print(f"{'PlayerStore':<12} {store_bytes / 2 ** 20:>9.1f} {store_bytes / count:>13.0f} {store_seconds:>8.2f}")
+    print(f"reduction: {dict_bytes / store_bytes:.1f}x, records differing after round trip: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Scaling of the preprocessing pipeline on synthetic raw dumps
+
+generates clubs, nationalities, players and season rows at doubling sizes, times
+PreProcessing.process_all_data and reports the cost per season row, which stays flat
+when the pipeline is linear. Up to --baseline-max players the per-player scan the
+merge step used before is timed too and its output compared with the pipeline's:
+
+    python benchmarks/preprocessing_scaling.py --players 5000 --doublings 6 --seasons 8
+"""
+import os
+import sys
+import copy
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.preprocessing import PreProcessing  # noqa: E402
+
+
+def synthetic_dump(num_players, seasons_per_player, num_clubs=500, seed=0):
+    rng = random.Random(seed)
+    countries = [{"countryId": f"C{i}", "name": f"Country {i}", "demonym": f"Demonym {i}"} for i in range(200)]
+    clubs = [{"clubId": i, "clubName": f"Club {i}", "country": rng.choice(countries)["name"]} for i in range(num_clubs)]
+    players, stats = [], []
+    for player_id in range(num_players):
+        players.append({
+            "playerId": player_id,
+            "fullName": f"Player {player_id}",
+            "nationalityISO": rng.choice(countries)["countryId"],
+            "heightCm": str(rng.randint(160, 200)),
+            "weightKg": str(rng.randint(60, 95)),
+            "dateOfBirth": f"{rng.randint(1980, 2006)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        })
+        club_id = rng.randrange(num_clubs)
+        for season in range(rng.randint(1, 2 * seasons_per_player - 1)):
+            if rng.random() < 0.2:
+                club_id = rng.randrange(num_clubs)
+            stats.append({
+                "playerId": player_id, "clubId": club_id, "seasonId": 2000 + season,
+                "appearances": rng.randint(0, 38), "goals": rng.randint(0, 20), "assists": rng.choice([None, 3]),
+            })
+    rng.shuffle(stats)  # dumps are ordered by season or club, not by player
+    return clubs, countries, players, stats
+
+
+def quadratic_merge(players, player_stats):
+    """the merge step as it was: one scan of every season row per player"""
+    merged = []
+    for player in players:
+        rows = [s for s in player_stats if s["playerId"] == player["playerId"]]
+        merged.append({
+            **player,
+            "season_statistics": rows,
+            "total_seasons": len(rows),
+            "career_goals": sum(stat.get("goals", 0) or 0 for stat in rows),
+            "career_assists": sum(stat.get("assists", 0) or 0 for stat in rows),
+        })
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=5000, help='players at the smallest size')
+    parser.add_argument('--doublings', type=int, default=5)
+    parser.add_argument('--seasons', type=int, default=8, help='average season rows per player')
+    parser.add_argument('--baseline-max', type=int, default=5000, help='largest size the old merge is timed at')
+    args = parser.parse_args()
+
+    print(f"{'players':>9} {'rows':>10} {'pipeline s':>11} {'us/row':>8} {'old merge s':>12} {'same output':>12}")
+    for step in range(args.doublings):
+        num_players = args.players * 2 ** step
+        clubs, nationalities, players, stats = synthetic_dump(num_players, args.seasons, seed=step)
+        baseline_players = copy.deepcopy(players) if num_players <= args.baseline_max else None
+
+        start = time.perf_counter()
+        processor = PreProcessing(clubs, nationalities, players, stats)
+        processed = processor.process_all_data()
+        seconds = time.perf_counter() - start
+
+        baseline, same = '-', '-'
+        if baseline_players is not None:
+            reference = PreProcessing(clubs, nationalities, baseline_players, stats)
+            enriched = reference.preprocess_player_data()
+            start = time.perf_counter()
+            merged = quadratic_merge(enriched, stats)
+            baseline = f"{time.perf_counter() - start:.2f}"
+            same = str([reference.normalize_data_types(p) for p in merged] == processed)
+
+        print(f"{num_players:>9} {len(stats):>10} {seconds:>11.2f} {seconds / len(stats) * 1e6:>8.2f} "
+              f"{baseline:>12} {same:>12}")
+
+
+if __name__ == '__main__':
+    main()
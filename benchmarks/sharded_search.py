@@ -0,0 +1,110 @@
+"""Serve the players from local shard processes and compare with a single index
+
+partitions the data file (--by hash or league), starts one shard process per partition
+(indexes under --work-dir, built on the first run) and sends the same queries to the
+scatter-gather coordinator and to one in-process index over all players. Reports how
+much of the top k agrees, the largest score difference on shared results and the p50/p99
+latency of both:
+
+    python benchmarks/sharded_search.py --data summary_player_info.json --shards 4
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.encoder_consistency import SAMPLE_QUERIES  # noqa: E402
+from src.ann import IndexConfig  # noqa: E402
+from src.cache import LRUCache  # noqa: E402
+from src.embedding import load_model  # noqa: E402
+from src.sharding import ShardedSearch, partition_players, start_local_shards  # noqa: E402
+from src.storage import IndexStore, open_search  # noqa: E402
+
+
+def timed_call(latencies, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    latencies.append((time.perf_counter() - start) * 1000.0)
+    return result
+
+
+def compare(expected, found, score_field):
+    """share of the expected players found, largest score difference among them"""
+    expected_scores = {result['player_id']: result[score_field] for result in expected}
+    found_scores = {result['player_id']: result[score_field] for result in found}
+    shared = expected_scores.keys() & found_scores.keys()
+    overlap = len(shared) / len(expected_scores) if expected_scores else 1.0
+    difference = max((abs(expected_scores[i] - found_scores[i]) for i in shared), default=0.0)
+    return overlap, difference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='summary_player_info.json')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--by', default='hash', help="'hash', 'league' or a dotted player field")
+    parser.add_argument('--work-dir', default='shards')
+    parser.add_argument('--backend', default='flat', help='vector index backend of every index')
+    parser.add_argument('--fusion', default='weighted', choices=('weighted', 'rrf'))
+    parser.add_argument('--queries', help='text file, one query per line')
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as file:
+            queries = [line.strip() for line in file if line.strip()]
+    else:
+        queries = SAMPLE_QUERIES
+
+    index_config = IndexConfig(backend=args.backend)
+    start = time.perf_counter()
+    paths = partition_players(args.data, os.path.join(args.work_dir, 'data'), args.shards, by=args.by)
+    processes, addresses = start_local_shards(
+        paths, os.path.join(args.work_dir, 'indexes'), args.model, index_config=index_config
+    )
+    print(f"{args.shards} shards serving after {time.perf_counter() - start:.1f}s")
+
+    model = load_model(args.model)
+    sharded = ShardedSearch(addresses, args.model, model=model, fusion=args.fusion)
+    try:
+        single = open_search(args.data, IndexStore(os.path.join(args.work_dir, 'single')), args.model, model=model,
+                             index_config=index_config, fusion=args.fusion)
+        # the serving path encodes case-normalized queries through this cache, as the coordinator does
+        single.embedding_engine.query_embedding_cache = LRUCache(maxsize=len(queries))
+        print(f"players per shard: {[info['players'] for info in sharded.shards]}, "
+              f"single index: {single.embedding_engine.live_count}")
+
+        report = {}
+        for name, score_field, run_single, run_sharded in (
+            ('hybrid', 'combined_score', single.hybrid_search, sharded.hybrid_search),
+            ('semantic', 'similarity_score', single.semantic_search, sharded.semantic_search),
+        ):
+            single_ms, sharded_ms, overlaps, differences = [], [], [], []
+            for query in queries:
+                expected = timed_call(single_ms, run_single, query, args.k)
+                found = timed_call(sharded_ms, run_sharded, query, args.k)
+                overlap, difference = compare(expected, found, score_field)
+                overlaps.append(overlap)
+                differences.append(difference)
+            report[name] = {
+                f'overlap@{args.k}': round(float(np.mean(overlaps)), 4),
+                'max_score_diff': float(max(differences)),
+                'single_p50_ms': round(float(np.percentile(single_ms, 50)), 2),
+                'single_p99_ms': round(float(np.percentile(single_ms, 99)), 2),
+                'sharded_p50_ms': round(float(np.percentile(sharded_ms, 50)), 2),
+                'sharded_p99_ms': round(float(np.percentile(sharded_ms, 99)), 2),
+            }
+        for name, row in report.items():
+            print(f"{name:<10} " + "  ".join(f"{key} {value}" for key, value in row.items()))
+    finally:
+        sharded.close(shutdown=True)
+        for process in processes:
+            process.join(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
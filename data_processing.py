@@ -1,18 +1,39 @@
-from src.utils import load_json, save_json 
+import argparse
+from src.utils import load_json, save_json
 from src.preprocessing import PreProcessing
+from src.streaming import run_streaming_pipeline
 
 
-if __name__ == "__main__": 
-    # load raw data files 
-    clubs = load_json("raw_data/clubs.json")
-    nationalities = load_json("raw_data/nationalities.json")
-    players = load_json("raw_data/players.json")
-    player_stats = load_json("raw_data/player_season_stats.json")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess the raw dumps into the player summary")
+    parser.add_argument('--raw-dir', default='raw_data')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream the dumps through a process pool into chunked JSON Lines, with flat memory')
+    parser.add_argument('--output', default=None,
+                        help='summary_player_info.json, or the summary_player_info/ directory with --stream')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes with --stream (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='players per output file with --stream')
+    args = parser.parse_args()
+    raw_dir = args.raw_dir.rstrip('/')
 
-    # run processing pipeline
-    processor = PreProcessing(clubs, nationalities, players, player_stats)
-    processed_players = processor.process_all_data()
+    if args.stream:
+        # any raw file may be a JSON array or JSON Lines
+        output = args.output or "summary_player_info"
+        manifest = run_streaming_pipeline(
+            f"{raw_dir}/clubs.json", f"{raw_dir}/nationalities.json", f"{raw_dir}/players.json",
+            f"{raw_dir}/player_season_stats.json", output, workers=args.workers, chunk_size=args.chunk_size,
+        )
+        print(f"Wrote {manifest['num_players']} players in {len(manifest['chunks'])} chunks to {output}/")
+    else:
+        # load raw data files
+        clubs = load_json(f"{raw_dir}/clubs.json")
+        nationalities = load_json(f"{raw_dir}/nationalities.json")
+        players = load_json(f"{raw_dir}/players.json")
+        player_stats = load_json(f"{raw_dir}/player_season_stats.json")
 
-    # save final results
-    save_json(processed_players, "summary_player_info.json")
-    
\ No newline at end of file
+        # run processing pipeline
+        processor = PreProcessing(clubs, nationalities, players, player_stats)
+        processed_players = processor.process_all_data()
+
+        # save final results
+        save_json(processed_players, args.output or "summary_player_info.json")
@@ -1,5 +1,7 @@
 import json
 from src import HybridPlayerSearch, PlayerEmbeddingEngine
+from src.storage import IndexStore, load_or_build_index, load_or_build_keyword_index
+from src.utils import file_checksum
 
 def load_players(file_path: str = "summary_player_info.json"):
     """Load player data from JSON file"""
@@ -9,29 +11,37 @@ def load_players(file_path: str = "summary_player_info.json"):
     return players_data
 
 
-def init_search_engine(players_data):
+def init_search_engine(players_data, data_path: str = "summary_player_info.json", index_dir: str = "index_store"):
     """Initialize embedding and hybrid search engines"""
+    store, checksum = IndexStore(index_dir), file_checksum(data_path)
     embedding_engine = PlayerEmbeddingEngine("all-MiniLM-L6-v2")
-    print("🔄 Building embedding index...")
-    embedding_engine.build_index(players_data)
+    print("🔄 Loading embedding index...")
+    load_or_build_index(embedding_engine, players_data, store, checksum)
 
     search_engine = HybridPlayerSearch(embedding_engine)
-    print("🔄 Building TF-IDF index...")
-    search_engine.build_tfidf_index(players_data)
+    print("🔄 Loading keyword index...")
+    load_or_build_keyword_index(search_engine, players_data, store, checksum)
+    search_engine.build_attribute_index()
+    search_engine.build_name_index()
 
     print("✅ Search engines initialized successfully!")
     return search_engine
 
 
-def search_players(search_engine, query: str, top_k: int = 10, search_type: str = "hybrid"):
-    """Perform search (hybrid or semantic)"""
+def search_players(search_engine, query: str, top_k: int = 10, search_type: str = "hybrid", filters: dict = None,
+                   parse_query: bool = True):
+    """Perform search (hybrid or semantic), optionally restricted by structured filters"""
     if not search_engine:
         raise RuntimeError("Search engine not initialized")
 
+    if parse_query:
+        query, filters, parsed = search_engine.understand(query, filters)
+        print(f"Parsed filters: {parsed}")
+
     if search_type == "hybrid":
-        results = search_engine.hybrid_search(query, top_k)
+        results = search_engine.hybrid_search(query, top_k, filters=filters)
     elif search_type == "semantic":
-        results = search_engine.embedding_engine.search(query, top_k)
+        results = search_engine.semantic_search(query, top_k, filters=filters)
     else:
         raise ValueError("Invalid search type. Use 'hybrid' or 'semantic'")
 
@@ -1,9 +1,46 @@
-import json
+import os
+import sys
+import time
+import asyncio
 import uvicorn
-from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from fastapi import Body, Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from src import HybridPlayerSearch, PlayerEmbeddingEngine
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from src.batching import QueryBatcher
+from src.cache import LRUCache
+from src.executor import ExecutorSaturated, SearchExecutor, SearchTimeout
+from src.generation import BuildInProgress, SearchEngineManager
+from src.player_store import VIEWS
+from src.responses import JSONFragment, dumps
+from src.utils import timed
+
+DATA_PATH = os.getenv('PLAYER_DATA_PATH', 'summary_player_info.json')  # JSON file or chunked JSON Lines directory
+MODEL_NAME = "all-MiniLM-L6-v2"
+ENCODER_BACKEND = os.getenv('ENCODER_BACKEND', 'torch')  # 'torch' or 'onnx' (export with benchmarks/encoder_consistency.py)
+ENCODER_PATH = os.getenv('ENCODER_PATH', 'onnx_encoder')  # exported ONNX encoder directory
+INDEX_DIR = os.getenv('PLAYER_INDEX_DIR', 'index_store')
+# serve the indexes written by `python manage.py build` as is: memory-mapped, never rebuilt or
+# updated, so any number of workers share one copy through the page cache
+INDEX_READ_ONLY = os.getenv('PLAYER_INDEX_READ_ONLY', '0').lower() in ('1', 'true', 'yes')
+COMPACTION_INTERVAL = float(os.getenv('PLAYER_COMPACTION_INTERVAL', '60'))  # seconds
+COMPACTION_THRESHOLD = float(os.getenv('PLAYER_COMPACTION_THRESHOLD', '0.1'))  # deleted / total rows
+WATCH_INTERVAL = float(os.getenv('PLAYER_WATCH_INTERVAL', '0'))  # seconds, 0 disables the data file watcher
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', '16'))  # searches running at once, mostly waiting on the batcher
+SEARCH_QUEUE_SIZE = int(os.getenv('SEARCH_QUEUE_SIZE', '32'))  # searches waiting before 429
+SEARCH_TIMEOUT = float(os.getenv('SEARCH_TIMEOUT', '30'))  # seconds before a search answers 504, 0 waits forever
+QUERY_BATCH_WINDOW_MS = float(os.getenv('QUERY_BATCH_WINDOW_MS', '3'))  # 0 disables query micro-batching
+QUERY_BATCH_SIZE = int(os.getenv('QUERY_BATCH_SIZE', '32'))
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '4096'))  # entries per cache level, 0 disables
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '600'))  # seconds
+HYBRID_FUSION = os.getenv('HYBRID_FUSION', 'weighted')  # 'weighted' or 'rrf'
+INDEX_BACKEND = os.getenv('PLAYER_INDEX_BACKEND', 'auto')  # 'auto', 'flat', 'hnsw', 'ivfpq' or 'sq8'
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '64'))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '16'))
+SEARCH_BATCH_LIMIT = int(os.getenv('SEARCH_BATCH_LIMIT', '10000'))  # queries per /search/batch request
+SIMILAR_GRAPH_K = int(os.getenv('SIMILAR_GRAPH_K', '50'))  # precomputed neighbours per player, 0 disables the graph
 
 app = FastAPI(title="Football Player Semantic Search")
 
@@ -16,40 +53,271 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-search_engine = None
+READ_ONLY_DETAIL = "The index is read-only, update the data file and run `python manage.py build`"
+
+search_engine = None  # active generation, swapped atomically by engine_manager
+engine_manager = None
+write_journal = None  # WriteJournal of the live writes, replayed onto every new generation
+started_at = time.time()
+ready_after = None  # seconds from app import to the first generation serving
+search_executor = SearchExecutor(max_workers=SEARCH_WORKERS, max_queue=SEARCH_QUEUE_SIZE,
+                                 timeout=SEARCH_TIMEOUT or None)
+
+
+class SearchFilters(BaseModel):
+    nationality: Optional[List[str]] = None  # country name, demonym or ISO code
+    position: Optional[List[str]] = None
+    club: Optional[List[str]] = None  # current club
+    played_for: Optional[List[str]] = None  # any club in club_history
+    preferred_foot: Optional[List[str]] = None
+    min_age: Optional[float] = None
+    max_age: Optional[float] = None
+    min_height: Optional[float] = None
+    max_height: Optional[float] = None
+    min_career_goals: Optional[float] = None
+    max_career_goals: Optional[float] = None
+
+    def as_dict(self):
+        return {key: value for key, value in self if value is not None}
+
+
+def query_filters(
+    nationality: Optional[List[str]] = Query(None),
+    position: Optional[List[str]] = Query(None),
+    club: Optional[List[str]] = Query(None),
+    played_for: Optional[List[str]] = Query(None),
+    preferred_foot: Optional[List[str]] = Query(None),
+    min_age: Optional[float] = None,
+    max_age: Optional[float] = None,
+    min_height: Optional[float] = None,
+    max_height: Optional[float] = None,
+    min_career_goals: Optional[float] = None,
+    max_career_goals: Optional[float] = None,
+):
+    """SearchFilters from query parameters, repeated for lists (?position=Forward&position=Midfielder)"""
+    return SearchFilters(**locals())
 
 
 class SearchRequest(BaseModel):
     query: str
-    top_k: int = 10
+    top_k: int = Field(10, ge=1)
     search_type: str = "hybrid"
+    filters: Optional[SearchFilters] = None
+    parse_query: bool = True  # pull nationality, position, club, foot and numeric constraints out of the query
+    min_score: Optional[float] = None  # drop hits scoring below this, scores are in [0, 1]
+    view: str = "full"  # 'summary': id, name, club, position and nationality only, details via /player/{id}
+    fields: Optional[List[str]] = None  # explicit player_data projection, e.g. ["fullName", "current_club.clubName"]
+
+    def projection(self):
+        return tuple(self.fields) if self.fields else VIEWS[self.view]
+
+
+class FragmentJSONResponse(Response):
+    """JSON response whose JSONFragment values are spliced in without re-encoding"""
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content).encode('utf-8')
+
+
+def run_search(engine, request, filters):
+    """query understanding followed by the search itself, both on a search worker"""
+    query, parsed = request.query, {}
+    if request.parse_query:
+        query, filters, parsed = engine.understand(query, filters)
+    options = dict(filters=filters, min_score=request.min_score, fields=request.projection(), encoded=True)
+    if request.search_type == "hybrid":
+        results = engine.hybrid_search(query, request.top_k, **options)
+    else:
+        results = engine.semantic_search(query, request.top_k, **options)
+    return results, parsed
+
+
+def run_batch_search(engine, requests):
+    """query understanding for every request, then one bulk ranking for all of them"""
+    queries, filters, parsed = [], [], []
+    for request in requests:
+        query, request_parsed = request.query, {}
+        request_filters = request.filters.as_dict() if request.filters else None
+        if request.parse_query:
+            query, request_filters, request_parsed = engine.understand(query, request_filters)
+        queries.append(query)
+        filters.append(request_filters)
+        parsed.append(request_parsed)
+
+    ranked = engine.rank_many(
+        queries,
+        top_k=[request.top_k for request in requests],
+        search_type=[request.search_type for request in requests],
+        filters=filters,
+        min_score=[request.min_score for request in requests],
+    )
+    return ranked, parsed
+
+
+def batch_responses(engine, requests, ranked, parsed):
+    """one /search shaped response per request, materialized as they are consumed"""
+    for request, request_ranked, request_parsed in zip(requests, ranked, parsed):
+        score_field = 'combined_score' if request.search_type == 'hybrid' else 'similarity_score'
+        results = engine.embedding_engine.materialize(request_ranked, score_field, request.projection(), encoded=True)
+        yield {
+            "query": request.query,
+            "search_type": request.search_type,
+            "parsed_filters": request_parsed,
+            "total_results": len(results),
+            "results": results
+        }
+
+
+def render_batch_search(engine, requests):
+    """run_batch_search plus the finished JSON body, so materializing and encoding stay off the event loop"""
+    ranked, parsed = run_batch_search(engine, requests)
+    responses = list(batch_responses(engine, requests, ranked, parsed))
+    return dumps({"total_searches": len(requests), "responses": responses}).encode('utf-8')
+
+
+def open_indexes(timings, model, read_only=False):
+    """a HybridPlayerSearch over the vector, keyword, filter, name and neighbour indexes in INDEX_DIR
+
+    stale or missing indexes are rebuilt from DATA_PATH and saved first; read_only serves
+    what the build step published as is and fails instead of building
+    """
+    from src.ann import IndexConfig
+    from src.storage import IndexStore, open_search
+
+    index_config = IndexConfig(backend=INDEX_BACKEND, ef_search=HNSW_EF_SEARCH, nprobe=IVF_NPROBE)
+    return open_search(
+        DATA_PATH, IndexStore(INDEX_DIR), MODEL_NAME, model=model, index_config=index_config,
+        neighbor_k=SIMILAR_GRAPH_K, read_only=read_only, timings=timings,
+        encoder_backend=ENCODER_BACKEND, encoder_path=ENCODER_PATH,
+        compaction_threshold=COMPACTION_THRESHOLD, fusion=HYBRID_FUSION,
+    )
+
+
+def build_artifacts():
+    """the build step of multi-worker serving: bring every index in INDEX_DIR up to date
+
+    workers started with PLAYER_INDEX_READ_ONLY=1 then only memory-map these files
+    """
+    from src.embedding import load_model_async
+
+    timings = {}
+    # the model is only waited for when something has to be encoded
+    model = load_model_async(MODEL_NAME, timings, backend=ENCODER_BACKEND, path=ENCODER_PATH)
+    engine = open_indexes(timings, model)
+    print(f"Indexes for {engine.embedding_engine.live_count} players are up to date in {INDEX_DIR}, "
+          f"phases (s): {timings}")
+
+
+def build_search_engine(timings):
+    """load the data file and build a complete, warmed-up HybridPlayerSearch
+
+    timings: receives the seconds spent in each phase, reported by /health/ready
+    """
+    started = time.perf_counter()
+    with timed(timings, 'imports'):
+        # faiss, scipy and the engine modules are imported here, not when the app starts
+        from src.embedding import load_model_async
+        from src.storage import JOURNAL_FILE, WriteJournal
+
+    global write_journal
+    journal = write_journal = write_journal or WriteJournal(os.path.join(INDEX_DIR, JOURNAL_FILE))
+
+    # the model loads in the background while the stored indexes are read; a newer
+    # generation reuses the already loaded one
+    model = search_engine.embedding_engine.model if search_engine else load_model_async(
+        MODEL_NAME, timings, backend=ENCODER_BACKEND, path=ENCODER_PATH
+    )
+    engine = open_indexes(timings, model, read_only=INDEX_READ_ONLY)
+    embedding_engine = engine.embedding_engine
+    if QUERY_CACHE_SIZE > 0:
+        # query embeddings only depend on the model and survive generations, rankings do not
+        embedding_engine.query_embedding_cache = (
+            search_engine.embedding_engine.query_embedding_cache if search_engine
+            else LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        )
+        embedding_engine.result_cache = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+    if QUERY_BATCH_WINDOW_MS > 0:
+        embedding_engine.batcher = QueryBatcher(
+            embedding_engine, window_ms=QUERY_BATCH_WINDOW_MS, max_batch=QUERY_BATCH_SIZE
+        )
+
+    with timed(timings, 'model_wait'):
+        embedding_engine.model  # blocks until the background load has finished
+    if INDEX_READ_ONLY:
+        if journal.entries():
+            print(f"{journal.path} holds live writes a read-only index does not serve, "
+                  f"fold them into the data file and rebuild")
+    else:
+        with timed(timings, 'journal'):
+            # live writes since the data file was last rebuilt, the stored indexes do not hold them
+            replayed = journal.replay(engine)
+        if replayed:
+            print(f"Replayed {replayed} live writes from {journal.path}")
+    with timed(timings, 'warm_up'):
+        engine.warm_up()
+    timings['total'] = round(time.perf_counter() - started, 3)
+    print(f"Loaded {embedding_engine.live_count} players, startup phases (s): {timings}")
+    return engine
+
+
+def set_search_engine(engine):
+    global search_engine, ready_after
+    search_engine = engine
+    if ready_after is None:
+        ready_after = round(time.time() - started_at, 3)
 
 
 @app.on_event("startup")
 async def startup_event():
-    global search_engine
+    global engine_manager
 
-    try:
-        # Load data
-        with open('summary_player_info.json', 'r', encoding='utf-8') as f:
-            players_data = json.load(f)
+    # the first generation is built in the background: /health/live answers at once,
+    # /health/ready once the engine is loaded and warmed up
+    engine_manager = SearchEngineManager(build_search_engine, on_swap=set_search_engine)
+    engine_manager.rebuild_in_background()
 
-        print(f"Loaded {len(players_data)} players")
+    if not INDEX_READ_ONLY:
+        asyncio.create_task(compaction_loop())  # nothing is ever deleted from a read-only index
+    if WATCH_INTERVAL > 0:
+        asyncio.create_task(watch_data_file())
 
-        # Initialize search engines
-        embedding_engine = PlayerEmbeddingEngine("all-MiniLM-L6-v2")
-        print("Building embedding index...")
-        embedding_engine.build_index(players_data)
 
-        search_engine = HybridPlayerSearch(embedding_engine)
-        print("Building TF-IDF index...")
-        search_engine.build_tfidf_index(players_data)
+@app.on_event("shutdown")
+async def shutdown_event():
+    search_executor.shutdown()
 
-        print("Search engines initialized successfully!")
 
-    except Exception as e:
-        print(f"Error during startup: {e}")
-        raise
+async def watch_data_file():
+    """rebuild in the background whenever the data file changes on disk
+
+    read-only workers watch the published manifest instead and load the new indexes
+    once the build step has finished writing them
+    """
+    from src.storage import MANIFEST_FILE
+    path = os.path.join(INDEX_DIR, MANIFEST_FILE) if INDEX_READ_ONLY else DATA_PATH
+    last_mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue  # file is being replaced
+        if mtime != last_mtime and engine_manager.rebuild_in_background():
+            last_mtime = mtime
+            print(f"{path} changed, building a new index generation")
+
+
+async def compaction_loop():
+    """periodically rebuild the indexes once enough players have been deleted"""
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL)
+        engine = search_engine
+        try:
+            if engine and await run_in_threadpool(engine.compact_if_needed):
+                print(f"Compacted index to {engine.embedding_engine.live_count} players")
+        except Exception as e:
+            print(f"Compaction error: {e}")
 
 
 @app.get("/")
@@ -59,56 +327,179 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "search": "/search (POST)",
+            "batch_search": "/search/batch (POST)",
             "player_details": "/player/{player_id} (GET)",
-            "health": "/health (GET)"
+            "similar_players": "/player/{player_id}/similar (GET)",
+            "suggest": "/suggest?q= (GET)",
+            "player_upsert": "/player/{player_id} (PUT)",
+            "player_delete": "/player/{player_id} (DELETE)",
+            "reload": "/admin/reload (POST)",
+            "health": "/health (GET)",
+            "liveness": "/health/live (GET)",
+            "readiness": "/health/ready (GET)"
         }
     }
 
 
 @app.get("/health")
 async def health_check():
+    engine = search_engine
     return {
         "status": "healthy",
-        "search_engine_ready": search_engine is not None,
-        "total_players": len(search_engine.embedding_engine.player_metadata) if search_engine else 0
+        "search_engine_ready": engine is not None,
+        "read_only": INDEX_READ_ONLY,
+        "total_players": len(engine.embedding_engine.player_metadata) if engine else 0,
+        "index_backend": engine.embedding_engine.index_backend if engine else None,
+        "generations": engine_manager.status() if engine_manager else None,
+        "search_pool": search_executor.stats(),
+        "query_batching": engine.embedding_engine.batcher.stats() if engine and engine.embedding_engine.batcher else None,
+        "query_cache": {
+            "embeddings": engine.embedding_engine.query_embedding_cache.stats(),
+            "results": engine.embedding_engine.result_cache.stats()
+        } if engine and engine.embedding_engine.result_cache else None,
+        "query_parser": engine.query_parser.stats() if engine and engine.query_parser else None
+    }
+
+
+@app.get("/health/live")
+async def liveness_check():
+    """the process serves requests; fails only when the first generation could not be built"""
+    if engine_manager and engine_manager.active is None and engine_manager.pending is None \
+            and engine_manager.last_failed is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": engine_manager.last_failed.error})
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """a warmed-up engine is serving, with the startup time of each build phase"""
+    active = engine_manager.active if engine_manager else None
+    if search_engine is None or active is None:
+        building = engine_manager.pending if engine_manager else None
+        return JSONResponse(status_code=503, content={
+            "status": "starting",
+            "building": building.to_dict() if building else None,
+        })
+    return {
+        "status": "ready",
+        "ready_after": ready_after,
+        "generation": active.to_dict(),
     }
 
 
+@app.post("/admin/reload")
+async def reload_index():
+    """build a new generation from the data file plus the journal of live writes
+
+    writes are refused with 409 until it is active, so none are lost in the swap
+    """
+    if not engine_manager:
+        raise HTTPException(status_code=503, detail="Search engine not initialized")
+
+    generation = engine_manager.rebuild_in_background()
+    if generation is None:
+        raise HTTPException(status_code=409, detail="An index build is already in progress")
+    return {"status": "building", "generation": generation.number}
+
+
 @app.post("/search")
 async def search_players(request: SearchRequest):
+    engine = search_engine  # in-flight requests keep this generation even if a swap happens
     try:
-        if not search_engine:
+        if not engine:
             raise HTTPException(status_code=503, detail="Search engine not initialized")
 
-        if request.search_type == "hybrid":
-            results = search_engine.hybrid_search(request.query, request.top_k)
-        elif request.search_type == "semantic":
-            results = search_engine.embedding_engine.search(request.query, request.top_k)
-        else:
+        if request.search_type not in ("hybrid", "semantic"):
             raise HTTPException(status_code=400, detail="Invalid search type. Use 'hybrid' or 'semantic'")
 
-        return {
+        if request.view not in VIEWS:
+            raise HTTPException(status_code=400, detail=f"Invalid view. Use one of {', '.join(VIEWS)}")
+
+        filters = request.filters.as_dict() if request.filters else None
+
+        # blocking parse/encode/search work runs in the bounded pool, not on the event loop
+        results, parsed_filters = await search_executor.run(run_search, engine, request, filters)
+
+        # player_data comes back as cached JSON fragments, only the envelope is encoded here
+        return FragmentJSONResponse({
             "query": request.query,
             "search_type": request.search_type,
+            "parsed_filters": parsed_filters,
             "total_results": len(results),
             "results": results
-        }
+        })
 
     except HTTPException:
         raise
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=429, detail=f"Search service busy: {str(e)}", headers={"Retry-After": "1"})
+    except SearchTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Search timed out: {str(e)}")
     except Exception as e:
         print(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 
+@app.post("/search/batch")
+async def batch_search_players(requests: List[SearchRequest], stream: bool = False):
+    """run many searches in one pass; stream=true answers with NDJSON, one line per request"""
+    engine = search_engine
+    try:
+        if not engine:
+            raise HTTPException(status_code=503, detail="Search engine not initialized")
+
+        if len(requests) > SEARCH_BATCH_LIMIT:
+            raise HTTPException(status_code=413, detail=f"At most {SEARCH_BATCH_LIMIT} searches per batch")
+
+        for i, request in enumerate(requests):
+            if request.search_type not in ("hybrid", "semantic"):
+                raise HTTPException(status_code=400, detail=f"Search {i}: invalid search type. Use 'hybrid' or 'semantic'")
+            if request.view not in VIEWS:
+                raise HTTPException(status_code=400, detail=f"Search {i}: invalid view. Use one of {', '.join(VIEWS)}")
+
+        # the whole job takes one slot of the bounded pool
+        if stream:
+            ranked, parsed = await search_executor.run(run_batch_search, engine, requests)
+            # a plain generator, the response iterates it on a worker thread line by line
+            responses = batch_responses(engine, requests, ranked, parsed)
+            return StreamingResponse(
+                (dumps(response) + "\n" for response in responses), media_type="application/x-ndjson"
+            )
+        body = await search_executor.run(render_batch_search, engine, requests)
+        return Response(body, media_type="application/json")
+
+    except HTTPException:
+        raise
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=429, detail=f"Search service busy: {str(e)}", headers={"Retry-After": "1"})
+    except SearchTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Search timed out: {str(e)}")
+    except Exception as e:
+        print(f"Batch search error: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
+
+
+@app.get("/suggest")
+async def suggest_names(q: str, limit: int = 10):
+    """player and club name completions, typo tolerant; cheap enough to run on the event loop"""
+    engine = search_engine
+    if not engine:
+        raise HTTPException(status_code=503, detail="Search engine not initialized")
+
+    suggestions = engine.suggest(q, max(1, min(limit, 50)))
+    return {"query": q, "total_results": len(suggestions), "suggestions": suggestions}
+
+
 @app.get("/player/{player_id}")
 async def get_player_details(player_id: str):
+    engine = search_engine
     try:
-        if not search_engine:
+        if not engine:
             raise HTTPException(status_code=503, detail="Search engine not initialized")
 
-        if player_id in search_engine.embedding_engine.player_metadata:
-            return search_engine.embedding_engine.player_metadata[player_id]
+        player_data = engine.embedding_engine.player_metadata.get_fragment(player_id)
+        if player_data is not None:
+            return FragmentJSONResponse(JSONFragment(player_data))
         else:
             raise HTTPException(status_code=404, detail=f"Player with ID '{player_id}' not found")
 
@@ -119,5 +510,106 @@ async def get_player_details(player_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to fetch player: {str(e)}")
 
 
+@app.get("/player/{player_id}/similar")
+async def similar_players(player_id: str, k: int = Query(10, ge=1), min_score: Optional[float] = None, view: str = "full",
+                          fields: Optional[List[str]] = Query(None), filters: SearchFilters = Depends(query_filters)):
+    engine = search_engine
+    try:
+        if not engine:
+            raise HTTPException(status_code=503, detail="Search engine not initialized")
+
+        if view not in VIEWS:
+            raise HTTPException(status_code=400, detail=f"Invalid view. Use one of {', '.join(VIEWS)}")
+
+        projection = tuple(fields) if fields else VIEWS[view]
+        results = await search_executor.run(
+            engine.similar_players, player_id, k, filters=filters.as_dict(), min_score=min_score,
+            fields=projection, encoded=True
+        )
+        if results is None:
+            raise HTTPException(status_code=404, detail=f"Player with ID '{player_id}' not found")
+
+        return FragmentJSONResponse({
+            "player_id": player_id,
+            "total_results": len(results),
+            "results": results
+        })
+
+    except HTTPException:
+        raise
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=429, detail=f"Search service busy: {str(e)}", headers={"Retry-After": "1"})
+    except SearchTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Search timed out: {str(e)}")
+    except Exception as e:
+        print(f"Similar players error: {e}")
+        raise HTTPException(status_code=500, detail=f"Similar players failed: {str(e)}")
+
+
+def apply_upsert(engine, player):
+    """upsert into the live engine, then journal it so the next generation replays it"""
+    engine.upsert_player(player)
+    write_journal.append('upsert', player['playerId'], player)
+
+
+def apply_delete(engine, player_id):
+    if not engine.delete_player(player_id):
+        return False
+    write_journal.append('delete', player_id)
+    return True
+
+
+@app.put("/player/{player_id}")
+async def upsert_player(player_id: str, player: dict = Body(...)):
+    engine = search_engine
+    try:
+        if not engine:
+            raise HTTPException(status_code=503, detail="Search engine not initialized")
+
+        if INDEX_READ_ONLY:
+            raise HTTPException(status_code=409, detail=READ_ONLY_DETAIL)
+
+        player = {**player, "playerId": player_id}
+        existed = player_id in engine.embedding_engine.player_metadata
+        await run_in_threadpool(engine_manager.write, apply_upsert, player)
+        return {"player_id": player_id, "status": "updated" if existed else "created"}
+
+    except HTTPException:
+        raise
+    except BuildInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "5"})
+    except (KeyError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid player data, missing field: {str(e)}")
+    except Exception as e:
+        print(f"Player upsert error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to upsert player: {str(e)}")
+
+
+@app.delete("/player/{player_id}")
+async def delete_player(player_id: str):
+    engine = search_engine
+    try:
+        if not engine:
+            raise HTTPException(status_code=503, detail="Search engine not initialized")
+
+        if INDEX_READ_ONLY:
+            raise HTTPException(status_code=409, detail=READ_ONLY_DETAIL)
+
+        if not await run_in_threadpool(engine_manager.write, apply_delete, player_id):
+            raise HTTPException(status_code=404, detail=f"Player with ID '{player_id}' not found")
+        return {"player_id": player_id, "status": "deleted"}
+
+    except HTTPException:
+        raise
+    except BuildInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        print(f"Player delete error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to delete player: {str(e)}")
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    if sys.argv[1:] == ["build"]:
+        build_artifacts()
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
@@ -1,2 +1,18 @@
-from .embedding import PlayerEmbeddingEngine, HybridPlayerSearch
-from .preprocessing import PreProcessing, PlayerDataProcessor
+import importlib
+
+# name -> submodule, imported on first use: src.embedding pulls in faiss and torch,
+# which the preprocessing scripts and the API's startup path do not need
+_EXPORTS = {
+    'PlayerEmbeddingEngine': 'embedding',
+    'HybridPlayerSearch': 'embedding',
+    'PreProcessing': 'preprocessing',
+    'PlayerDataProcessor': 'preprocessing',
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f'.{module}', __name__), name)
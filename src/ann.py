@@ -0,0 +1,122 @@
+import math
+import faiss
+import numpy as np
+
+INDEX_BACKENDS = ('auto', 'flat', 'hnsw', 'ivfpq', 'sq8')
+# 'auto' picks exact search for small corpora, a graph while vectors fit comfortably
+# in RAM, then compressed IVF-PQ codes for catalogue-sized corpora
+AUTO_FLAT_LIMIT = 20000
+AUTO_HNSW_LIMIT = 200000
+
+
+def _largest_divisor(dimension, at_most):
+    for m in range(max(1, at_most), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+class IndexConfig:
+    """Which FAISS index backs a PlayerEmbeddingEngine and how it is tuned
+
+    backend: one of INDEX_BACKENDS
+    hnsw_m / ef_construction / ef_search: HNSW graph degree, build and query beam width
+    nlist / nprobe: IVF cells (None sizes it from the corpus) and cells visited per query
+    pq_m / pq_bits: PQ sub-quantizers (None uses dimension / 4) and bits per code
+    """
+
+    def __init__(self, backend='auto', hnsw_m=32, ef_construction=200, ef_search=64,
+                 nlist=None, nprobe=16, pq_m=None, pq_bits=8):
+        if backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unknown index backend '{backend}', use one of {INDEX_BACKENDS}")
+        self.backend = backend
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+
+    def resolve(self, num_vectors):
+        """concrete backend for a corpus of num_vectors"""
+        if self.backend != 'auto':
+            return self.backend
+        if num_vectors <= AUTO_FLAT_LIMIT:
+            return 'flat'
+        if num_vectors <= AUTO_HNSW_LIMIT:
+            return 'hnsw'
+        return 'ivfpq'
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def build_ann_index(config, dimension, embeddings):
+    """build, train and fill an inner-product index for unit-length embeddings, labelled by row
+
+    returns (index, backend)
+    """
+    num_vectors = len(embeddings)
+    backend = config.resolve(num_vectors)
+
+    if backend == 'flat':
+        base = faiss.IndexFlatIP(dimension)
+    elif backend == 'hnsw':
+        base = faiss.IndexHNSWFlat(dimension, config.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = config.ef_construction
+    elif backend == 'sq8':
+        base = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        # k-means wants ~39 points per centroid, keep small or test corpora trainable
+        nlist = config.nlist or int(4 * math.sqrt(max(num_vectors, 1)))
+        nlist = max(1, min(nlist, num_vectors // 39))
+        pq_m = _largest_divisor(dimension, config.pq_m or dimension // 4)
+        pq_bits = max(1, min(config.pq_bits, int(math.log2(max(num_vectors // 39, 2)))))
+        base = faiss.IndexIVFPQ(
+            faiss.IndexFlatIP(dimension), dimension, nlist, pq_m, pq_bits, faiss.METRIC_INNER_PRODUCT
+        )
+
+    if not base.is_trained:
+        base.train(np.ascontiguousarray(embeddings, dtype='float32'))
+    index = faiss.IndexIDMap2(base)
+    index.add_with_ids(embeddings, np.arange(num_vectors, dtype='int64'))
+    configure_index(index, config)
+    return index, backend
+
+
+def configure_index(index, config):
+    """apply query-time settings, also to an index read back from disk"""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = config.ef_search
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = config.nprobe
+    return index
+
+
+def search_parameters(index, config, selector, k):
+    """backend-appropriate SearchParameters restricting a search to selector"""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(config.ef_search, k))
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=config.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_backend(index):
+    """backend name of a built or loaded index"""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(base, faiss.IndexIVFPQ):
+        return 'ivfpq'
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return 'sq8'
+    return 'flat'
+
+
+def index_memory(index):
+    """bytes held by the index structure (codes, graph, lists), excluding Python overhead"""
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,86 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class QueryBatcher:
+    """Coalesce concurrent semantic searches into batched encode + index search calls
+
+    callers block in search() while a dispatcher thread collects queries for up to
+    window_ms or max_batch queries, runs engine.rank_batch once and hands every
+    caller its own ranking. The dispatcher exits after idle_timeout seconds without
+    traffic and is restarted by the next query, so retired index generations do not
+    keep a thread alive.
+    """
+
+    def __init__(self, engine, window_ms=3.0, max_batch=32, idle_timeout=30.0):
+        self.engine = engine
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.batches = 0
+        self.queries = 0
+
+    def search(self, query, top_k=5, min_score=None):
+        future = Future()
+        self.queue.put((query, top_k, min_score, future))
+        self._ensure_worker()
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='query-batcher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    if self.queue.empty():
+                        self._worker = None
+                        return
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        queries = [query for query, _, _, _ in batch]
+        top_ks = [top_k for _, top_k, _, _ in batch]
+        min_scores = [min_score for _, _, min_score, _ in batch]
+        try:
+            batch_results = self.engine.rank_batch(queries, top_ks, min_score=min_scores)
+        except Exception as e:
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.queries += len(batch)
+        for (_, _, _, future), results in zip(batch, batch_results):
+            future.set_result(results)
+
+    def stats(self):
+        return {
+            'window_ms': self.window * 1000.0,
+            'max_batch': self.max_batch,
+            'batches': self.batches,
+            'queries': self.queries,
+            'avg_batch_size': round(self.queries / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,382 @@
+import os
+import re
+import json
+import unicodedata
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+from src.utils import atomic_write
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset("""
+a about above after again all an and any are as at be been before being below between both but by
+can did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its just me more most my no nor not now of off on once only or other
+our out over own same she should so some such than that the their them then there these they this
+those through to too under until up very was we were what when where which while who whom why will
+with you your play plays player players
+""".split())
+
+# field -> weight, folded into one term frequency per document (simplified BM25F)
+DEFAULT_FIELD_WEIGHTS = {'profile': 1.0, 'name': 3.0, 'club': 2.0, 'nationality': 2.0}
+
+POSTINGS_INDPTR_FILE = 'postings_indptr.npy'
+POSTINGS_ROWS_FILE = 'postings_rows.npy'
+POSTINGS_TF_FILE = 'postings_tf.npy'
+POSTINGS_WEIGHTS_FILE = 'postings_weights.npy'
+DOC_LENGTHS_FILE = 'doc_lengths.npy'
+VOCAB_FILE = 'vocab.json'
+META_FILE = 'bm25.json'
+
+
+def tokenize(text):
+    """lowercase, accent-folded alphanumeric tokens without stop words"""
+    text = (text or '').lower()
+    if not text.isascii():  # nothing to fold in the common case, profiles are mostly ASCII
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [token for token in TOKEN_PATTERN.findall(text) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """Inverted-index keyword engine with BM25 scoring and MaxScore top-k pruning
+
+    postings are array-backed (CSC layout: per-term slices of sorted row ids and
+    field-weighted term frequencies), so a query only touches the postings of its
+    own terms. Rows appended after fit live in small delta postings scored with the
+    frozen collection statistics until the next fit/compaction.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, field_weights=None):
+        self.k1 = k1
+        self.b = b
+        self.field_weights = field_weights or DEFAULT_FIELD_WEIGHTS
+        self.vocab = {}
+        self.indptr = np.zeros(1, dtype='int64')
+        self.rows = np.zeros(0, dtype='int32')
+        self.tf = np.zeros(0, dtype='float32')
+        self.doc_lengths = np.zeros(0, dtype='float32')
+        self.delta = {}  # term id -> (rows list, tf list) for rows appended since fit
+        self.collection = None  # (num_docs, avgdl, df by term id) of the whole corpus when this is one shard
+        self._derive()
+
+    @property
+    def num_docs(self):
+        return len(self.doc_lengths)
+
+    def _term_frequencies(self, document):
+        counts = {}
+        length = 0.0
+        for field, text in document.items():
+            weight = self.field_weights.get(field, 1.0)
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0.0) + weight
+                length += weight
+        return counts, length
+
+    def fit(self, documents):
+        """build postings from documents, a list of {field: text} dicts in row order"""
+        vocab = {}
+        term_ids, doc_rows, frequencies = [], [], []
+        doc_lengths = np.zeros(len(documents), dtype='float32')
+        for row, document in enumerate(documents):
+            counts, doc_lengths[row] = self._term_frequencies(document)
+            for token, tf in counts.items():
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+                doc_rows.append(row)
+                frequencies.append(tf)
+
+        matrix = coo_matrix(
+            (np.array(frequencies, dtype='float32'), (np.array(doc_rows), np.array(term_ids))),
+            shape=(len(documents), len(vocab)),
+        ).tocsc()
+        matrix.sort_indices()
+
+        self.vocab = vocab
+        self.indptr = matrix.indptr.astype('int64')
+        self.rows = matrix.indices.astype('int32')
+        self.tf = matrix.data.astype('float32')
+        self.doc_lengths = doc_lengths
+        self.delta = {}
+        self._derive()
+        return self
+
+    def _derive(self, weights=None):
+        """collection statistics, per-posting BM25 weights and per-term upper bounds"""
+        self.fitted_docs = self.num_docs
+        self.avgdl = float(self.doc_lengths.mean()) if self.num_docs else 1.0
+        df = np.diff(self.indptr)
+        collection_df = df
+        if self.collection is not None:
+            self.fitted_docs, self.avgdl, known_df = self.collection
+            collection_df = df.astype('float64')
+            known = min(len(known_df), len(df))  # terms added since keep their local count
+            collection_df[:known] = known_df[:known]
+        self.idf = np.log1p((self.fitted_docs - collection_df + 0.5) / (collection_df + 0.5)).astype('float32')
+        if weights is None:
+            weights = self._weights(self.tf, self.doc_lengths[self.rows], np.repeat(self.idf, df))
+        self.weights = weights
+        self.upper_bounds = np.zeros(len(df), dtype='float32')
+        non_empty = df > 0
+        if non_empty.any():
+            self.upper_bounds[non_empty] = np.maximum.reduceat(self.weights, self.indptr[:-1][non_empty])
+
+    def _weights(self, tf, doc_lengths, idf):
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths / self.avgdl)
+        return (idf * tf * (self.k1 + 1) / (tf + norm)).astype('float32')
+
+    def collection_stats(self, exclude=None):
+        """document count, summed document length and per-term document frequency of this index
+
+        summed over the shards of a corpus they give the statistics use_collection_stats() takes.
+        exclude: optional sorted row array (tombstones) left out of every statistic, as in top_k
+        """
+        live = np.ones(self.num_docs, dtype=bool)
+        if exclude is not None and len(exclude):
+            live[np.asarray(exclude, dtype='int64')] = False
+        term_ids = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        df = np.bincount(term_ids[live[self.rows]], minlength=len(self.vocab))
+        for term_id, (rows, _) in self.delta.items():
+            df[term_id] += int(live[rows].sum())
+        terms = list(self.vocab.items())
+        return {
+            'num_docs': int(live.sum()),
+            'total_length': float(self.doc_lengths[live].sum(dtype='float64')),
+            'document_frequencies': {term: int(df[term_id]) for term, term_id in terms if df[term_id]},
+        }
+
+    def use_collection_stats(self, num_docs, total_length, document_frequencies):
+        """score with the statistics of the whole corpus this index is one shard of
+
+        BM25 scores of different shards are only comparable when they share the idf and
+        the average document length; the given ones are kept through compactions until
+        replaced. document_frequencies: term -> df, terms missing from it keep their own
+        """
+        df = np.diff(self.indptr).astype('float64')
+        for term, term_id in self.vocab.items():
+            if term_id < len(df):
+                df[term_id] = document_frequencies.get(term, df[term_id])
+        self.collection = (num_docs, total_length / num_docs if num_docs else 1.0, df)
+        self._derive()
+
+    def add(self, document):
+        """append one document as the next row without rebuilding the postings"""
+        row = self.num_docs
+        counts, length = self._term_frequencies(document)
+        self.doc_lengths = np.append(self.doc_lengths, np.float32(length))
+        for token, tf in counts.items():
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                term_id = self.vocab[token] = len(self.vocab)
+                self.indptr = np.append(self.indptr, self.indptr[-1])
+                self.idf = np.append(self.idf, np.float32(np.log1p((self.fitted_docs + 0.5) / 1.5)))
+                self.upper_bounds = np.append(self.upper_bounds, np.float32(0))
+            rows, frequencies = self.delta.setdefault(term_id, ([], []))
+            rows.append(row)
+            frequencies.append(tf)
+            weight = self._weights(np.float32(tf), np.float32(length), self.idf[term_id])
+            self.upper_bounds[term_id] = max(self.upper_bounds[term_id], weight)
+        return row
+
+    def compact(self, keep):
+        """keep only the given rows (old numbering, ascending), renumber them and refresh statistics"""
+        keep = np.asarray(keep, dtype='int64')
+        remap = np.full(self.num_docs, -1, dtype='int64')
+        remap[keep] = np.arange(len(keep))
+
+        term_ids = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        doc_rows, frequencies = self.rows.astype('int64'), self.tf
+        if self.delta:
+            delta_terms = np.concatenate([np.full(len(rows), t) for t, (rows, _) in self.delta.items()])
+            delta_rows = np.concatenate([np.array(rows) for rows, _ in self.delta.values()])
+            delta_tf = np.concatenate([np.array(tf, dtype='float32') for _, tf in self.delta.values()])
+            term_ids = np.concatenate([term_ids, delta_terms])
+            doc_rows = np.concatenate([doc_rows, delta_rows])
+            frequencies = np.concatenate([frequencies, delta_tf])
+
+        live = remap[doc_rows] >= 0
+        matrix = coo_matrix(
+            (frequencies[live], (remap[doc_rows[live]], term_ids[live])),
+            shape=(len(keep), len(self.vocab)),
+        ).tocsc()
+        matrix.sort_indices()
+
+        self.indptr = matrix.indptr.astype('int64')
+        self.rows = matrix.indices.astype('int32')
+        self.tf = matrix.data.astype('float32')
+        self.doc_lengths = self.doc_lengths[keep]
+        self.delta = {}
+        self._derive()
+
+    def _query_terms(self, query):
+        counts = {}
+        for token in tokenize(query):
+            term_id = self.vocab.get(token)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        return counts
+
+    def _postings(self, term_id):
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        rows, weights = self.rows[start:end], self.weights[start:end]
+        if term_id in self.delta:
+            delta_rows, delta_tf = self.delta[term_id]
+            delta_rows = np.array(delta_rows, dtype='int32')
+            delta_weights = self._weights(
+                np.array(delta_tf, dtype='float32'), self.doc_lengths[delta_rows], self.idf[term_id]
+            )
+            rows, weights = np.concatenate([rows, delta_rows]), np.concatenate([weights, delta_weights])
+        return rows, weights
+
+    def top_k(self, query, k, exclude=None, allowed=None):
+        """best k rows for query as (rows, scores), best first
+
+        term-at-a-time MaxScore: terms are processed by decreasing upper bound and once
+        the current k-th score beats the summed bounds of the remaining terms, those
+        terms can only re-score existing candidates, so their postings are probed with
+        a binary search instead of being merged in.
+        exclude / allowed: optional sorted row arrays removed from / required for results
+        """
+        terms = self._query_terms(query)
+        if not terms or k <= 0:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32')
+
+        order = sorted(terms, key=lambda t: self.upper_bounds[t] * terms[t], reverse=True)
+        bounds = np.array([self.upper_bounds[t] * terms[t] for t in order], dtype='float32')
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])
+
+        cand_rows = np.zeros(0, dtype='int64')
+        cand_scores = np.zeros(0, dtype='float32')
+        for i, term_id in enumerate(order):
+            rows, weights = self._postings(term_id)
+            weights = weights * terms[term_id]
+            threshold = np.partition(cand_scores, -k)[-k] if len(cand_scores) >= k else 0.0
+
+            if len(cand_scores) >= k and threshold >= remaining[i]:
+                # non-essential term: only candidates already seen can still change rank
+                positions = np.searchsorted(rows, cand_rows)
+                positions = np.minimum(positions, max(len(rows) - 1, 0))
+                hit = (rows[positions] == cand_rows) if len(rows) else np.zeros(len(cand_rows), dtype=bool)
+                cand_scores[hit] += weights[positions[hit]]
+                # drop candidates that cannot reach the k-th score any more
+                survivors = cand_scores + remaining[i + 1] >= threshold
+                cand_rows, cand_scores = cand_rows[survivors], cand_scores[survivors]
+                continue
+
+            if exclude is not None and len(exclude):
+                keep = ~np.isin(rows, exclude, assume_unique=True)
+                rows, weights = rows[keep], weights[keep]
+            if allowed is not None:
+                keep = np.isin(rows, allowed, assume_unique=True)
+                rows, weights = rows[keep], weights[keep]
+            merged_rows = np.concatenate([cand_rows, rows.astype('int64')])
+            merged_scores = np.concatenate([cand_scores, weights])
+            cand_rows, inverse = np.unique(merged_rows, return_inverse=True)
+            cand_scores = np.bincount(inverse, weights=merged_scores).astype('float32')
+
+        if len(cand_rows) > k:
+            top = np.argpartition(-cand_scores, k - 1)[:k]
+            cand_rows, cand_scores = cand_rows[top], cand_scores[top]
+        order = np.argsort(-cand_scores, kind='stable')
+        return cand_rows[order], cand_scores[order]
+
+    def score_rows(self, query, rows):
+        """exact BM25 scores of the given rows, probing postings by binary search"""
+        rows = np.asarray(rows, dtype='int64')
+        scores = np.zeros(len(rows), dtype='float32')
+        if not len(rows):
+            return scores
+        for term_id, count in self._query_terms(query).items():
+            term_rows, weights = self._postings(term_id)
+            if not len(term_rows):
+                continue
+            positions = np.minimum(np.searchsorted(term_rows, rows), len(term_rows) - 1)
+            hit = term_rows[positions] == rows
+            scores[hit] += weights[positions[hit]] * count
+        return scores
+
+    def weight_matrix(self):
+        """postings as a (terms x rows) CSR matrix of BM25 weights, delta postings included"""
+        shape = (len(self.indptr) - 1, self.num_docs)
+        matrix = csr_matrix((self.weights, self.rows, self.indptr), shape=shape)
+        if self.delta:
+            term_ids, rows, weights = [], [], []
+            for term_id, (delta_rows, delta_tf) in self.delta.items():
+                delta_rows = np.array(delta_rows, dtype='int64')
+                term_ids.append(np.full(len(delta_rows), term_id, dtype='int64'))
+                rows.append(delta_rows)
+                weights.append(self._weights(
+                    np.array(delta_tf, dtype='float32'), self.doc_lengths[delta_rows], self.idf[term_id]
+                ))
+            matrix = matrix + coo_matrix(
+                (np.concatenate(weights), (np.concatenate(term_ids), np.concatenate(rows))), shape=shape
+            ).tocsr()
+        return matrix
+
+    def score_batch(self, queries, weight_matrix=None):
+        """BM25 scores of every row for several queries as one sparse (queries x rows) CSR matrix
+
+        a single product of the query-term counts with the posting weights; rows are
+        sorted so one row's scores can be probed by binary search, rows matching no
+        query term are absent. weight_matrix: weight_matrix() computed once when
+        scoring many chunks of queries
+        """
+        query_rows, term_ids, counts = [], [], []
+        for i, query in enumerate(queries):
+            for term_id, count in self._query_terms(query).items():
+                query_rows.append(i)
+                term_ids.append(term_id)
+                counts.append(count)
+        query_terms = csr_matrix(
+            (np.array(counts, dtype='float32'), (np.array(query_rows, dtype='int64'), np.array(term_ids, dtype='int64'))),
+            shape=(len(queries), len(self.indptr) - 1),
+        )
+        if weight_matrix is None:
+            weight_matrix = self.weight_matrix()
+        scores = (query_terms @ weight_matrix).tocsr()
+        scores.sort_indices()
+        return scores
+
+    def save(self, path, **meta):
+        """write postings as flat .npy arrays (memory-mappable) plus vocabulary and statistics
+
+        every file is written beside its target and renamed over it, so processes that
+        still map the previous version keep reading intact data
+        """
+        if self.delta:
+            self.compact(np.arange(self.num_docs))
+        os.makedirs(path, exist_ok=True)
+
+        for name, array in (
+            (POSTINGS_INDPTR_FILE, self.indptr),
+            (POSTINGS_ROWS_FILE, self.rows),
+            (POSTINGS_TF_FILE, self.tf),
+            (POSTINGS_WEIGHTS_FILE, self.weights),
+            (DOC_LENGTHS_FILE, self.doc_lengths),
+        ):
+            atomic_write(os.path.join(path, name), lambda file: np.save(file, np.ascontiguousarray(array)), 'wb')
+        atomic_write(os.path.join(path, VOCAB_FILE), lambda file: json.dump(self.vocab, file, ensure_ascii=False))
+        atomic_write(os.path.join(path, META_FILE), lambda file: json.dump(
+            {'k1': self.k1, 'b': self.b, 'field_weights': self.field_weights, 'num_docs': self.num_docs, **meta},
+            file, indent=2,
+        ))
+
+    @staticmethod
+    def read_meta(path):
+        try:
+            with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        meta = cls.read_meta(path)
+        index = cls(k1=meta['k1'], b=meta['b'], field_weights=meta['field_weights'])
+        index.indptr = np.load(os.path.join(path, POSTINGS_INDPTR_FILE), mmap_mode=mmap_mode)
+        index.rows = np.load(os.path.join(path, POSTINGS_ROWS_FILE), mmap_mode=mmap_mode)
+        index.tf = np.load(os.path.join(path, POSTINGS_TF_FILE), mmap_mode=mmap_mode)
+        index.doc_lengths = np.load(os.path.join(path, DOC_LENGTHS_FILE))
+        with open(os.path.join(path, VOCAB_FILE), 'r', encoding='utf-8') as file:
+            index.vocab = json.load(file)
+        index._derive(weights=np.load(os.path.join(path, POSTINGS_WEIGHTS_FILE), mmap_mode=mmap_mode))
+        return index
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+KEYS_FILE = 'keys.json'
+VECTORS_FILE = 'vectors.npy'
+
+
+class EmbeddingCache:
+    """Content-hashed on-disk store of profile embeddings
+
+    entries are keyed by sha1(model name, encoder, profile text) so a rebuild only
+    encodes profiles that are new or changed since the last run, and never reuses
+    another encoder's vectors (encoder: src.encoders.encoder_id)
+    """
+
+    def __init__(self, path, model_name, encoder='torch'):
+        self.path = path
+        self.model_name = model_name
+        self.encoder = encoder
+        self.vectors = np.zeros((0, 0), dtype='float32')
+        self.positions = {}  # key -> row in self.vectors
+        self.used = set()  # keys touched since load, everything else is orphaned
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        # PyTorch keys predate the other encoders and stay as they were
+        prefix = self.model_name if self.encoder == 'torch' else f"{self.model_name}\0{self.encoder}"
+        return hashlib.sha1(f"{prefix}\0{text}".encode('utf-8')).hexdigest()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.path, KEYS_FILE), 'r', encoding='utf-8') as file:
+                keys = json.load(file)
+            vectors = np.load(os.path.join(self.path, VECTORS_FILE))
+        except (OSError, ValueError):
+            return self
+
+        if len(keys) == len(vectors):
+            self.vectors = vectors.astype('float32', copy=False)
+            self.positions = {key: i for i, key in enumerate(keys)}
+        return self
+
+    def encode(self, texts, encode_fn):
+        """return embeddings for texts, calling encode_fn only on cache misses"""
+        keys = [self.key(text) for text in texts]
+        self.used.update(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.positions and key not in missing:
+                missing[key] = text
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+
+        if missing:
+            new_vectors = np.asarray(encode_fn(list(missing.values())), dtype='float32')
+            if self.vectors.size == 0:
+                self.vectors = np.zeros((0, new_vectors.shape[1]), dtype='float32')
+            start = len(self.vectors)
+            self.vectors = np.vstack([self.vectors, new_vectors])
+            for offset, key in enumerate(missing):
+                self.positions[key] = start + offset
+
+        rows = np.fromiter((self.positions[key] for key in keys), dtype='int64', count=len(keys))
+        return self.vectors[rows]
+
+    def evict_orphans(self):
+        """drop entries no longer referenced by any profile seen since load"""
+        kept = [key for key in self.positions if key in self.used]
+        evicted = len(self.positions) - len(kept)
+        if evicted:
+            rows = np.fromiter((self.positions[key] for key in kept), dtype='int64', count=len(kept))
+            self.vectors = self.vectors[rows]
+            self.positions = {key: i for i, key in enumerate(kept)}
+        return evicted
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        keys = sorted(self.positions, key=self.positions.get)
+        np.save(os.path.join(self.path, VECTORS_FILE), np.ascontiguousarray(self.vectors, dtype='float32'))
+        with open(os.path.join(self.path, KEYS_FILE), 'w', encoding='utf-8') as file:
+            json.dump(keys, file)
+
+
+def normalize_query(query):
+    """case and whitespace insensitive cache key, the MiniLM tokenizer is uncased"""
+    return " ".join(query.lower().split())
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU map with a per-entry TTL"""
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,148 +1,829 @@
-import json
+import time
+import threading
 import faiss
 import numpy as np
-from src.preprocessing import PlayerDataProcessor
-from sentence_transformers import SentenceTransformer
+from src.ann import IndexConfig, build_ann_index, index_backend, search_parameters
+from src.bm25 import BM25Index
+from src.cache import normalize_query
+from src.encoders import encoder_id, load_encoder
+from src.filters import AttributeIndex, filter_key
+from src.names import NameIndex
+from src.neighbors import NeighborGraph
+from src.player_store import PlayerStore
+from src.query_parser import QueryParser
+from src.responses import JSONFragment
+from src.preprocessing import PROFILE_CHUNK_SIZE, PlayerCorpus, PlayerDataProcessor
+from concurrent.futures import Future
+from src.utils import chunked
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+FUSION_STRATEGIES = ('weighted', 'rrf')
+RRF_K = 60  # standard reciprocal rank fusion damping constant
+# filtered searches over at most this many rows (or this share of the index) skip the ANN index:
+# a brute-force scan is cheap there and graph search under a selective filter loses recall
+EXACT_SEARCH_LIMIT = 4096
+EXACT_SEARCH_FRACTION = 0.1
+KEYWORD_BATCH_SIZE = 256  # queries per sparse BM25 product in rank_many, bounds the score matrix
+
+
+def per_query(value, count):
+    """broadcast a single value to one per query, lists and tuples are taken as given"""
+    return list(value) if isinstance(value, (list, tuple)) else [value] * count
+
+
+def top_k_indices(scores, k):
+    """indices of the k largest scores, best first, without sorting the whole array"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype='int64')
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def sparse_lookup(indices, values, targets):
+    """values of a sparse vector (sorted indices, values) at targets, 0 where absent"""
+    found = np.zeros(len(targets), dtype='float32')
+    if len(indices):
+        positions = np.minimum(np.searchsorted(indices, targets), len(indices) - 1)
+        hit = indices[positions] == targets
+        found[hit] = values[positions[hit]]
+    return found
+
+
+def load_model(model_name, backend='torch', path=None):
+    """the model's encoder: the SentenceTransformer, or its ONNX export under path (src.encoders)"""
+    return load_encoder(model_name, backend, path)
+
+
+def load_model_async(model_name, timings=None, backend='torch', path=None):
+    """start loading the model in a background thread, returns a Future of it
+
+    timings: optional dict that receives 'model_load' seconds
+    """
+    future = Future()
+
+    def target():
+        start = time.perf_counter()
+        try:
+            model = load_model(model_name, backend, path)
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        if timings is not None:
+            timings['model_load'] = round(time.perf_counter() - start, 3)
+        future.set_result(model)
+
+    threading.Thread(target=target, name='load-model', daemon=True).start()
+    return future
+
+
+def normalize_rows(vectors):
+    """L2-normalize float32 rows so inner product is cosine similarity"""
+    vectors = np.array(vectors, dtype='float32')
+    if vectors.size:
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def similarity(inner_products):
+    """map cosine similarity in [-1, 1] to a score in [0, 1]"""
+    return np.clip((1.0 + np.asarray(inner_products, dtype='float64')) / 2.0, 0.0, 1.0)
 
 
 class PlayerEmbeddingEngine:
-    def __init__(self, model_name):
-        self.model = SentenceTransformer(model_name)
-        self.dimension = self.model.get_sentence_embedding_dimension()
+    def __init__(self, model_name, model=None, index_config=None, encoder_backend='torch', encoder_path=None):
+        """model: an already loaded model to share (e.g. when building a new index generation),
+        or a Future of one still loading (load_model_async); loaded on first use when None.
+        encoder_backend, encoder_path: how the model runs (see load_model), profiles and
+        queries both go through it
+        """
+        self.model_name = model_name
+        self._model = model
+        self.encoder_backend = encoder_backend
+        self.encoder_path = encoder_path
+        self.encoder = encoder_id(encoder_backend, encoder_path)
+        self.index_config = index_config or IndexConfig()
+        self.index_backend = None  # backend the current index was built with
         self.index = None
-        self.player_metadata = {}
-
-    def build_index(self, players_data):
-        """Build FAISS index from play profiles"""
-
-        # build player profiles 
-        profiles = []
-        player_ids = []
-
-        processor = PlayerDataProcessor()
-        # ==========
-        sub_tmp = []
-        for player in players_data:
-            player_id = player.get('playerId', '')
-            profile_text = processor.build_player_profile(player)
-            tmp_dict = {
-                'player_id': player_id,
-                'player_name': player.get('fullName', ''),
-                'player_en': profile_text
-            }
-            profiles.append(profile_text)
-            player_ids.append(player_id)
-            sub_tmp.append(tmp_dict)
-
-            # store metadata for retrieval 
-            self.player_metadata[player_id] = player
-        
-        with open("tmp_data.json", 'w', encoding='utf-8') as file:
-            json.dump(sub_tmp, file, ensure_ascii=False)
+        self.embeddings = None
+        self.player_ids = []  # row -> player id, rows are the FAISS labels
+        self.id_to_row = {}
+        self.deleted = set()  # tombstoned rows, dropped on the next compaction
+        self.read_only = False  # index mapped by a read-only worker, writing to it would crash the process
+        self.player_metadata = PlayerStore()  # rows aligned with player_ids
+        self.neighbor_graph = None  # optional NeighborGraph over the stored vectors, same rows
+        self.corpus = None  # PlayerCorpus of the last build_index, handed to the keyword index
+        self.processor = PlayerDataProcessor()
+        # guards index/rows against concurrent upserts, deletes and compaction
+        self.lock = threading.RLock()
+        self.version = 0
+        self.batcher = None  # optional QueryBatcher
+        self.query_embedding_cache = None  # optional LRUCache: normalized query -> embedding
+        self.result_cache = None  # optional LRUCache: (search, query, params, version) -> ranked ids
 
-        # create embeddings 
+    @property
+    def model(self):
+        if isinstance(self._model, Future):
+            self._model = self._model.result()
+        elif self._model is None:
+            self._model = load_model(self.model_name, self.encoder_backend, self.encoder_path)
+        return self._model
+
+    @property
+    def model_ready(self):
+        """the model is loaded, so using it does not block"""
+        return self._model is not None and (not isinstance(self._model, Future) or self._model.done())
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode_profiles(self, profiles):
         embeddings = self.model.encode(profiles, show_progress_bar=True)
-        embeddings = np.array(embeddings).astype('float32')
+        return normalize_rows(embeddings)
 
-        # build FAISS index (using HNSW for better recall)
-        self.index = faiss.IndexHNSWFlat(self.dimension, 32)
-        self.index.hnsw.efConstruction = 200
-        self.index.add(embeddings)
-        self.player_ids = player_ids  # store player IDs mapping
+    def build_index(self, players_data, cache=None):
+        """Build FAISS index from play profiles
+
+        players_data is read once, so a stream such as JsonlDataset works as well as a list
+        cache: optional EmbeddingCache, only new or changed profiles are encoded
+        """
+
+        # one feature pass: profiles and keyword fields for both indexes, plus metadata for
+        # retrieval (compacted column by column), a chunk of player dicts at a time
+        corpus = PlayerCorpus(self.processor)
+        metadata = PlayerStore()
+        for chunk in chunked(players_data, PROFILE_CHUNK_SIZE):
+            corpus.add(chunk)
+            metadata.extend(corpus.player_ids[-len(chunk):], chunk)
+        profiles = corpus.profiles
+
+        # create embeddings 
+        if cache is not None:
+            # entries written before vectors were normalized are normalized on the way out
+            embeddings = normalize_rows(cache.encode(profiles, self.encode_profiles))
+            evicted = cache.evict_orphans()
+            cache.save()
+            print(f"Embedding cache: {cache.misses} encoded, {cache.hits} reused, {evicted} evicted")
+        else:
+            embeddings = self.encode_profiles(profiles)
+
+        with self.lock:
+            self.index = self._new_index(embeddings)
+            self.index_backend = index_backend(self.index)
+            self.embeddings = embeddings
+            self.player_ids = list(corpus.player_ids)  # store player IDs mapping
+            self.player_metadata = metadata
+            self.corpus = corpus  # until the keyword index has taken its documents
+            self.neighbor_graph = None  # rows changed meaning
+            self.deleted = set()
+            self.rebuild_id_map()
+            self.version += 1
 
         return self.index
 
-    def search(self, query, top_k=5):
-        """Semantic search for players"""
-        if not self.index:
-            raise ValueError("Index not built yet")
+    def release_corpus(self):
+        """hand over the PlayerCorpus of the last build_index (None when there is none) and drop it"""
+        with self.lock:
+            corpus, self.corpus = self.corpus, None
+        return corpus
+
+    def _new_index(self, embeddings):
+        # build FAISS index with the configured backend, labelled by row
+        index, _ = build_ann_index(self.index_config, self.dimension, embeddings)
+        return index
+
+    def rebuild_id_map(self):
+        self.id_to_row = {
+            player_id: row for row, player_id in enumerate(self.player_ids)
+            if row not in self.deleted
+        }
+
+    @property
+    def live_count(self):
+        return len(self.player_ids) - len(self.deleted)
+
+    def upsert_player(self, player, on_insert=None):
+        """add or replace one player without rebuilding the index, returns (row, profile)
 
-        # embedding query 
-        query_embedding = self.model.encode([query]).astype('float32')
+        on_insert(row, profile) runs under the lock so row-aligned structures stay in step
+        """
+        if self.read_only:
+            raise RuntimeError("The index is read-only, rebuild it to add players")
+        player_id = player['playerId']
+        profile_text = self.processor.build_player_profile(player)
+        embedding = self.encode_profiles([profile_text])
+
+        with self.lock:
+            if on_insert is not None:
+                on_insert(len(self.player_ids), profile_text)
+            old_row = self.id_to_row.get(player_id)
+            if old_row is not None:
+                self.deleted.add(old_row)
+
+            row = len(self.player_ids)
+            self.player_ids.append(player_id)
+            self.embeddings = np.vstack([self.embeddings, embedding])
+            self.index.add_with_ids(embedding, np.array([row], dtype='int64'))
+            self.id_to_row[player_id] = row
+            self.player_metadata.append(player_id, player)
+            self.version += 1
+        return row, profile_text
+
+    def delete_player(self, player_id):
+        """tombstone a player, returns its row or None when unknown"""
+        if self.read_only:
+            raise RuntimeError("The index is read-only, rebuild it to remove players")
+        with self.lock:
+            row = self.id_to_row.pop(player_id, None)
+            if row is None:
+                return None
+            self.deleted.add(row)
+            self.player_metadata.remove(player_id)
+            self.version += 1
+        return row
+
+    def deleted_ratio(self):
+        return len(self.deleted) / len(self.player_ids) if self.player_ids else 0.0
+
+    def compact(self, on_swap=None):
+        """rebuild the index without tombstoned rows
+
+        on_swap(keep) runs under the lock with the kept rows (old numbering) so callers
+        can compact row-aligned structures; returns keep, or None when a concurrent
+        write raced the rebuild
+        """
+        with self.lock:
+            version = self.version
+            keep = np.array(
+                [row for row in range(len(self.player_ids)) if row not in self.deleted], dtype='int64'
+            )
+            embeddings = np.ascontiguousarray(self.embeddings[keep])
+            player_ids = [self.player_ids[row] for row in keep]
+
+        # the expensive part runs without the lock, searches keep using the old index
+        index = self._new_index(embeddings)
 
-        # search 
-        scores, indicies = self.index.search(query_embedding, top_k)
+        with self.lock:
+            if version != self.version:
+                return None
+            if on_swap is not None:
+                on_swap(keep)
+            if self.neighbor_graph is not None:
+                self.neighbor_graph.compact(keep, len(self.player_ids))
+            self.index = index
+            self.index_backend = index_backend(index)
+            self.embeddings = embeddings
+            self.player_ids = player_ids
+            self.player_metadata.compact(keep)
+            self.deleted = set()
+            self.rebuild_id_map()
+            self.version += 1
+        return keep
 
-        # prepare results 
+    def encode_queries(self, queries, use_cache=True):
+        """unit query embeddings; use_cache=False encodes everything in one call and leaves
+        the query LRU untouched, for bulk jobs that would otherwise flush it
+        """
+        cache = self.query_embedding_cache if use_cache else None
+        if cache is None:
+            return normalize_rows(self.model.encode(queries))
+
+        keys = [normalize_query(query) for query in queries]
+        embeddings = [cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = normalize_rows(self.model.encode([keys[i] for i in missing]))
+            for i, embedding in zip(missing, encoded):
+                cache.put(keys[i], embedding)
+                embeddings[i] = embedding
+        return np.vstack(embeddings)
+
+    def materialize(self, ranked, score_field, fields=None, encoded=False):
+        """turn ranked (player_id, score) pairs into result dicts
+
+        fields: optional projection of player_data (see src.player_store.project)
+        encoded: player_data as a cached JSONFragment instead of a dict
+        """
+        metadata = self.player_metadata
         results = []
-        for i, (score, idx) in enumerate(zip(scores[0], indicies[0])):
-            if idx != -1:
-                player_id = self.player_ids[idx]
-                player_data = self.player_metadata[player_id]
-
-                results.append({
-                    'rank': i + 1,
-                    'player_id': player_id,
-                    'similarity_score': float(score),
-                    'player_data': player_data
-                })
+        for player_id, score in ranked:
+            row = metadata.id_to_row.get(player_id)
+            if row is None:
+                continue
+            player_data = (
+                JSONFragment(metadata.fragment(row, fields)) if encoded else metadata.record(row, fields=fields)
+            )
+            results.append({
+                'rank': len(results) + 1,
+                'player_id': player_id,
+                score_field: score,
+                'player_data': player_data
+            })
         return results
 
+    def rank(self, query, top_k=5, allowed=None, filter_key=None, min_score=None, embedding=None):
+        """Semantic search for players as ranked (player_id, similarity) pairs
+
+        allowed: optional sorted array of rows the results are restricted to
+        filter_key: hashable description of the filter behind allowed, for caching
+        min_score: stop at the first hit scoring below it, scores are in [0, 1]
+        embedding: the query's unit vector when the caller already encoded it
+        """
+        if not self.index:
+            raise ValueError("Index not built yet")
+
+        # any upsert/delete bumps the version, so cached rankings of older states are never hit
+        cache_key = ('semantic', normalize_query(query), top_k, filter_key, min_score, self.version)
+        if self.result_cache is not None:
+            ranked = self.result_cache.get(cache_key)
+            if ranked is not None:
+                return ranked
+
+        if embedding is not None:
+            ranked = self.rank_vectors(embedding[None, :], top_k, allowed=allowed, min_score=min_score)[0]
+        # concurrent unfiltered queries are coalesced into one encode + index search when batching is on
+        elif self.batcher is not None and allowed is None:
+            ranked = self.batcher.search(query, top_k, min_score)
+        else:
+            ranked = self.rank_batch([query], top_k, allowed=allowed, min_score=min_score)[0]
+
+        if self.result_cache is not None:
+            self.result_cache.put(cache_key, ranked)
+        return ranked
+
+    def search(self, query, top_k=5, allowed=None, filter_key=None, min_score=None, fields=None, encoded=False):
+        """Semantic search for players, see rank() and materialize() for the arguments"""
+        ranked = self.rank(query, top_k, allowed=allowed, filter_key=filter_key, min_score=min_score)
+        return self.materialize(ranked, 'similarity_score', fields, encoded)
+
+    def _search_allowed(self, query_embeddings, fetch_k, allowed):
+        """index search restricted to allowed rows, exact over the stored vectors for small sets"""
+        if len(allowed) <= max(EXACT_SEARCH_LIMIT, EXACT_SEARCH_FRACTION * len(self.player_ids)):
+            vectors = np.asarray(self.embeddings[allowed], dtype='float32')
+            inner_products = query_embeddings @ vectors.T
+            scores = np.full((len(query_embeddings), fetch_k), -np.inf, dtype='float32')
+            indicies = np.full((len(query_embeddings), fetch_k), -1, dtype='int64')
+            for i, row_scores in enumerate(inner_products):
+                top = top_k_indices(row_scores, fetch_k)
+                scores[i, :len(top)] = row_scores[top]
+                indicies[i, :len(top)] = allowed[top]
+            return scores, indicies
+
+        mask = np.zeros(len(self.player_ids), dtype=bool)
+        mask[allowed] = True
+        bitmap = np.packbits(mask, bitorder='little')  # must outlive the search call
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+        params = search_parameters(self.index, self.index_config, selector, fetch_k)
+        return self.index.search(query_embeddings, fetch_k, params=params)
+
+    def rank_batch(self, queries, top_k=5, allowed=None, min_score=None):
+        """Semantic search for several queries with one encode and one index search
+
+        top_k: a single value or one value per query
+        allowed: optional sorted array of rows all queries are restricted to
+        min_score: None, a single value or one value per query; hits come best first, so
+                   collecting stops at the first one below it
+        returns one list of (player_id, similarity) pairs per query
+        """
+        if not self.index:
+            raise ValueError("Index not built yet")
+        if allowed is not None and len(allowed) == 0:
+            return [[] for _ in queries]
+
+        # embedding queries 
+        query_embeddings = self.encode_queries(queries)
+        return self.rank_vectors(query_embeddings, top_k, allowed=allowed, min_score=min_score)
+
+    def rank_vectors(self, query_embeddings, top_k=5, allowed=None, min_score=None):
+        """rank_batch() for already encoded unit query vectors"""
+        if not self.index:
+            raise ValueError("Index not built yet")
+
+        top_ks = per_query(top_k, len(query_embeddings))
+        min_scores = per_query(min_score, len(query_embeddings))
+        if allowed is not None and len(allowed) == 0:
+            return [[] for _ in query_embeddings]
+
+        with self.lock:
+            if allowed is not None:
+                allowed = np.setdiff1d(allowed, np.fromiter(self.deleted, dtype='int64'), assume_unique=True)
+                fetch_k = min(max(top_ks), len(allowed))
+                if fetch_k == 0:
+                    return [[] for _ in query_embeddings]
+                scores, indicies = self._search_allowed(query_embeddings, fetch_k, allowed)
+            else:
+                # search, over-fetching by the number of tombstones still in the index
+                fetch_k = min(max(top_ks) + len(self.deleted), self.index.ntotal)
+                scores, indicies = self.index.search(query_embeddings, fetch_k)
+
+            # prepare results, inner products of unit vectors become [0, 1] similarities
+            batch_ranked = []
+            for row_scores, row_indicies, k, floor in zip(similarity(scores), indicies, top_ks, min_scores):
+                ranked = []
+                for score, idx in zip(row_scores, row_indicies):
+                    if len(ranked) == k or (floor is not None and score < floor):
+                        break
+                    if idx != -1 and idx not in self.deleted:
+                        ranked.append((self.player_ids[idx], float(score)))
+                batch_ranked.append(ranked)
+        return batch_ranked
+
+    def build_neighbor_graph(self, k=50):
+        """precompute every stored player's k nearest neighbours for similar()"""
+        with self.lock:
+            self.neighbor_graph = NeighborGraph(k).build(self.index, self.embeddings, similarity, exclude=self.deleted)
+        return self.neighbor_graph
+
+    def similar(self, player_id, k=10, allowed=None, min_score=None):
+        """players closest to a stored player's own vector as ranked (player_id, similarity) pairs
+
+        answered from the neighbour graph when its list still holds k live, allowed
+        players (or everything above min_score), otherwise by an index search with the
+        stored vector; nothing is re-encoded. Once players were upserted after the graph
+        was built it lists none of them, so every lookup searches the index until the
+        next build. Returns None for unknown players.
+        """
+        with self.lock:
+            row = self.id_to_row.get(player_id)
+            if row is None:
+                return None
+
+            graph = self.neighbor_graph
+            # rows appended since the build are nobody's neighbour in the graph
+            if graph is not None and graph.num_rows == len(self.player_ids):
+                rows, scores = graph.neighbors(row)
+                below_floor = min_score is not None and len(scores) and scores[-1] < min_score
+                keep = np.array([neighbor not in self.deleted for neighbor in rows.tolist()], dtype=bool)
+                if allowed is not None:
+                    keep &= np.isin(rows, allowed, assume_unique=True)
+                if min_score is not None:
+                    keep &= scores >= min_score
+                rows, scores = rows[keep][:k], scores[keep][:k]
+                if len(rows) == k or graph.complete() or below_floor:
+                    return [(self.player_ids[neighbor], float(score)) for neighbor, score in zip(rows, scores)]
+
+            query_embedding = np.asarray(self.embeddings[row:row + 1], dtype='float32')
+            if allowed is not None:
+                allowed = allowed[allowed != row]
+            ranked = self.rank_vectors(query_embedding, k + 1, allowed=allowed, min_score=min_score)[0]
+        return [(neighbor_id, score) for neighbor_id, score in ranked if neighbor_id != player_id][:k]
+
+    def search_batch(self, queries, top_k=5, allowed=None, min_score=None, fields=None, encoded=False):
+        """rank_batch() with every ranking materialized into result dicts"""
+        return [
+            self.materialize(ranked, 'similarity_score', fields, encoded)
+            for ranked in self.rank_batch(queries, top_k, allowed=allowed, min_score=min_score)
+        ]
+
 
 class HybridPlayerSearch:
-    def __init__(self, embedding_engine):
+    def __init__(self, embedding_engine, compaction_threshold=0.1, fusion='weighted'):
         self.embedding_engine = embedding_engine
-        self.tfidf_vectorizer = None
-        self.tfidf_matrix = None
-        self.profiles = []
-
-    def build_tfidf_index(self, players_data):
-        """Build TF-IDF index for keyword search"""
-        processor = PlayerDataProcessor()
-        self.profiles = []
-        for player in players_data:
-            profile = processor.build_player_profile(player)
-            self.profiles.append(profile)
-
-        # build TF-IDF vectorizer 
-        self.tfidf_vectorizer = TfidfVectorizer(
-            max_features=5000,  # only keep 5000 important features
-            stop_words='english',  # remove stop words like: the, is, and, in, ...
-            ngram_range=(1, 2),  # get unigram (one word) and bigram
-            max_df=0.8,  # remove words that appear more than 80% in document
-            min_df=2
+        self.fusion = fusion
+        self.keyword_index = None  # BM25Index, rows aligned with embedding_engine.player_ids
+        self.attribute_index = None  # AttributeIndex, same rows
+        self.query_parser = None  # QueryParser over attribute_index, spaCy loads on first parse
+        self.name_index = None  # NameIndex over player and club names, keyed by player id
+        self.compaction_threshold = compaction_threshold
+        self.source_checksum = None  # checksum of the data file the indexes were built from
+
+    def build_keyword_index(self, players_data=None):
+        """Build BM25 inverted index for keyword search
+
+        reuses the profiles of the embedding index build when it left its corpus,
+        otherwise builds the documents from players_data
+        """
+        engine = self.embedding_engine
+        corpus = engine.release_corpus()
+        if corpus is None:
+            corpus = PlayerCorpus.build(players_data, engine.processor)
+        self.keyword_index = BM25Index().fit(corpus.documents)
+
+    def build_attribute_index(self):
+        """Build structured filter indexes from the engine metadata, in row order"""
+        engine = self.embedding_engine
+        with engine.lock:
+            # tombstoned rows still need a slot to keep rows aligned
+            metadata = engine.player_metadata
+            players = [metadata.record(row, detail=False) for row in range(len(engine.player_ids))]
+            self.use_attribute_index(AttributeIndex().build(players))
+
+    def use_attribute_index(self, attribute_index):
+        self.attribute_index = attribute_index
+        # the gazetteer follows the attribute index it was built from
+        self.query_parser = QueryParser(attribute_index)
+
+    def build_name_index(self):
+        """Build the autocomplete / exact name index from the live players in the engine metadata"""
+        engine = self.embedding_engine
+        with engine.lock:
+            metadata = engine.player_metadata
+            fields = ('fullName', 'current_club.clubName', 'club_history')
+            players = [(player_id, metadata.record(row, fields=fields)) for player_id, row in engine.id_to_row.items()]
+        self.name_index = NameIndex().build(players)
+
+    def is_live(self, player_id):
+        return player_id in self.embedding_engine.id_to_row
+
+    def warm_up(self, query="warm up"):
+        """send one query through the model, the vector index and the keyword index
+
+        the first forward pass and the first touches of memory-mapped files are slow,
+        so this runs before a generation serves traffic; caches are left untouched
+        """
+        engine = self.embedding_engine
+        if engine.index.d != engine.dimension:
+            raise ValueError(
+                f"Index dimension {engine.index.d} does not match the model's {engine.dimension}, rebuild the index"
+            )
+        engine.rank_vectors(engine.encode_queries([query], use_cache=False), top_k=10)
+        if self.keyword_index is not None:
+            self.keyword_index.top_k(query, 10)
+        self.suggest(query)
+
+    def suggest(self, query, limit=10):
+        """name completions for a partly typed player or club name"""
+        if self.name_index is None:
+            return []
+        return self.name_index.suggest(query, limit, is_live=self.is_live)
+
+    def name_match(self, query, top_k=10, filters=None, min_score=None):
+        """ranked (player_id, score) when the query is exactly a player's name, otherwise None
+
+        the named players come first with score 1.0, followed by the players most similar
+        to the first of them; nothing is encoded
+        """
+        if self.name_index is None:
+            return None
+        player_ids = self.name_index.exact_players(query, is_live=self.is_live)
+        if not player_ids:
+            return None
+
+        engine = self.embedding_engine
+        allowed = self.select(filters)
+        if allowed is not None:
+            allowed_ids = {engine.player_ids[row] for row in allowed.tolist()}
+            player_ids = [player_id for player_id in player_ids if player_id in allowed_ids]
+            if not player_ids:
+                return None
+
+        ranked = [(player_id, 1.0) for player_id in player_ids[:top_k]]
+        if len(ranked) < top_k:
+            named = set(player_ids)
+            similar = engine.similar(player_ids[0], top_k, allowed=allowed, min_score=min_score) or []
+            ranked += [pair for pair in similar if pair[0] not in named][:top_k - len(ranked)]
+        return ranked
+
+    def select(self, filters):
+        """rows matching the structured filters, None when there are none"""
+        if not filters or self.attribute_index is None:
+            return None
+        return self.attribute_index.select(filters)
+
+    def understand(self, query, filters=None):
+        """split natural-language constraints out of a query
+
+        returns (free text, filters, parsed filters); filters given explicitly
+        take precedence over the ones found in the query
+        """
+        if self.query_parser is None:
+            return query, filters, {}
+        if self.name_index is not None and self.name_index.exact_players(query, is_live=self.is_live):
+            return query, filters, {}  # a player's name, even one containing a club or country
+        parsed = self.query_parser.parse(query)
+        merged = dict(parsed.filters)
+        merged.update({key: value for key, value in (filters or {}).items() if value not in (None, [], ())})
+        return parsed.text, merged or None, parsed.filters
+
+    def upsert_player(self, player):
+        """add or replace one player in the vector, keyword and attribute indexes"""
+        processor = self.embedding_engine.processor
+
+        def add_rows(row, profile):
+            # collection statistics stay frozen until the next compaction refreshes them
+            self.keyword_index.add(processor.build_search_fields(player, profile))
+            if self.attribute_index is not None:
+                self.attribute_index.add(player)
+            if self.name_index is not None:
+                self.name_index.add(player['playerId'], player)
+
+        self.embedding_engine.upsert_player(player, on_insert=add_rows)
+
+    def delete_player(self, player_id):
+        return self.embedding_engine.delete_player(player_id) is not None
+
+    def compact(self):
+        """drop tombstoned rows from every index and refresh the BM25 statistics"""
+        def compact_rows(keep):
+            self.keyword_index.compact(keep)
+            if self.attribute_index is not None:
+                self.attribute_index.compact(keep)
+
+        return self.embedding_engine.compact(on_swap=compact_rows) is not None
+
+    def compact_if_needed(self):
+        if self.embedding_engine.deleted_ratio() < self.compaction_threshold:
+            return False
+        return self.compact()
+
+    def semantic_search(self, query, top_k=10, filters=None, min_score=None, fields=None, encoded=False):
+        """semantic-only search with optional structured filters, score cutoff and projection"""
+        allowed = self.select(filters)
+        return self.embedding_engine.search(
+            query, top_k, allowed=allowed, filter_key=filter_key(filters), min_score=min_score,
+            fields=fields, encoded=encoded
         )
-        self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(self.profiles)  # train
 
-    def hybrid_search(self, query, top_k=10, alpha=0.7):
+    def _fuse(self, semantic_rows, keyword_rows, keyword_scores, score_keywords, query_embedding,
+              top_k, alpha, fusion, min_score):
+        """combine semantic and BM25 candidates into a ranked list of (player_id, score)
+
+        score_keywords(rows) returns the BM25 score of any row; the caller holds the engine lock
         """
-        Combine semantic - TF-IDF search 
+        engine = self.embedding_engine
+        # combine semantic scores with BM25 scores over the union of both candidate lists
+        candidates = np.union1d(semantic_rows, keyword_rows)
+        if fusion == 'rrf':
+            semantic_pos = np.searchsorted(candidates, semantic_rows)
+            keyword_pos = np.searchsorted(candidates, keyword_rows)
+            final_scores = np.zeros(len(candidates))
+            final_scores[semantic_pos] += alpha / (RRF_K + np.arange(1, len(semantic_rows) + 1))
+            final_scores[keyword_pos] += (1 - alpha) / (RRF_K + np.arange(1, len(keyword_rows) + 1))
+        else:
+            # both halves are on [0, 1]: BM25 relative to the best keyword hit, cosine
+            # similarity of every candidate (keyword-only hits included) from the stored
+            # unit vectors
+            peak = keyword_scores[0] if len(keyword_scores) else 0.0
+            final_scores = np.asarray(score_keywords(candidates), dtype='float64')
+            final_scores = (1 - alpha) * (final_scores / peak if peak > 0 else final_scores)
+            vectors = np.asarray(engine.embeddings[candidates], dtype='float32')
+            final_scores += alpha * similarity(vectors @ query_embedding)
+
+        # Re-rank and return top results
+        top = top_k_indices(final_scores, top_k)
+        if min_score is not None and fusion == 'weighted':
+            top = top[final_scores[top] >= min_score]
+        return [(engine.player_ids[candidates[i]], float(final_scores[i])) for i in top]
+
+    def similar_players(self, player_id, k=10, filters=None, min_score=None, fields=None, encoded=False):
+        """players like player_id from its stored vector, None when the player is unknown"""
+        engine = self.embedding_engine
+        ranked = engine.similar(player_id, k, allowed=self.select(filters), min_score=min_score)
+        if ranked is None:
+            return None
+        return engine.materialize(ranked, 'similarity_score', fields, encoded)
+
+    def hybrid_search(self, query, top_k=10, alpha=0.7, fusion=None, filters=None, min_score=None,
+                      fields=None, encoded=False):
+        """
+        Combine semantic - BM25 keyword search 
         alpha: weight for semantic search (70% semantic)
+        fusion: 'weighted' (normalized weighted sum) or 'rrf' (reciprocal rank fusion),
+                defaults to self.fusion
+        filters: structured filters (see src.filters) restricting both searches
+        min_score: cutoff on the [0, 1] combined score with weighted fusion; rrf scores are
+                   rank based, there it cuts the semantic candidates by similarity
+        fields, encoded: projection and encoding of player_data, see materialize()
         """
+        fusion = fusion or self.fusion
+        if fusion not in FUSION_STRATEGIES:
+            raise ValueError(f"Unknown fusion strategy '{fusion}', use one of {FUSION_STRATEGIES}")
+
+        engine = self.embedding_engine
+        # an exact player name skips encoding and fusion altogether
+        ranked = self.name_match(query, top_k, filters=filters, min_score=min_score)
+        if ranked is not None:
+            return engine.materialize(ranked, 'combined_score', fields, encoded)
+
+        filters_key = filter_key(filters)
+        cache_key = ('hybrid', normalize_query(query), top_k, alpha, fusion, filters_key, min_score, engine.version)
+        result_cache = engine.result_cache
+        if result_cache is not None:
+            ranked = result_cache.get(cache_key)
+            if ranked is not None:
+                return engine.materialize(ranked, 'combined_score', fields, encoded)
+
+        # structured pre-selection restricts both the vector and the keyword search
+        allowed = self.select(filters)
+        if allowed is not None and len(allowed) == 0:
+            return []
+
+        # weighted fusion scores every candidate against the query embedding, the semantic
+        # search below takes the same vector so the query is encoded once
+        query_embedding = engine.encode_queries([query])[0] if fusion == 'weighted' else None
+
         # semantic search 
-        semantic_results = self.embedding_engine.search(query, top_k)
-
-        # TF-IDF search 
-        query_vector = self.tfidf_vectorizer.transform([query])
-        tfidf_scores = cosine_similarity(query_vector, self.tfidf_matrix).flatten()
-
-        # combine semantic scores with TF-IDF scores 
-        final_scores = {}
-        for result in semantic_results:
-            player_id = result['player_id']
-            semantic_score = 1 / (1 + result['similarity_score'])
-            final_scores[player_id] = alpha * semantic_score
-
-        for idx, tfidf_score in enumerate(tfidf_scores):
-            player_id = self.embedding_engine.player_ids[idx]
-            if player_id in final_scores:
-                final_scores[player_id] += (1 - alpha) * tfidf_score
-            else:
-                final_scores[player_id] = (1 - alpha) * tfidf_score
+        semantic_floor = min_score if fusion == 'rrf' else None
+        semantic_ranked = engine.rank(query, top_k, allowed=allowed, filter_key=filters_key, min_score=semantic_floor,
+                                      embedding=query_embedding)
 
-                # Re-rank and return top results
-        sorted_players = sorted(final_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        with engine.lock:
+            # semantic candidates as row positions, skipping players deleted since the search
+            semantic_rows = np.array(
+                [engine.id_to_row.get(player_id, -1) for player_id, _ in semantic_ranked], dtype='int64'
+            )
+            semantic_rows = semantic_rows[semantic_rows >= 0]
 
-        results = []
-        for rank, (player_id, score) in enumerate(sorted_players):
-            player_data = self.embedding_engine.player_metadata[player_id]
-            results.append({
-                'rank': rank + 1,
-                'player_id': player_id,
-                'combined_score': score,
-                'player_data': player_data
-            })
+            # BM25 search, only the postings of the query terms are visited
+            deleted = np.array(sorted(engine.deleted), dtype='int64')
+            keyword_rows, keyword_scores = self.keyword_index.top_k(query, top_k, exclude=deleted, allowed=allowed)
+
+            ranked = self._fuse(
+                semantic_rows, keyword_rows, keyword_scores, lambda rows: self.keyword_index.score_rows(query, rows),
+                query_embedding, top_k, alpha, fusion, min_score
+            )
+            results = engine.materialize(ranked, 'combined_score', fields, encoded)
+
+        if result_cache is not None:
+            result_cache.put(cache_key, ranked)
         return results
+
+    def rank_many(self, queries, top_k=10, search_type='hybrid', filters=None, min_score=None,
+                  alpha=0.7, fusion=None):
+        """Rank a bulk job of queries, one list of (player_id, score) per query, in order
+
+        top_k, search_type ('hybrid' or 'semantic'), filters and min_score take a single
+        value or one per query. Hybrid queries naming a player exactly are answered by
+        name_match(); the rest are encoded in one call, queries sharing a filter share
+        one index search and BM25 scores come from one sparse product per
+        KEYWORD_BATCH_SIZE queries. The query and result caches are bypassed so bulk jobs
+        do not evict interactive entries.
+        """
+        fusion = fusion or self.fusion
+        if fusion not in FUSION_STRATEGIES:
+            raise ValueError(f"Unknown fusion strategy '{fusion}', use one of {FUSION_STRATEGIES}")
+
+        engine = self.embedding_engine
+        count = len(queries)
+        if count == 0:
+            return []
+        top_ks, search_types = per_query(top_k, count), per_query(search_type, count)
+        min_scores, filters = per_query(min_score, count), per_query(filters, count)
+        ranked = [
+            self.name_match(query, k, filters=query_filters, min_score=floor) if kind == 'hybrid' else None
+            for query, k, query_filters, floor, kind in zip(queries, top_ks, filters, min_scores, search_types)
+        ]
+        pending = [i for i in range(count) if ranked[i] is None]  # not answered by an exact name match
+        if not pending:
+            return ranked
+        texts = {i: normalize_query(queries[i]) for i in pending}
+        query_embeddings = dict(zip(pending, engine.encode_queries([texts[i] for i in pending], use_cache=False)))
+
+        # semantic search, one index search per distinct filter (all unfiltered queries share one)
+        filter_keys = [filter_key(query_filters) for query_filters in filters]
+        groups = {}
+        for i in pending:
+            groups.setdefault(filter_keys[i], []).append(i)
+        allowed_by_group = {}
+        for key, members in groups.items():
+            allowed = allowed_by_group[key] = self.select(filters[members[0]])
+            floors = [
+                min_scores[i] if search_types[i] == 'semantic' or fusion == 'rrf' else None for i in members
+            ]
+            group_ranked = engine.rank_vectors(
+                np.vstack([query_embeddings[i] for i in members]), [top_ks[i] for i in members],
+                allowed=allowed, min_score=floors
+            )
+            for i, semantic_ranked in zip(members, group_ranked):
+                ranked[i] = semantic_ranked
+
+        hybrid = [i for i in pending if search_types[i] == 'hybrid']
+        if not hybrid:
+            return ranked
+
+        with engine.lock:
+            live = np.ones(len(engine.player_ids), dtype=bool)
+            live[np.fromiter(engine.deleted, dtype='int64', count=len(engine.deleted))] = False
+            masks = {}  # filter key -> rows a keyword hit may come from
+            weight_matrix = self.keyword_index.weight_matrix()
+            for start in range(0, len(hybrid), KEYWORD_BATCH_SIZE):
+                chunk = hybrid[start:start + KEYWORD_BATCH_SIZE]
+                keyword_matrix = self.keyword_index.score_batch([texts[i] for i in chunk], weight_matrix)
+                for j, i in enumerate(chunk):
+                    key = filter_keys[i]
+                    mask = masks.get(key)
+                    if mask is None:
+                        mask = live
+                        if allowed_by_group[key] is not None:
+                            mask = np.zeros(len(live), dtype=bool)
+                            mask[allowed_by_group[key]] = True
+                            mask &= live
+                        masks[key] = mask
+
+                    # this query's BM25 row of the product, restricted like the single-query path
+                    begin, end = keyword_matrix.indptr[j], keyword_matrix.indptr[j + 1]
+                    rows = keyword_matrix.indices[begin:end].astype('int64')
+                    scores = keyword_matrix.data[begin:end]
+                    keep = mask[rows]
+                    rows, scores = rows[keep], scores[keep]
+                    top = top_k_indices(scores, top_ks[i])
+
+                    semantic_rows = np.array(
+                        [engine.id_to_row.get(player_id, -1) for player_id, _ in ranked[i]], dtype='int64'
+                    )
+                    ranked[i] = self._fuse(
+                        semantic_rows[semantic_rows >= 0], rows[top], scores[top],
+                        lambda candidates, rows=rows, scores=scores: sparse_lookup(rows, scores, candidates),
+                        query_embeddings[i], top_ks[i], alpha, fusion, min_scores[i]
+                    )
+        return ranked
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import numpy as np
+
+ENCODER_BACKENDS = ('torch', 'onnx')
+ENCODER_CONFIG = 'encoder.json'
+ONNX_FILE = 'model.onnx'
+QUANTIZED_FILE = 'model_int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+
+
+def load_encoder(model_name, backend='torch', path=None):
+    """the sentence encoder behind PlayerEmbeddingEngine
+
+    backend 'torch' is the SentenceTransformer itself; 'onnx' is an OnnxEncoder read
+    from path, exported from the same model so it serves the same stored index.
+    Any object with encode(texts, ...) and get_sentence_embedding_dimension() works
+    as an encoder.
+    """
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer  # pulls in torch
+        return SentenceTransformer(model_name)
+    if backend == 'onnx':
+        if not path:
+            raise ValueError("The onnx encoder backend needs the directory written by export_onnx")
+        encoder = OnnxEncoder(path)
+        exported_from = encoder.config.get('model_name', '')
+        if os.path.basename(exported_from.rstrip('/')) != os.path.basename(model_name.rstrip('/')):
+            raise ValueError(f"{path} was exported from {exported_from!r}, not {model_name!r}")
+        return encoder
+    raise ValueError(f"Unknown encoder backend {backend!r}, use one of {', '.join(ENCODER_BACKENDS)}")
+
+
+def encoder_id(backend='torch', path=None):
+    """what produced a set of vectors: 'torch', or 'onnx:' and the absolute export directory
+
+    stored vectors, cached profile embeddings and the neighbour graph are keyed by it,
+    so vectors of two encoders never end up in one index
+    """
+    if backend == 'torch':
+        return backend
+    return f"{backend}:{os.path.abspath(path or '')}"
+
+
+class OnnxEncoder:
+    """Sentence encoder running an exported transformer with ONNX Runtime on CPU
+
+    path holds the ONNX graph, the fast tokenizer and encoder.json (see export_onnx).
+    Token vectors are mean-pooled over the attention mask like the model's own pooling
+    layer, and the engine normalizes them as usual, so queries land in the same space
+    as the profiles in an index built with PyTorch. quantized: pick the int8 graph
+    (True) or the float one (False) instead of the exported default.
+    """
+
+    def __init__(self, path, quantized=None, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, ENCODER_CONFIG), 'r', encoding='utf-8') as file:
+            self.config = json.load(file)
+        if quantized is None:
+            quantized = self.config['quantized']
+        self.quantized = quantized
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(path, QUANTIZED_FILE if quantized else ONNX_FILE), options,
+            providers=['CPUExecutionProvider'],
+        )
+        self.input_names = {graph_input.name for graph_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_id'], pad_token=self.config['pad_token'])
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dimension']
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        """float32 sentence vectors, one row per sentence (a single row for a str)"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        # similar lengths share a batch, so little of it is padding
+        order = np.argsort([-len(sentence) for sentence in sentences], kind='stable')
+        embeddings = np.zeros((len(sentences), self.get_sentence_embedding_dimension()), dtype='float32')
+        for start in range(0, len(sentences), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([sentences[row] for row in rows])
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, sentences):
+        encodings = self.tokenizer.encode_batch(sentences)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype='int64')
+        feed = {
+            'input_ids': np.array([encoding.ids for encoding in encodings], dtype='int64'),
+            'attention_mask': mask,
+        }
+        if 'token_type_ids' in self.input_names:
+            feed['token_type_ids'] = np.array([encoding.type_ids for encoding in encodings], dtype='int64')
+        hidden = self.session.run(None, feed)[0]
+        weights = mask[:, :, None].astype('float32')
+        return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+
+def export_onnx(model_name, output_dir, quantize=True, opset=14):
+    """export a mean-pooling SentenceTransformer's transformer to output_dir for OnnxEncoder
+
+    writes model.onnx (dynamic batch and sequence axes), with quantize also
+    model_int8.onnx (dynamic int8 weights, the default then), the fast tokenizer and
+    encoder.json. Needs torch, sentence_transformers and, to quantize, onnxruntime.
+    Returns the encoder config.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer, pooling = model[0], model[1]
+    if pooling.get_pooling_mode_str() != 'mean':
+        raise ValueError(f"Only mean pooling is supported, {model_name} uses {pooling.get_pooling_mode_str()}")
+    tokenizer = transformer.tokenizer
+    if not tokenizer.is_fast:
+        raise ValueError(f"{model_name} has no fast tokenizer (tokenizer.json) to export")
+
+    class HiddenStates(torch.nn.Module):
+        """the transformer's token vectors only, pooling stays outside the graph"""
+
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs)))[0]
+
+    sample = tokenizer(["a query", "a somewhat longer player profile"], padding=True, return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+
+    os.makedirs(output_dir, exist_ok=True)
+    onnx_path = os.path.join(output_dir, ONNX_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates(transformer.auto_model.eval()), tuple(sample[name] for name in input_names), onnx_path,
+            input_names=input_names, output_names=['last_hidden_state'], dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(onnx_path, os.path.join(output_dir, QUANTIZED_FILE), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(output_dir)
+
+    config = {
+        'model_name': model_name,
+        'dimension': model.get_sentence_embedding_dimension(),
+        'max_seq_length': model.max_seq_length,
+        'pooling': 'mean',
+        'pad_id': tokenizer.pad_token_id,
+        'pad_token': tokenizer.pad_token,
+        'quantized': quantize,
+        'opset': opset,
+    }
+    with open(os.path.join(output_dir, ENCODER_CONFIG), 'w', encoding='utf-8') as file:
+        json.dump(config, file, indent=2)
+    return config
+
+
+def check_consistency(reference, candidate, queries, corpus_embeddings=None, k=10, batch_size=256):
+    """how closely candidate's query vectors reproduce reference's
+
+    cosine agreement of the two vectors of every query, and recall@k of the
+    candidate's top k over corpus_embeddings (the stored index vectors, built with
+    the reference) against the reference's top k; the reference query vectors serve
+    as the corpus when none is given. Single-query encode latency of both is
+    measured on up to 100 queries.
+    """
+    from src.embedding import normalize_rows  # src.embedding imports this module
+
+    reference_vectors = normalize_rows(reference.encode(queries))
+    candidate_vectors = normalize_rows(candidate.encode(queries))
+    cosine = np.sum(reference_vectors * candidate_vectors, axis=1)
+
+    corpus = reference_vectors if corpus_embeddings is None else normalize_rows(corpus_embeddings)
+    k = min(k, len(corpus))
+    hits = 0
+    for start in range(0, len(queries), batch_size):
+        expected = top_k_rows(reference_vectors[start:start + batch_size] @ corpus.T, k)
+        found = top_k_rows(candidate_vectors[start:start + batch_size] @ corpus.T, k)
+        hits += sum(len(np.intersect1d(a, b)) for a, b in zip(expected, found))
+
+    sample = queries[:100]
+    return {
+        'queries': len(queries),
+        'corpus_size': len(corpus),
+        'cosine_mean': round(float(cosine.mean()), 5),
+        'cosine_min': round(float(cosine.min()), 5),
+        'cosine_p01': round(float(np.percentile(cosine, 1)), 5),
+        f'recall_at_{k}': round(hits / (k * len(queries)), 4),
+        'reference_ms_per_query': query_latency_ms(reference, sample),
+        'candidate_ms_per_query': query_latency_ms(candidate, sample),
+    }
+
+
+def top_k_rows(scores, k):
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def query_latency_ms(encoder, queries):
+    """mean milliseconds to encode one query on its own, as /search does"""
+    encoder.encode(queries[:1])  # first call initializes lazily
+    start = time.perf_counter()
+    for query in queries:
+        encoder.encode([query])
+    return round((time.perf_counter() - start) * 1000 / max(len(queries), 1), 3)
@@ -0,0 +1,81 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorSaturated(Exception):
+    """raised when every worker is busy and the wait queue is full"""
+
+
+class SearchTimeout(Exception):
+    """raised when a call did not finish within the executor's timeout"""
+
+
+class SearchExecutor:
+    """Bounded thread pool for blocking search work
+
+    encode, FAISS search and the sparse products release the GIL, so threads give
+    real parallelism while sharing one copy of the model and indexes. At most
+    max_workers calls run at once and at most max_queue more wait; anything
+    beyond that is rejected straight away instead of growing the latency tail.
+    timeout: seconds a caller waits for its result (None waits forever); the call itself
+    cannot be interrupted and keeps its slot until it finishes
+    """
+
+    def __init__(self, max_workers=4, max_queue=32, timeout=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+
+    def _acquire(self):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated(
+                    f"{self._in_flight} searches in flight (limit {self.max_workers + self.max_queue})"
+                )
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """run fn in the pool without blocking the event loop, SearchTimeout after self.timeout seconds"""
+        self._acquire()
+        try:
+            future = self.pool.submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._release()
+            raise
+        # release when the work itself finishes, not when a cancelled request stops waiting
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise SearchTimeout(f"No result within {self.timeout}s") from None
+
+    def stats(self):
+        with self._lock:
+            in_flight = self._in_flight
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': in_flight,
+            'queued': max(0, in_flight - self.max_workers),
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
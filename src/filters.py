@@ -0,0 +1,192 @@
+import os
+import json
+import numpy as np
+from src.utils import atomic_write
+
+# filter key -> how to read the value(s) from a player dict
+CATEGORICAL_FIELDS = {
+    'nationality': lambda p: [p.get('nationality'), p.get('demonym'), p.get('nationalityISO')],
+    'position': lambda p: [p.get('position')],
+    'club': lambda p: [(p.get('current_club') or {}).get('clubName')],
+    'played_for': lambda p: [club.get('clubName') for club in p.get('club_history') or []],
+    'preferred_foot': lambda p: [p.get('preferredFoot')],
+}
+# range field -> value, queried through min_<field> / max_<field>
+RANGE_FIELDS = {
+    'age': lambda p: p.get('age'),
+    'height': lambda p: p.get('heightCm'),
+    'career_goals': lambda p: p.get('career_goals'),
+}
+FILTER_KEYS = tuple(CATEGORICAL_FIELDS) + tuple(
+    f'{bound}_{field}' for field in RANGE_FIELDS for bound in ('min', 'max')
+)
+META_FILE = 'attributes.json'  # categorical values in posting order, plus meta
+
+
+def normalize_value(value):
+    return str(value).strip().casefold()
+
+
+def filter_key(filters):
+    """hashable, order independent form of a filters dict for cache keys"""
+    if not filters:
+        return None
+    return tuple(sorted(
+        (key, tuple(sorted(normalize_value(v) for v in value)) if isinstance(value, (list, tuple)) else value)
+        for key, value in filters.items() if value not in (None, [], ())
+    ))
+
+
+class AttributeIndex:
+    """Structured pre-selection over player attributes
+
+    categorical fields keep one sorted row array per normalized value (OR within a
+    field), range fields keep values sorted with their rows so a range is two binary
+    searches; fields are combined with AND. Rows are aligned with
+    PlayerEmbeddingEngine.player_ids, tombstones are left to the caller.
+    """
+
+    def __init__(self):
+        self.num_rows = 0
+        self.categorical = {field: {} for field in CATEGORICAL_FIELDS}
+        self.range_values = {field: np.zeros(0, dtype='float64') for field in RANGE_FIELDS}
+        self.range_rows = {field: np.zeros(0, dtype='int64') for field in RANGE_FIELDS}
+
+    def build(self, players):
+        """players: player dicts in row order"""
+        postings = {field: {} for field in CATEGORICAL_FIELDS}
+        values = {field: [] for field in RANGE_FIELDS}
+        rows = {field: [] for field in RANGE_FIELDS}
+        for row, player in enumerate(players):
+            for field, getter in CATEGORICAL_FIELDS.items():
+                for value in set(normalize_value(v) for v in getter(player) if v):
+                    postings[field].setdefault(value, []).append(row)
+            for field, getter in RANGE_FIELDS.items():
+                value = getter(player)
+                if value is not None:
+                    values[field].append(float(value))
+                    rows[field].append(row)
+
+        self.num_rows = len(players)
+        self.categorical = {
+            field: {value: np.array(value_rows, dtype='int64') for value, value_rows in field_postings.items()}
+            for field, field_postings in postings.items()
+        }
+        for field in RANGE_FIELDS:
+            field_values = np.array(values[field], dtype='float64')
+            order = np.argsort(field_values, kind='stable')
+            self.range_values[field] = field_values[order]
+            self.range_rows[field] = np.array(rows[field], dtype='int64')[order]
+        return self
+
+    def add(self, player):
+        """append one player as the next row"""
+        row = self.num_rows
+        for field, getter in CATEGORICAL_FIELDS.items():
+            postings = self.categorical[field]
+            for value in set(normalize_value(v) for v in getter(player) if v):
+                postings[value] = np.append(postings.get(value, np.zeros(0, dtype='int64')), row)
+        for field, getter in RANGE_FIELDS.items():
+            value = getter(player)
+            if value is not None:
+                position = np.searchsorted(self.range_values[field], float(value), side='right')
+                self.range_values[field] = np.insert(self.range_values[field], position, float(value))
+                self.range_rows[field] = np.insert(self.range_rows[field], position, row)
+        self.num_rows += 1
+        return row
+
+    def compact(self, keep):
+        """keep only the given rows (old numbering, ascending) and renumber them"""
+        remap = np.full(self.num_rows, -1, dtype='int64')
+        remap[keep] = np.arange(len(keep))
+        for field, postings in self.categorical.items():
+            for value in list(postings):
+                rows = remap[postings[value]]
+                rows = rows[rows >= 0]
+                if len(rows):
+                    postings[value] = rows
+                else:
+                    del postings[value]
+        for field in RANGE_FIELDS:
+            rows = remap[self.range_rows[field]]
+            live = rows >= 0
+            self.range_values[field] = self.range_values[field][live]
+            self.range_rows[field] = rows[live]
+        self.num_rows = len(keep)
+
+    def save(self, path, **meta):
+        """write postings and range arrays as .npy (memory-mappable) plus the value lists as meta
+
+        each field's postings are concatenated in the order of its value list, with offsets
+        """
+        os.makedirs(path, exist_ok=True)
+
+        values = {}
+        for field, postings in self.categorical.items():
+            values[field] = list(postings)
+            lengths = [len(postings[value]) for value in values[field]]
+            offsets = np.concatenate([[0], np.cumsum(lengths, dtype='int64')]).astype('int64')
+            rows = np.concatenate([postings[value] for value in values[field]] or [np.zeros(0)]).astype('int64')
+            atomic_write(os.path.join(path, f'{field}_offsets.npy'), lambda file: np.save(file, offsets), 'wb')
+            atomic_write(os.path.join(path, f'{field}_rows.npy'), lambda file: np.save(file, rows), 'wb')
+        for field in RANGE_FIELDS:
+            values_array, rows_array = np.asarray(self.range_values[field]), np.asarray(self.range_rows[field])
+            atomic_write(os.path.join(path, f'{field}_values.npy'), lambda file: np.save(file, values_array), 'wb')
+            atomic_write(os.path.join(path, f'{field}_rows.npy'), lambda file: np.save(file, rows_array), 'wb')
+        atomic_write(os.path.join(path, META_FILE), lambda file: json.dump(
+            {'num_rows': self.num_rows, 'values': values, **meta}, file, ensure_ascii=False, indent=2
+        ))
+
+    @staticmethod
+    def read_meta(path):
+        try:
+            with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """postings come back as slices of the mapped arrays; add() and compact() replace them with copies"""
+        meta = cls.read_meta(path)
+        index = cls()
+        index.num_rows = meta['num_rows']
+        for field in CATEGORICAL_FIELDS:
+            offsets = np.load(os.path.join(path, f'{field}_offsets.npy'))
+            rows = np.asarray(np.load(os.path.join(path, f'{field}_rows.npy'), mmap_mode=mmap_mode))
+            index.categorical[field] = {
+                value: rows[offsets[i]:offsets[i + 1]] for i, value in enumerate(meta['values'][field])
+            }
+        for field in RANGE_FIELDS:
+            index.range_values[field] = np.load(os.path.join(path, f'{field}_values.npy'), mmap_mode=mmap_mode)
+            index.range_rows[field] = np.load(os.path.join(path, f'{field}_rows.npy'), mmap_mode=mmap_mode)
+        return index
+
+    def values(self, field):
+        """distinct normalized values of a categorical field"""
+        return list(self.categorical[field])
+
+    def select(self, filters):
+        """sorted array of rows matching every filter, or None when filters is empty"""
+        selected = None
+        for field in CATEGORICAL_FIELDS:
+            wanted = filters.get(field)
+            if not wanted:
+                continue
+            if isinstance(wanted, str):
+                wanted = [wanted]
+            postings = self.categorical[field]
+            parts = [postings[value] for value in (normalize_value(v) for v in wanted) if value in postings]
+            rows = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype='int64')
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+
+        for field in RANGE_FIELDS:
+            low, high = filters.get(f'min_{field}'), filters.get(f'max_{field}')
+            if low is None and high is None:
+                continue
+            values = self.range_values[field]
+            start = 0 if low is None else np.searchsorted(values, low, side='left')
+            end = len(values) if high is None else np.searchsorted(values, high, side='right')
+            rows = np.sort(self.range_rows[field][start:end])
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+        return selected
@@ -0,0 +1,129 @@
+import time
+import threading
+
+
+class BuildInProgress(Exception):
+    """a live write arrived while a new generation builds and could miss it"""
+
+
+class Generation:
+    """One build of the search engine and its build status"""
+
+    def __init__(self, number):
+        self.number = number
+        self.status = 'building'
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self.engine = None
+        self.timings = {}  # build phase -> seconds, filled in by build_fn
+
+    @property
+    def build_seconds(self):
+        end = self.finished_at or time.time()
+        return round(end - self.started_at, 3)
+
+    def to_dict(self):
+        return {
+            'generation': self.number,
+            'status': self.status,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'build_seconds': self.build_seconds,
+            'error': self.error,
+            'timings': dict(self.timings),
+        }
+
+
+class SearchEngineManager:
+    """Blue/green holder for HybridPlayerSearch generations
+
+    build_fn(timings) builds a complete engine, recording the seconds spent in each phase
+    in the timings dict; on_swap is called with the new engine once it
+    is ready. Readers that already hold the old engine keep using it until they finish,
+    the swap itself is a single reference assignment. Live writes go through write(), which
+    refuses them while a generation builds: the new one would not contain them.
+    """
+
+    def __init__(self, build_fn, on_swap=None):
+        self.build_fn = build_fn
+        self.on_swap = on_swap
+        self.active = None
+        self.pending = None
+        self.last_failed = None
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # held by a write and by a build starting
+
+    @property
+    def engine(self):
+        return self.active.engine if self.active else None
+
+    def _start(self):
+        # a write in flight finishes (and is journaled) before the build can start
+        with self._write_lock, self._lock:
+            if self.pending is not None:
+                return None
+            self._counter += 1
+            self.pending = Generation(self._counter)
+            return self.pending
+
+    def _run(self, generation):
+        try:
+            generation.engine = self.build_fn(generation.timings)
+        except Exception as e:
+            generation.status = 'failed'
+            generation.error = str(e)
+            generation.finished_at = time.time()
+            with self._lock:
+                self.pending = None
+                self.last_failed = generation
+            print(f"Generation {generation.number} build failed: {e}")
+            raise
+
+        generation.status = 'ready'
+        generation.finished_at = time.time()
+        with self._lock:
+            self.active, self.pending = generation, None
+        if self.on_swap:
+            self.on_swap(generation.engine)
+        print(f"Generation {generation.number} active after {generation.build_seconds}s")
+        return generation
+
+    def write(self, fn, *args):
+        """fn(engine, *args) on the active engine, BuildInProgress while a new generation builds
+
+        the engine is the manager's, not one a request picked up before a swap
+        """
+        with self._write_lock:
+            if self.pending is not None:
+                raise BuildInProgress(f"Generation {self.pending.number} is building, retry once it is active")
+            return fn(self.engine, *args)
+
+    def build(self):
+        """build synchronously, used for the first generation at startup"""
+        generation = self._start()
+        if generation is None:
+            raise RuntimeError("A build is already in progress")
+        return self._run(generation)
+
+    def rebuild_in_background(self):
+        """start building a new generation in a worker thread, None if one is already building"""
+        generation = self._start()
+        if generation is None:
+            return None
+
+        def target():
+            try:
+                self._run(generation)
+            except Exception:
+                pass  # recorded on the generation, the active one keeps serving
+
+        threading.Thread(target=target, name=f"build-generation-{generation.number}", daemon=True).start()
+        return generation
+
+    def status(self):
+        return {
+            'active': self.active.to_dict() if self.active else None,
+            'building': self.pending.to_dict() if self.pending else None,
+            'last_failed': self.last_failed.to_dict() if self.last_failed else None,
+        }
@@ -0,0 +1,389 @@
+import os
+import re
+import json
+import bisect
+import threading
+import unicodedata
+import numpy as np
+from src.utils import StringArray, atomic_write
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+PREFIX_END = '\uffff'  # sorts after every normalized character
+PREFIX_SCAN_LIMIT = 256  # suffixes ranked per suggestion, keeps one-letter prefixes fast
+META_FILE = 'names.json'
+# stored string arrays and the integer arrays beside them, see NameIndex.save
+STRING_ARRAYS = ('entry_keys', 'entry_records', 'suffixes', 'words', 'grams', 'exact_keys')
+INT_ARRAYS = (
+    'suffix_entries', 'word_indptr', 'word_entry_ids', 'gram_indptr', 'gram_words', 'exact_indptr',
+    'exact_entries', 'dead',
+)
+
+
+def normalize_name(text):
+    """casefolded, accent-free name with single spaces, no stop words removed"""
+    text = unicodedata.normalize('NFKD', str(text or '').casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_ALNUM.sub(' ', text).strip()
+
+
+def trigrams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(token):
+    """typos tolerated in a query token of this length"""
+    return 0 if len(token) < 4 else 1 if len(token) < 8 else 2
+
+
+def edit_distance(a, b, limit, prefix=False):
+    """Levenshtein distance of a and b, or limit + 1 as soon as it must exceed limit
+
+    prefix: distance of a to the closest prefix of b, for words still being typed
+    """
+    if len(a) - len(b) > limit or (not prefix and len(b) - len(a) > limit):
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous) if prefix else previous[-1]
+
+
+class _StoredPostings:
+    """read-only mapping of sorted stored keys to the values of their indptr slice
+
+    decode: maps the stored integers back to values (word ids to words)
+    """
+
+    def __init__(self, keys, indptr, values, decode=None, join_key=False):
+        self.keys = keys
+        self.indptr = indptr
+        self.values = values
+        self.decode = decode
+        self.join_key = join_key  # tuple keys are stored joined into one string
+
+    def _find(self, key):
+        if self.join_key:
+            key = ''.join(key)
+        i = bisect.bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def get(self, key, default=None):
+        i = self._find(key)
+        if i is None:
+            return default
+        values = self.values[self.indptr[i]:self.indptr[i + 1]].tolist()
+        return [self.decode(value) for value in values] if self.decode else values
+
+    def __getitem__(self, key):
+        values = self.get(key)
+        if values is None:
+            raise KeyError(key)
+        return values
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+
+class _StoredEntries:
+    """stored entry records, decoded from their JSON when read"""
+
+    def __init__(self, records):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, entry):
+        return json.loads(self.records[entry])
+
+
+def _csr(keys, mapping, encode=None):
+    """indptr and flat values of mapping[key] for keys in order, values sorted per key"""
+    indptr = np.zeros(len(keys) + 1, dtype='int64')
+    values = []
+    for i, key in enumerate(keys):
+        key_values = sorted(mapping[key] if encode is None else (encode[value] for value in mapping[key]))
+        values.extend(key_values)
+        indptr[i + 1] = len(values)
+    return indptr, np.array(values, dtype='int64')
+
+
+class NameIndex:
+    """Autocomplete and typo-tolerant lookup over player and club names
+
+    every name is normalized and stored once as an entry; a sorted list of
+    (suffix, entry) pairs holds the name from each word boundary on, so "bern" and
+    "duar" both complete "Bernard Anicio Caldeira Duarte" with two binary searches.
+    Typos go through a trigram index over the distinct name words: candidate words
+    sharing trigrams with a query word are verified with a bounded edit distance.
+    Trigrams are keyed by the word's first letter, which keeps candidate sets small;
+    a typo in the first letter is not corrected.
+    Entries of deleted or renamed players are skipped at lookup, the next build
+    drops them. save() writes the lists and maps as flat arrays; load() decodes the
+    suffix, word and key tables every suggestion walks and maps the rest read-only,
+    so worker processes share the postings and entry records.
+    """
+
+    def __init__(self):
+        self.entries = []  # entry -> {'type', 'name', 'player_id', 'club'}
+        self.keys = []  # entry -> normalized name
+        self.suffixes = []  # sorted (normalized suffix, entry)
+        self.word_entries = {}  # word -> entries containing it
+        self.words = []  # sorted distinct name words
+        self.word_trigrams = {}  # (first letter, trigram) -> words containing it
+        self.exact = {}  # normalized full name -> entries
+        self.player_entry = {}  # player id -> its current entry
+        self.club_entry = {}  # normalized club name -> entry
+        self.dead = set()  # entries of renamed players
+        self.read_only = False  # loaded from disk, lookups only
+        self._lock = threading.Lock()  # writers only, readers see either state
+
+    def build(self, players):
+        """players: (player id, player dict) pairs; clubs come from current_club and club_history"""
+        for player_id, player in players:
+            self._add(player_id, player)
+        self.suffixes.sort()
+        self.words.sort()
+        return self
+
+    def add(self, player_id, player):
+        """index one upserted player (and any club first seen with it)"""
+        if self.read_only:
+            raise RuntimeError("A loaded NameIndex is read-only, rebuild it to add players")
+        with self._lock:
+            self._add(player_id, player, insort=True)
+
+    def _add(self, player_id, player, insort=False):
+        old = self.player_entry.get(player_id)
+        if old is not None:
+            if self.entries[old]['name'] == player.get('fullName'):
+                return
+            self.dead.add(old)
+
+        club = (player.get('current_club') or {}).get('clubName')
+        entry = self._entry('player', player.get('fullName'), insort, player_id=player_id, club=club)
+        if entry is not None:
+            self.player_entry[player_id] = entry
+        clubs = [club] + [history.get('clubName') for history in player.get('club_history') or []]
+        for club_name in clubs:
+            key = normalize_name(club_name)
+            if key and key not in self.club_entry:
+                self.club_entry[key] = self._entry('club', club_name, insort)
+
+    def _entry(self, kind, name, insort, **fields):
+        key = normalize_name(name)
+        if not key:
+            return None
+        entry = len(self.entries)
+        self.entries.append({'type': kind, 'name': name, **fields})
+        self.keys.append(key)
+        self.exact.setdefault(key, []).append(entry)
+
+        words = key.split()
+        for i, word in enumerate(words):
+            suffix = (' '.join(words[i:]), entry)
+            if insort:
+                bisect.insort(self.suffixes, suffix)
+            else:
+                self.suffixes.append(suffix)
+            if word not in self.word_entries:
+                if insort:
+                    bisect.insort(self.words, word)
+                else:
+                    self.words.append(word)
+                for gram in trigrams(word):
+                    self.word_trigrams.setdefault((word[0], gram), set()).add(word)
+            self.word_entries.setdefault(word, set()).add(entry)
+        return entry
+
+    def _live(self, entry, record, is_live):
+        if entry in self.dead:
+            return False
+        player_id = record.get('player_id')
+        return player_id is None or is_live(player_id)
+
+    def exact_players(self, query, is_live=lambda player_id: True):
+        """player ids whose full name is exactly the query, up to case and accents"""
+        records = ((entry, self.entries[entry]) for entry in self.exact.get(normalize_name(query), ()))
+        return [
+            record['player_id'] for entry, record in records
+            if record['type'] == 'player' and self._live(entry, record, is_live)
+        ]
+
+    def _prefix(self, key, cap=None):
+        """entries with a word-boundary suffix starting with key -> whether the name itself does
+
+        cap: look at no more than this many suffixes, in sorted order
+        """
+        start = bisect.bisect_left(self.suffixes, (key,))
+        end = bisect.bisect_left(self.suffixes, (key + PREFIX_END,))
+        if cap is not None:
+            end = min(end, start + cap)
+        matches = {}
+        for suffix, entry in self.suffixes[start:end]:
+            matches[entry] = matches.get(entry, False) or suffix == self.keys[entry]
+        return matches
+
+    def _word_matches(self, word, last):
+        """name words within max_edits of a query word -> distance
+
+        last: the word may still be being typed, so prefixes of name words count
+        """
+        limit = max_edits(word)
+        if last and limit == 0:
+            start = bisect.bisect_left(self.words, word)
+            end = bisect.bisect_left(self.words, word + PREFIX_END)
+            return dict.fromkeys(self.words[start:end], 0)
+
+        grams = trigrams(word)
+        if last:
+            grams = {gram for gram in grams if not gram.endswith(' ')}
+        counts = {}
+        for gram in grams:
+            for candidate in self.word_trigrams.get((word[0], gram), ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        # one edit changes at most three trigrams
+        needed = max(1, len(grams) - 3 * limit)
+        matches = {}
+        for candidate, count in counts.items():
+            if count >= needed:
+                distance = edit_distance(word, candidate, limit, prefix=last)
+                if distance <= limit:
+                    matches[candidate] = distance
+        return matches
+
+    def _fuzzy(self, words, cap):
+        """entries matching every query word within max_edits -> summed distance
+
+        entries are gathered from the query word with the fewest of them, closest name
+        words first, and checked against the other query words; at most cap are returned,
+        the same ones whether the index was built or loaded
+        """
+        matches = [self._word_matches(word, i == len(words) - 1) for i, word in enumerate(words)]
+        if not all(matches):
+            return {}
+        sizes = [sum(len(self.word_entries[candidate]) for candidate in match) for match in matches]
+        driver = min(range(len(words)), key=sizes.__getitem__)
+
+        found = {}
+        for candidate, distance in sorted(matches[driver].items(), key=lambda item: (item[1], item[0])):
+            for entry in sorted(self.word_entries[candidate]):
+                entry_words = self.keys[entry].split()
+                total = distance
+                for i, match in enumerate(matches):
+                    if i == driver:
+                        continue
+                    best = min((match[word] for word in entry_words if word in match), default=None)
+                    if best is None:
+                        break
+                    total += best
+                else:
+                    found[entry] = min(found.get(entry, total), total)
+                    if len(found) >= cap:
+                        return found
+        return found
+
+    def suggest(self, query, limit=10, is_live=lambda player_id: True):
+        """ranked completions for a partly typed name: exact, then prefix, then typo matches"""
+        key = normalize_name(query)
+        if not key:
+            return []
+
+        ranked = []  # (sort key, entry, match), ties go to the entry indexed first
+        for entry, starts in self._prefix(key, cap=PREFIX_SCAN_LIMIT).items():
+            exact = self.keys[entry] == key
+            ranked.append(((0 if exact else 1 if starts else 2, len(self.keys[entry])), entry,
+                           'exact' if exact else 'prefix'))
+        if len(ranked) < limit:
+            seen = {entry for _, entry, _ in ranked}
+            for entry, distance in self._fuzzy(key.split(), PREFIX_SCAN_LIMIT).items():
+                if entry not in seen:
+                    ranked.append(((3 + distance, len(self.keys[entry])), entry, 'fuzzy'))
+        ranked.sort(key=lambda item: item[:2])
+
+        suggestions = []
+        for _, entry, match in ranked:
+            record = self.entries[entry]
+            if not self._live(entry, record, is_live):
+                continue
+            suggestion = {'type': record['type'], 'name': record['name'], 'match': match}
+            if record['type'] == 'player':
+                suggestion.update(player_id=record['player_id'], club=record['club'])
+            suggestions.append(suggestion)
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+    def save(self, path, **meta):
+        """write every list and map as sorted string arrays and CSR integer arrays plus meta"""
+        os.makedirs(path, exist_ok=True)
+        words = sorted(self.word_entries)
+        word_ids = {word: i for i, word in enumerate(words)}
+        gram_keys = sorted(self.word_trigrams)
+        exact_keys = sorted(self.exact)
+        records = [json.dumps(record, ensure_ascii=False) for record in self.entries]
+        word_indptr, word_entry_ids = _csr(words, self.word_entries)
+        gram_indptr, gram_words = _csr(gram_keys, self.word_trigrams, encode=word_ids)
+        exact_indptr, exact_entries = _csr(exact_keys, self.exact)
+        arrays = {
+            'entry_keys': StringArray.from_strings(self.keys),
+            'entry_records': StringArray.from_strings(records),
+            'suffixes': StringArray.from_strings(suffix for suffix, _ in self.suffixes),
+            'words': StringArray.from_strings(words),
+            'grams': StringArray.from_strings(''.join(key) for key in gram_keys),
+            'exact_keys': StringArray.from_strings(exact_keys),
+            'suffix_entries': np.array([entry for _, entry in self.suffixes], dtype='int64'),
+            'word_indptr': word_indptr,
+            'word_entry_ids': word_entry_ids,
+            'gram_indptr': gram_indptr,
+            'gram_words': gram_words,
+            'exact_indptr': exact_indptr,
+            'exact_entries': exact_entries,
+            'dead': np.array(sorted(self.dead), dtype='int64'),
+        }
+
+        for name in STRING_ARRAYS:
+            arrays[name].save(path, name)
+        for name in INT_ARRAYS:
+            atomic_write(os.path.join(path, f'{name}.npy'), lambda file: np.save(file, arrays[name]), 'wb')
+        atomic_write(os.path.join(path, META_FILE),
+                     lambda file: json.dump({'num_entries': len(self.entries), **meta}, file, indent=2))
+
+    @staticmethod
+    def read_meta(path):
+        try:
+            with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """the saved index for lookups only, its postings memory-mapped; add() is not supported"""
+        strings = {name: StringArray.load(path, name, mmap_mode) for name in STRING_ARRAYS}
+        # plain views of the mapped memory, numpy.memmap slicing is slow on the lookup path
+        arrays = {
+            name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)) for name in INT_ARRAYS
+        }
+        index = cls()
+        # read for every ranked entry and bisected per query word: decoding them once
+        # keeps suggest as fast as on a built index
+        index.entries = _StoredEntries(strings['entry_records'])
+        index.keys = strings['entry_keys'].tolist()
+        index.suffixes = list(zip(strings['suffixes'].tolist(), arrays['suffix_entries'].tolist()))
+        index.words = strings['words'].tolist()
+        index.word_entries = _StoredPostings(index.words, arrays['word_indptr'], arrays['word_entry_ids'])
+        index.word_trigrams = _StoredPostings(
+            strings['grams'], arrays['gram_indptr'], arrays['gram_words'], decode=strings['words'].__getitem__,
+            join_key=True,
+        )
+        index.exact = _StoredPostings(strings['exact_keys'], arrays['exact_indptr'], arrays['exact_entries'])
+        index.dead = set(arrays['dead'].tolist())
+        index.read_only = True
+        return index
@@ -0,0 +1,106 @@
+import os
+import json
+import numpy as np
+from src.utils import atomic_write
+
+NEIGHBOR_ROWS_FILE = 'neighbor_rows.npy'
+NEIGHBOR_SCORES_FILE = 'neighbor_scores.npy'
+META_FILE = 'neighbors.json'
+
+
+class NeighborGraph:
+    """Precomputed k nearest neighbours of every stored player vector
+
+    row r holds the k rows closest to r (itself excluded) with their [0, 1]
+    similarities, best first and padded with -1 / -inf, so "players like X" is one
+    array read. Rows are aligned with PlayerEmbeddingEngine.player_ids; players
+    upserted after the build have no entry and are not listed as anyone's neighbour
+    until the next build, tombstones are left to the caller.
+    """
+
+    def __init__(self, k=50):
+        self.k = k
+        self.rows = np.zeros((0, k), dtype='int32')
+        self.scores = np.zeros((0, k), dtype='float32')
+
+    @property
+    def num_rows(self):
+        return len(self.rows)
+
+    def build(self, index, embeddings, score_fn, exclude=(), batch_size=4096):
+        """search index with every stored vector, in batches
+
+        score_fn maps raw index scores to similarities; exclude: rows (tombstones)
+        dropped from every neighbour list
+        """
+        num_rows = len(embeddings)
+        fetch_k = min(self.k + 1 + len(exclude), index.ntotal)
+        excluded = np.zeros(num_rows, dtype=bool)
+        excluded[np.asarray(list(exclude), dtype='int64')] = True
+        rows = np.full((num_rows, self.k), -1, dtype='int32')
+        scores = np.full((num_rows, self.k), -np.inf, dtype='float32')
+
+        for start in range(0, num_rows, batch_size):
+            batch = np.asarray(embeddings[start:start + batch_size], dtype='float32')
+            raw_scores, labels = index.search(batch, fetch_k)
+            for offset, (row_scores, row_labels) in enumerate(zip(score_fn(raw_scores), labels)):
+                row = start + offset
+                keep = (row_labels >= 0) & (row_labels != row)
+                keep[keep] = ~excluded[row_labels[keep]]
+                neighbors = row_labels[keep][:self.k]
+                rows[row, :len(neighbors)] = neighbors
+                scores[row, :len(neighbors)] = row_scores[keep][:self.k]
+
+        self.rows, self.scores = rows, scores
+        return self
+
+    def neighbors(self, row):
+        """(rows, scores) of one row's neighbours, best first, padding dropped"""
+        rows, scores = np.asarray(self.rows[row], dtype='int64'), self.scores[row]
+        present = rows >= 0
+        return rows[present], scores[present]
+
+    def complete(self):
+        """every other row is listed, a shorter answer is not a truncated one"""
+        return self.k >= self.num_rows - 1
+
+    def compact(self, keep, num_rows):
+        """keep only the given rows (old numbering, ascending, out of num_rows) and renumber them"""
+        keep = np.asarray(keep, dtype='int64')
+        remap = np.full(num_rows, -1, dtype='int64')
+        remap[keep] = np.arange(len(keep))
+        keep = keep[keep < self.num_rows]  # upserted rows had no entry
+        rows = np.asarray(self.rows[keep], dtype='int64')
+        scores = np.array(self.scores[keep], dtype='float32')
+        rows = np.where(rows >= 0, remap[np.maximum(rows, 0)], -1)
+
+        # close the gaps left by dropped neighbours, keeping best-first order
+        order = np.argsort(rows < 0, axis=1, kind='stable')
+        self.rows = np.take_along_axis(rows, order, axis=1).astype('int32')
+        self.scores = np.take_along_axis(np.where(rows >= 0, scores, -np.inf), order, axis=1).astype('float32')
+
+    def save(self, path, **meta):
+        """write both arrays as .npy (memory-mappable) plus meta, each beside its target and renamed over it"""
+        os.makedirs(path, exist_ok=True)
+
+        atomic_write(os.path.join(path, NEIGHBOR_ROWS_FILE),
+                     lambda file: np.save(file, np.ascontiguousarray(self.rows)), 'wb')
+        atomic_write(os.path.join(path, NEIGHBOR_SCORES_FILE),
+                     lambda file: np.save(file, np.ascontiguousarray(self.scores)), 'wb')
+        atomic_write(os.path.join(path, META_FILE),
+                     lambda file: json.dump({'k': self.k, 'num_rows': self.num_rows, **meta}, file, indent=2))
+
+    @staticmethod
+    def read_meta(path):
+        try:
+            with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        graph = cls(k=cls.read_meta(path)['k'])
+        graph.rows = np.load(os.path.join(path, NEIGHBOR_ROWS_FILE), mmap_mode=mmap_mode)
+        graph.scores = np.load(os.path.join(path, NEIGHBOR_SCORES_FILE), mmap_mode=mmap_mode)
+        return graph
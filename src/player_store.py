@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import json.scanner
+import numpy as np
+from src.cache import LRUCache
+from src.utils import StringArray, atomic_write
+
+ABSENT = -1  # code of a key the record does not have
+STATS_FIELD = 'season_statistics'
+STATS_PLACEHOLDER = '\x00season_statistics'  # keeps the key's position, rows live in the stats table
+DETAIL_FIELDS = (STATS_FIELD, 'teammateWith')  # left out of summary records
+# field projections served by the search API, 'a.b' selects b inside the nested object a
+SUMMARY_FIELDS = ('playerId', 'fullName', 'current_club.clubName', 'position', 'nationality')
+VIEWS = {'summary': SUMMARY_FIELDS, 'full': None}
+FRAGMENT_CACHE_SIZE = 8192  # encoded (row, fields) fragments kept per store
+
+PLAYERS_CODES_FILE = 'players_codes.npy'
+PLAYERS_META_FILE = 'players_columns.json'
+STATS_CODES_FILE = 'stats_codes.npy'
+STATS_META_FILE = 'stats_columns.json'
+PLAYERS_VALUES = 'players_values'  # StringArray files of the distinct values, as JSON text
+STATS_VALUES = 'stats_values'
+# columns with fewer distinct values are decoded into lists on load: they are small and
+# read in every record, while names, ids and measurements stay in the mapped files
+MAPPED_VALUES_MIN = 1024
+STATS_INDPTR_FILE = 'stats_indptr.npy'
+
+
+def project(record, fields):
+    """keep only the given fields of a record, 'a.b' selects b inside the nested object a"""
+    projected = {}
+    for field in fields:
+        name, _, rest = field.partition('.')
+        if name not in record:
+            continue
+        if not rest:
+            projected[name] = record[name]
+        elif isinstance(record[name], dict):
+            nested = project(record[name], [rest])
+            if nested:
+                projected.setdefault(name, {}).update(nested)
+    return projected
+
+
+def _value_key(value):
+    # 1, 1.0 and True compare equal in a dict but must come back with their own type
+    return (type(value), value)
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+# json.loads minus its whitespace handling, for text that is exactly one compact value
+_scan_value = json.scanner.make_scanner(json.JSONDecoder())
+
+
+class MappedValues:
+    """one column's distinct values, read from a stored StringArray of JSON text
+
+    json columns hand out the text as it is stored, value columns decode it
+    """
+    __slots__ = ('strings', 'start', 'count', 'decode')
+
+    def __init__(self, strings, start, count, decode):
+        self.strings = strings
+        self.start = start
+        self.count = count
+        self.decode = decode
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (self[code] for code in range(self.count))
+
+    def __getitem__(self, code):
+        text = self.strings[self.start + code]
+        return _scan_value(text, 0)[0] if self.decode else text
+
+
+class ColumnTable:
+    """Dictionary-encoded columns of JSON records
+
+    every column stores one int32 code per row into its own list of distinct values,
+    so repeated strings, numbers and nested objects (a club dict shared by a whole
+    squad) are held once. Nested values are kept as compact JSON text and decoded when
+    a record is materialized. A loaded table reads the values of large columns from
+    the mapped files and only copies them into lists when rows are appended.
+    """
+
+    def __init__(self):
+        self.columns = []  # column names in first-seen order
+        self.kinds = []  # 'value' or 'json'
+        self.values = []  # per column: distinct values, a list or MappedValues
+        self.codes = np.zeros((0, 0), dtype='int32')
+        self._lookup = None  # per column: value key -> code, rebuilt on demand for appends
+
+    @property
+    def num_rows(self):
+        return len(self.codes)
+
+    def _lookups(self):
+        if self._lookup is None:
+            self.values = [values if isinstance(values, list) else list(values) for values in self.values]
+            self._lookup = [
+                {_value_key(value): code for code, value in enumerate(values)} for values in self.values
+            ]
+        return self._lookup
+
+    def _column(self, name):
+        self.columns.append(name)
+        self.kinds.append('value')
+        self.values.append([])
+        self._lookups().append({})
+        return len(self.columns) - 1
+
+    def _to_json(self, column):
+        """switch a column to JSON text once it sees a nested value"""
+        self.kinds[column] = 'json'
+        self.values[column] = [_encode(value) for value in self.values[column]]
+        self._lookups()[column] = {_value_key(value): code for code, value in enumerate(self.values[column])}
+
+    def extend(self, records):
+        """append records as rows, returns the first new row"""
+        start = self.num_rows
+        positions = {name: i for i, name in enumerate(self.columns)}
+        lookups, kinds, values = self._lookups(), self.kinds, self.values
+        rows = []
+        for record in records:
+            row = {}
+            for name, value in record.items():
+                column = positions.get(name)
+                if column is None:
+                    column = positions[name] = self._column(name)
+                if kinds[column] == 'value' and isinstance(value, (dict, list)):
+                    self._to_json(column)
+                if kinds[column] == 'json':
+                    value = _encode(value)
+                key = (type(value), value)
+                code = lookups[column].get(key)
+                if code is None:
+                    code = lookups[column][key] = len(values[column])
+                    values[column].append(value)
+                row[column] = code
+            rows.append(row)
+
+        codes = np.full((len(rows), len(self.columns)), ABSENT, dtype='int32')
+        for i, row in enumerate(rows):
+            codes[i, list(row)] = list(row.values())
+        existing = np.asarray(self.codes)
+        if existing.shape[1] < len(self.columns):
+            padding = np.full((len(existing), len(self.columns) - existing.shape[1]), ABSENT, dtype='int32')
+            existing = np.hstack([existing, padding])
+        self.codes = np.vstack([existing, codes])
+        return start
+
+    def record(self, row, skip=(), only=None):
+        record = {}
+        for column, code in enumerate(self.codes[row].tolist()):
+            name = self.columns[column]
+            if code == ABSENT or name in skip or (only is not None and name not in only):
+                continue
+            value = self.values[column][code]
+            record[name] = json.loads(value) if self.kinds[column] == 'json' else value
+        return record
+
+    def take(self, rows):
+        """keep only the given rows, in that order; values no longer used are kept"""
+        self.codes = np.ascontiguousarray(np.asarray(self.codes)[rows])
+
+    def nbytes(self):
+        """approximate private size: code array plus the distinct values held in lists"""
+        size = np.asarray(self.codes).nbytes
+        for values in self.values:
+            if isinstance(values, list):
+                size += sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+        return size
+
+    def save(self, path, codes_file, meta_file, values_name):
+        """codes, then every column's values as JSON text in one StringArray, column after column"""
+        atomic_write(os.path.join(path, codes_file),
+                     lambda file: np.save(file, np.ascontiguousarray(self.codes, dtype='int32')), 'wb')
+        StringArray.from_strings(
+            value if kind == 'json' else _encode(value)
+            for values, kind in zip(self.values, self.kinds) for value in values
+        ).save(path, values_name)
+        atomic_write(os.path.join(path, meta_file), lambda file: json.dump(
+            {'columns': self.columns, 'kinds': self.kinds, 'value_counts': [len(values) for values in self.values]},
+            file, ensure_ascii=False,
+        ), 'w')
+
+    @classmethod
+    def load(cls, path, codes_file, meta_file, values_name, mmap_mode='r'):
+        table = cls()
+        with open(os.path.join(path, meta_file), 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+        table.columns, table.kinds = meta['columns'], meta['kinds']
+        strings = StringArray.load(path, values_name, mmap_mode)
+        starts = np.concatenate([[0], np.cumsum(meta['value_counts'], dtype='int64')]).tolist()
+        table.values = [MappedValues(strings, start, count, decode=kind == 'value')
+                        for start, count, kind in zip(starts, meta['value_counts'], table.kinds)]
+        table.values = [values if len(values) >= MAPPED_VALUES_MIN else list(values) for values in table.values]
+        # a plain view of the mapped codes, numpy.memmap indexing is slow per row
+        table.codes = np.asarray(np.load(os.path.join(path, codes_file), mmap_mode=mmap_mode))
+        return table
+
+
+class PlayerStore:
+    """Compact player metadata, rows aligned with PlayerEmbeddingEngine.player_ids
+
+    top-level fields live in a ColumnTable; each player's season_statistics list is
+    split into a second ColumnTable with one row per season, addressed through a CSR
+    offset array, and only rebuilt into dicts for the records actually returned.
+    Reads follow the dict interface the engine used before (get, in, [], len) over
+    live players; tombstoned rows stay until compact(). Rows never change once
+    written, so their encoded JSON (whole or projected) is cached until compact()
+    renumbers them.
+    """
+
+    def __init__(self):
+        self.players = ColumnTable()
+        self.stats = ColumnTable()
+        self.stats_indptr = np.zeros(1, dtype='int64')
+        self.ids = []  # row -> player id
+        self.id_to_row = {}  # live players only
+        self.fragments = LRUCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=float('inf'))  # (epoch, row, fields) -> JSON
+        self.epoch = 0  # bumped by compact(), fragments of older numberings are never hit
+
+    @property
+    def num_rows(self):
+        return len(self.ids)
+
+    def extend(self, player_ids, players):
+        """append players as rows in order, a repeated id points at its last row"""
+        start = self.num_rows
+        records, season_rows, counts = [], [], []
+        for player in players:
+            seasons = player.get(STATS_FIELD)
+            if isinstance(seasons, list) and all(isinstance(season, dict) for season in seasons):
+                player = {**player, STATS_FIELD: STATS_PLACEHOLDER}
+                season_rows.extend(seasons)
+                counts.append(len(seasons))
+            else:
+                counts.append(0)
+            records.append(player)
+
+        self.players.extend(records)
+        self.stats.extend(season_rows)
+        offsets = self.stats_indptr[-1] + np.cumsum(counts, dtype='int64')
+        self.stats_indptr = np.concatenate([np.asarray(self.stats_indptr), offsets])
+        for row, player_id in enumerate(player_ids, start):
+            self.ids.append(player_id)
+            self.id_to_row[player_id] = row
+        return start
+
+    def append(self, player_id, player):
+        return self.extend([player_id], [player])
+
+    def remove(self, player_id):
+        """forget a player, its row stays until compact()"""
+        return self.id_to_row.pop(player_id, None)
+
+    def record(self, row, detail=True, fields=None):
+        """materialize one row as the original player dict
+
+        detail=False skips DETAIL_FIELDS; fields projects the record (see project()),
+        only the columns it names are decoded
+        """
+        if fields is not None:
+            record = self.players.record(row, only={field.partition('.')[0] for field in fields})
+        else:
+            record = self.players.record(row, skip=() if detail else DETAIL_FIELDS)
+        if record.get(STATS_FIELD) == STATS_PLACEHOLDER:
+            start, end = self.stats_indptr[row], self.stats_indptr[row + 1]
+            record[STATS_FIELD] = [self.stats.record(season) for season in range(start, end)]
+        return record if fields is None else project(record, fields)
+
+    def fragment(self, row, fields=None):
+        """one row encoded as compact JSON text, cached per (row, fields)"""
+        fields = tuple(fields) if fields is not None else None
+        key = (self.epoch, row, fields)
+        encoded = self.fragments.get(key)
+        if encoded is None:
+            encoded = json.dumps(self.record(row, fields=fields), ensure_ascii=False, separators=(',', ':'))
+            self.fragments.put(key, encoded)
+        return encoded
+
+    def compact(self, keep):
+        """keep only the given rows (old numbering, ascending) and renumber them"""
+        keep = np.asarray(keep, dtype='int64')
+        indptr = np.asarray(self.stats_indptr)
+        counts = indptr[keep + 1] - indptr[keep]
+        season_rows = np.repeat(indptr[keep] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+        season_rows += np.arange(counts.sum(), dtype='int64')
+        self.players.take(keep)
+        self.stats.take(season_rows)
+        self.stats_indptr = np.concatenate([[0], np.cumsum(counts)]).astype('int64')
+        self.ids = [self.ids[row] for row in keep]
+        self.id_to_row = {player_id: row for row, player_id in enumerate(self.ids)}
+        self.epoch += 1
+        self.fragments.clear()
+
+    def __contains__(self, player_id):
+        return player_id in self.id_to_row
+
+    def __len__(self):
+        return len(self.id_to_row)
+
+    def __getitem__(self, player_id):
+        return self.record(self.id_to_row[player_id])
+
+    def get(self, player_id, default=None):
+        row = self.id_to_row.get(player_id)
+        return default if row is None else self.record(row)
+
+    def get_fragment(self, player_id, fields=None, default=None):
+        row = self.id_to_row.get(player_id)
+        return default if row is None else self.fragment(row, fields)
+
+    def keys(self):
+        return self.id_to_row.keys()
+
+    def nbytes(self):
+        return (
+            self.players.nbytes() + self.stats.nbytes() + np.asarray(self.stats_indptr).nbytes
+        )
+
+    def save(self, path):
+        """write code arrays (memory-mappable) and value tables beside their targets, then rename"""
+        os.makedirs(path, exist_ok=True)
+
+        self.players.save(path, PLAYERS_CODES_FILE, PLAYERS_META_FILE, PLAYERS_VALUES)
+        self.stats.save(path, STATS_CODES_FILE, STATS_META_FILE, STATS_VALUES)
+        atomic_write(os.path.join(path, STATS_INDPTR_FILE),
+                     lambda file: np.save(file, np.asarray(self.stats_indptr, dtype='int64')), 'wb')
+
+    @classmethod
+    def load(cls, path, player_ids, mmap_mode='r'):
+        store = cls()
+        store.players = ColumnTable.load(path, PLAYERS_CODES_FILE, PLAYERS_META_FILE, PLAYERS_VALUES, mmap_mode)
+        store.stats = ColumnTable.load(path, STATS_CODES_FILE, STATS_META_FILE, STATS_VALUES, mmap_mode)
+        store.stats_indptr = np.load(os.path.join(path, STATS_INDPTR_FILE), mmap_mode=mmap_mode)
+        store.ids = list(player_ids)
+        store.id_to_row = {player_id: row for row, player_id in enumerate(store.ids)}
+        return store
@@ -1,4 +1,21 @@
-from src.utils import parse_date, calculate_age
+import numpy as np
+from src.utils import chunked, parse_date, calculate_age
+
+CAREER_FIELDS = (
+    'appearances', 'goals', 'assists', 'minutesPlayed', 'tackles', 'interceptions', 'dribblesCompleted',
+    'crossesCompleted', 'yellowCards', 'redCards', 'passesCompleted', 'touchesInBox', 'duelsWon',
+    'expectedGoals', 'expectedAssists',
+)
+PERFORMANCE_FIELDS = CAREER_FIELDS[:13]  # the performance summary ignores expected goals / assists
+# per-appearance career rates -> (threshold, keyword) levels, best first
+STYLE_RATES = (
+    ('goals', ((0.5, "prolific goalscorer"), (0.2, "regular goalscorer"), (0.05, "occasional goalscorer"))),
+    ('assists', ((0.3, "creative playmaker"), (0.1, "supportive playmaker"))),
+    ('dribblesCompleted', ((3, "skillful dribbler"), (1, "technical player"))),
+    ('tackles', ((2, "strong defender"), (1, "defensive contributor"))),
+)
+PROFILE_CHUNK_SIZE = 10000  # players whose profiles are built (and dicts held) at once
+FRAME_MIN_ROWS = 1000  # season rows from which pandas reads the dicts faster than a list comprehension
 
 
 class PreProcessing:
@@ -7,35 +24,43 @@ class PreProcessing:
         self.nationalities = nationalities
         self.players = players
         self.player_stats = player_stats
+        self._stats_by_player = None
+
+    @property
+    def stats_by_player(self):
+        """season rows grouped by playerId in one pass over player_stats, in their original
+        order; built on first use and shared by every stage
+        """
+        if self._stats_by_player is None:
+            stats_by_player = {}
+            for stat in self.player_stats:
+                stats_by_player.setdefault(stat["playerId"], []).append(stat)
+            self._stats_by_player = stats_by_player
+        return self._stats_by_player
 
     def preprocess_player_data(self):
         club_lookup = {club["clubId"]: club for club in self.clubs}
         nationality_lookup = {nat["countryId"]: nat for nat in self.nationalities}
-
-        # Map players to their clubs and seasons
-        player_clubs_lookup = {}
-        for stat in self.player_stats:
-            player_id, club_id, season_id = (
-                stat["playerId"],
-                stat["clubId"],
-                stat["seasonId"],
-            )
-            if player_id not in player_clubs_lookup:
-                player_clubs_lookup[player_id] = {}
-            if club_id not in player_clubs_lookup[player_id]:
-                player_clubs_lookup[player_id][club_id] = {
-                    "club_info": club_lookup.get(club_id),
-                    "seasons": [],
-                }
-            player_clubs_lookup[player_id][club_id]["seasons"].append(season_id)
+        stats_by_player = self.stats_by_player
 
         # Enrich players with club and nationality info
         for player in self.players:
             player_id = player["playerId"]
 
-            if player_id in player_clubs_lookup:
+            if player_id in stats_by_player:
+                # Map the player's seasons to their clubs
+                player_clubs = {}
+                for stat in stats_by_player[player_id]:
+                    club_id = stat["clubId"]
+                    if club_id not in player_clubs:
+                        player_clubs[club_id] = {
+                            "club_info": club_lookup.get(club_id),
+                            "seasons": [],
+                        }
+                    player_clubs[club_id]["seasons"].append(stat["seasonId"])
+
                 latest_season, current_club_id = 0, None
-                for club_id, club_data in player_clubs_lookup[player_id].items():
+                for club_id, club_data in player_clubs.items():
                     max_season = max(club_data["seasons"])
                     if max_season > latest_season:
                         latest_season, current_club_id = max_season, club_id
@@ -52,7 +77,7 @@ class PreProcessing:
                         "clubName": cdata["club_info"]["clubName"],
                         "seasons": sorted(cdata["seasons"]),
                     }
-                    for cid, cdata in player_clubs_lookup[player_id].items()
+                    for cid, cdata in player_clubs.items()
                     if cdata["club_info"]
                 ]
 
@@ -64,11 +89,10 @@ class PreProcessing:
         return self.players
 
     def merge_player_with_stats(self, players):
+        stats_by_player = self.stats_by_player
         enriched_players = []
         for player in players:
-            player_stats = [
-                s for s in self.player_stats if s["playerId"] == player["playerId"]
-            ]
+            player_stats = stats_by_player.get(player["playerId"], [])
             enriched_player = {
                 **player,
                 "season_statistics": player_stats,
@@ -115,7 +139,16 @@ class PlayerDataProcessor:
 
     def build_player_profile(self, player_data):
         """create rich text profile for embedding"""
+        return self.build_profiles([player_data])[0]
 
+    def build_profiles(self, players):
+        """rich text profiles of many players, career stats aggregated for all of them at once"""
+        career = self.career_stats([player['season_statistics'] for player in players])
+        summaries = self.performance_summaries(career)
+        styles = self.playing_styles(career)
+        return [self._profile_text(*args) for args in zip(players, summaries, styles)]
+
+    def _profile_text(self, player_data, stats, style):
         # basic information
         basic_info = (
             f"{player_data['fullName']} is a {player_data['age']} year old\n"
@@ -131,200 +164,173 @@ class PlayerDataProcessor:
             f"Weight: {player_data['weightKg']}kg, \n"
             f"{player_data['preferredFoot']} footed"
         )
-        stats = self.get_performance_summary(player_data['season_statistics']) # performance summary 
-        style = self.extract_playing_style(player_data)   # playing style 
-        
         return f"{basic_info}. {club_info}. {physical}. {stats} {style}"
- 
-    def get_performance_summary(self, season_stats): 
-        """generate performance summary from season statistics"""
-        if not season_stats: 
-            return "No performance data is available"
-        
-        # get last season stats(with data)
-        total_stats = {
-            'appearances': 0,
-            'goals': 0,
-            'assists': 0,
-            'minutesPlayed': 0,
-            'tackles': 0,
-            'interceptions': 0,
-            'dribblesCompleted': 0,
-            'crossesCompleted': 0,
-            'yellowCards': 0,
-            'redCards': 0,
-            'passesCompleted': 0,
-            'touchesInBox': 0,
-            'duelsWon': 0
+
+    def build_search_fields(self, player_data, profile=None):
+        """split a player into separately weighted keyword fields (name, clubs, nationality, profile)"""
+        clubs = [(player_data.get('current_club') or {}).get('clubName') or '']
+        clubs += [club.get('clubName') or '' for club in player_data.get('club_history') or []]
+        nationality_details = player_data.get('nationality_details') or {}
+        return {
+            'name': player_data.get('fullName') or '',
+            'club': ' '.join(dict.fromkeys(clubs)),
+            'nationality': ' '.join(filter(None, [
+                player_data.get('nationality'),
+                player_data.get('demonym') or nationality_details.get('demonym'),
+            ])),
+            'profile': profile if profile is not None else self.build_player_profile(player_data),
         }
-        valid_seasons = 0
-
-        for stats in season_stats: 
-            if any(stats.get(key) is not None for key in total_stats.keys()):
-                valid_seasons += 1 
-
-                for key in total_stats.keys(): 
-                    value = stats.get(key, 0)
-                    if value is not None: 
-                        total_stats[key] += value
-        if valid_seasons == 0: 
-            return "Limited performance data" 
-        
-        # build performance summary from aggregated data 
-        summary_parts = []
-        if total_stats["appearances"] > 0: 
-            summary_parts.append(f"Career: {int(total_stats['appearances'])} appearances")
-
-        if total_stats["goals"] > 0: 
-            summary_parts.append(f"{int(total_stats['goals'])} total goals")
-        
-        if total_stats['assists'] > 0:
-            summary_parts.append(f"{int(total_stats['assists'])} total assists")
-
-        # playing time 
-        if total_stats['minutesPlayed'] > 0:
-            summary_parts.append(f"{total_stats['minutesPlayed']} minutes played")
-
-        if valid_seasons > 0:
-            avg_goals = total_stats['goals'] / valid_seasons
-            avg_assists = total_stats['assists'] / valid_seasons
-            
+
+    def career_stats(self, season_lists):
+        """aggregate statistics across all seasons, for many players at once
+
+        season_lists: each player's season_statistics. Returns arrays with one value per
+        player: the total of every CAREER_FIELDS key (missing and None count as 0),
+        'seasons' (rows), 'performance_seasons' (rows with any PERFORMANCE_FIELDS value),
+        'total_seasons' (rows with any CAREER_FIELDS value) and 'float_minutes' (some
+        minutesPlayed was a float, so the total prints as one)
+        """
+        season_lists = [seasons or () for seasons in season_lists]
+        counts = np.fromiter(map(len, season_lists), dtype='int64', count=len(season_lists))
+        rows = [season for seasons in season_lists for season in seasons]
+        owner = np.repeat(np.arange(len(season_lists)), counts)
+        # missing and None -> nan
+        if len(rows) >= FRAME_MIN_ROWS:
+            import pandas as pd  # only index builds get here, the raw-data pipeline does not need it
+            values = pd.DataFrame.from_records(rows, columns=list(CAREER_FIELDS)).to_numpy('float64', na_value=np.nan)
+        else:
+            values = np.array([list(map(season.get, CAREER_FIELDS)) for season in rows], dtype='float64')
+            values = values.reshape(len(rows), len(CAREER_FIELDS))
+        present = ~np.isnan(values)
+
+        def per_player(weights):
+            # float even when there are no rows at all
+            return np.bincount(owner, weights=weights, minlength=len(season_lists)).astype('float64', copy=False)
+
+        career = {field: per_player(np.where(present[:, i], values[:, i], 0)) for i, field in enumerate(CAREER_FIELDS)}
+        career['seasons'] = counts
+        career['performance_seasons'] = per_player(present[:, :len(PERFORMANCE_FIELDS)].any(axis=1))
+        career['total_seasons'] = per_player(present.any(axis=1))
+        career['float_minutes'] = per_player([isinstance(season.get('minutesPlayed'), float) for season in rows]) > 0
+        return career
+
+    def performance_summaries(self, career):
+        """generate performance summaries from a career_stats table"""
+        columns = [career[field].tolist() for field in PERFORMANCE_FIELDS]
+        columns += [career['seasons'].tolist(), career['performance_seasons'].tolist(), career['float_minutes'].tolist()]
+        summaries = []
+        for (appearances, goals, assists, minutes, tackles, interceptions, dribbles, crosses, yellow_cards, red_cards,
+             _, touches_in_box, _, seasons, valid_seasons, float_minutes) in zip(*columns):
+            if not seasons:
+                summaries.append("No performance data is available")
+                continue
+            if valid_seasons == 0:
+                summaries.append("Limited performance data")
+                continue
+
+            # build performance summary from aggregated data 
+            summary_parts = []
+            if appearances > 0: 
+                summary_parts.append(f"Career: {int(appearances)} appearances")
+            if goals > 0: 
+                summary_parts.append(f"{int(goals)} total goals")
+            if assists > 0:
+                summary_parts.append(f"{int(assists)} total assists")
+
+            # playing time 
+            if minutes > 0:
+                summary_parts.append(f"{minutes if float_minutes else int(minutes)} minutes played")
+
+            avg_goals = goals / valid_seasons
+            avg_assists = assists / valid_seasons
             if avg_goals > 5:
                 summary_parts.append(f"averages {avg_goals:.1f} goals per season")
             if avg_assists > 3:
                 summary_parts.append(f"{avg_assists:.1f} assists per season")
-        
-        # defensive contribution 
-        if total_stats['tackles'] > 0: 
-            summary_parts.append(f"{int(total_stats['tackles'])} career tackles")
-        if total_stats['interceptions'] > 0: 
-            summary_parts.append(f"{int(total_stats['interceptions'])} interceptions")
-
-        # technical skills 
-        if total_stats['dribblesCompleted'] > 0:
-            summary_parts.append(f"{int(total_stats['dribblesCompleted'])} successful dribbles")
-        if total_stats['crossesCompleted'] > 0:
-            summary_parts.append(f"{int(total_stats['crossesCompleted'])} accurate crosses")
-
-        # rate-based stats (per game averages)
-        if total_stats['appearances'] > 0:
-            if total_stats['touchesInBox'] > 0:
-                touches_per_game = total_stats['touchesInBox'] / total_stats['appearances']
-                if touches_per_game > 10:  # Active in attack
-                    summary_parts.append(f"active in penalty area")
-
-        # discipline 
-        if total_stats['yellowCards'] > 0:
-            summary_parts.append(f"{int(total_stats['yellowCards'])} career yellow cards")
-        if total_stats['redCards'] > 0:
-            summary_parts.append(f"{int(total_stats['redCards'])} red cards")
-        
-        return ". ".join(summary_parts) if summary_parts else "limitied statistical"
-
-
-    def aggregate_all_stats(self, season_stats):
-        """aggregate statistics across all seasons"""
-        if not season_stats:
-            return {}
-        
-        aggregated = {
-            'appearances': 0,
-            'goals': 0,
-            'assists': 0,
-            'minutesPlayed': 0,
-            'tackles': 0,
-            'interceptions': 0,
-            'dribblesCompleted': 0,
-            'crossesCompleted': 0,
-            'yellowCards': 0,
-            'redCards': 0,
-            'passesCompleted': 0,
-            'touchesInBox': 0,
-            'duelsWon': 0,
-            'expectedGoals': 0,
-            'expectedAssists': 0
-        }
-        valid_seasons = 0 
-        for stats in season_stats: 
-            # check if this season has any meaningful data 
-            has_data = any(stats.get(key) is not None for key in aggregated.keys()) 
-            if has_data: 
-                valid_seasons += 1 
-
-                # sum all numeric stats 
-                for key in aggregated.keys(): 
-                    value = stats.get(key)
-                    if value is not None: 
-                        aggregated[key] += value
-        aggregated['total_seasons'] = valid_seasons
-        return aggregated
-
-    def extract_playing_style(self, player_data):
-        """extract playing style keywords from stats"""
-        career_stats = self.aggregate_all_stats(player_data['season_statistics'])
-
-        if not career_stats or career_stats.get('total_seasons', 0) == 0:
-            return ""
-        
-        style_keywords = []
-        total_appearances = career_stats.get('appearances', 0)
-        if total_appearances == 0:
-            return ""
-        
-        # career-based style analysis 
-        career_goals = career_stats.get('goals', 0)
-        career_assists = career_stats.get('assists', 0)
-        career_dribbles = career_stats.get('dribblesCompleted', 0)
-        career_tackles = career_stats.get('tackles', 0)
-        career_minutes = career_stats.get('minutesPlayed', 0)
-
-        # goalscoring ability (career rate)
-        goals_per_game = career_goals / total_appearances if total_appearances > 0 else 0
-        if goals_per_game > 0.5:
-            style_keywords.append("prolific goalscorer")
-        elif goals_per_game > 0.2: 
-            style_keywords.append("regular goalscorer")
-        elif goals_per_game > 0.05:
-            style_keywords.append("occasional goalscorer")
-
-        # playmaking ability (career rate)
-        assists_per_game = assists_per_game = career_assists / total_appearances if total_appearances > 0 else 0
-        if assists_per_game > 0.3: 
-            style_keywords.append("creative playmaker")
-        elif assists_per_game > 0.1: 
-            style_keywords.append("supportive playmaker")
-        
-        # dribbling ability (career total relative to games)
-        dribbles_per_game = career_dribbles / total_appearances if total_appearances > 0 else 0
-        if dribbles_per_game > 3: 
-            style_keywords.append("skillful dribbler")
-        elif dribbles_per_game > 1:
-            style_keywords.append("technical player")
-        
-        # defensive contribution 
-        tackles_per_game = career_tackles / total_appearances if total_appearances > 0 else 0
-        if tackles_per_game > 2:
-            style_keywords.append("strong defender")
-        elif tackles_per_game > 1:
-            style_keywords.append("defensive contributor")
+            
+            # defensive contribution 
+            if tackles > 0: 
+                summary_parts.append(f"{int(tackles)} career tackles")
+            if interceptions > 0: 
+                summary_parts.append(f"{int(interceptions)} interceptions")
+
+            # technical skills 
+            if dribbles > 0:
+                summary_parts.append(f"{int(dribbles)} successful dribbles")
+            if crosses > 0:
+                summary_parts.append(f"{int(crosses)} accurate crosses")
+
+            # rate-based stats (per game averages)
+            if appearances > 0 and touches_in_box / appearances > 10:  # Active in attack
+                summary_parts.append("active in penalty area")
+
+            # discipline 
+            if yellow_cards > 0:
+                summary_parts.append(f"{int(yellow_cards)} career yellow cards")
+            if red_cards > 0:
+                summary_parts.append(f"{int(red_cards)} red cards")
+            
+            summaries.append(". ".join(summary_parts) if summary_parts else "limitied statistical")
+        return summaries
+
+    def playing_styles(self, career):
+        """extract playing style keywords from a career_stats table, thresholds applied to every player at once"""
+        appearances = career['appearances']
+        zeros = np.zeros_like(appearances)
+
+        def per_game(field):
+            return np.divide(career[field], appearances, out=zeros.copy(), where=appearances > 0)
+
+        columns = []
+        # goalscoring, playmaking, dribbling and defensive contribution (career rates)
+        for field, levels in STYLE_RATES:
+            rate = per_game(field)
+            columns.append(np.select([rate > threshold for threshold, _ in levels], [keyword for _, keyword in levels], ''))
 
         # work rate and consistency 
-        if career_minutes > 1000: 
-            minutes_per_game = career_minutes / total_appearances if total_appearances > 0 else 0
-            if minutes_per_game > 70: 
-                style_keywords.append("consistent starter")
-            elif minutes_per_game > 30: 
-                style_keywords.append("regular player")
-            else: 
-                style_keywords.append("squad player")
-        
+        minutes_per_game = per_game('minutesPlayed')
+        work_rate = np.select([minutes_per_game > 70, minutes_per_game > 30], ["consistent starter", "regular player"],
+                              "squad player")
+        columns.append(np.where(career['minutesPlayed'] > 1000, work_rate, ''))
+
         # experience level 
-        total_seasons = career_stats.get('total_seasons', 0)
-        if total_seasons >= 5: 
-            style_keywords.append("experienced player") 
-        elif total_seasons >= 3: 
-            style_keywords.append("established player")
-        else: 
-            style_keywords.append("developing player")
-
-        return " ".join(style_keywords)
+        total_seasons = career['total_seasons']
+        columns.append(np.select([total_seasons >= 5, total_seasons >= 3], ["experienced player", "established player"],
+                                 "developing player"))
+
+        has_style = ((total_seasons > 0) & (appearances != 0)).tolist()
+        return [
+            " ".join(filter(None, keywords)) if styled else ""
+            for styled, keywords in zip(has_style, zip(*(column.tolist() for column in columns)))
+        ]
+
+
+class PlayerCorpus:
+    """Player ids, profile texts and keyword fields, built in one pass and shared by both indexes
+
+    the embedding index encodes the profiles and the BM25 index reads the same
+    profiles inside its documents, so no profile is generated twice
+    """
+
+    def __init__(self, processor=None):
+        self.processor = processor or PlayerDataProcessor()
+        self.player_ids = []
+        self.profiles = []
+        self.documents = []
+
+    def add(self, players):
+        """append a chunk of players, returns their profiles"""
+        profiles = self.processor.build_profiles(players)
+        self.player_ids.extend(player.get('playerId', '') for player in players)
+        self.profiles.extend(profiles)
+        self.documents.extend(
+            self.processor.build_search_fields(player, profile) for player, profile in zip(players, profiles)
+        )
+        return profiles
+
+    @classmethod
+    def build(cls, players, processor=None, chunk_size=PROFILE_CHUNK_SIZE):
+        corpus = cls(processor)
+        for chunk in chunked(players, chunk_size):
+            corpus.add(chunk)
+        return corpus
@@ -0,0 +1,213 @@
+import re
+import time
+import threading
+from datetime import datetime
+from src.bm25 import tokenize
+
+# surface forms -> position value used in the data
+POSITION_SYNONYMS = {
+    'forward': ['forward', 'forwards', 'striker', 'strikers', 'attacker', 'attackers', 'winger', 'wingers',
+                'centre forward', 'center forward', 'centre-forward', 'center-forward'],
+    'midfielder': ['midfielder', 'midfielders', 'midfield'],
+    'defender': ['defender', 'defenders', 'centre back', 'center back', 'centre-back', 'center-back',
+                 'full back', 'full-back', 'fullback', 'fullbacks', 'defence', 'defense'],
+    'goalkeeper': ['goalkeeper', 'goalkeepers', 'keeper', 'keepers', 'goalie', 'goalies'],
+}
+FOOT_PATTERNS = {
+    'left': ['left footed', 'left-footed', 'left foot', 'left footer'],
+    'right': ['right footed', 'right-footed', 'right foot', 'right footer'],
+}
+# a club mention preceded by one of these within a few tokens means the current club
+CURRENT_CLUB_CUES = {'currently', 'plays', 'playing', 'now'}
+
+NUMBER = r'(\d+(?:\.\d+)?)'
+LESS = r'(?:under|below|less than|fewer than|younger than|shorter than)'
+MORE = r'(?:over|above|more than|older than|taller than)'
+# each bound is its own group so "at most"/"at least" keep the number while "under"/"over" exclude it
+BOUND = rf'(?:(?P<less>{LESS})|(?P<at_most>at most|up to)|(?P<more>{MORE})|(?P<at_least>at least))'
+GOALS_PATTERN = re.compile(rf'\b{BOUND}\s+(?P<number>\d+(?:\.\d+)?)\s+(?:career\s+)?goals?\b')
+GOALS_PLUS_PATTERN = re.compile(rf'\b{NUMBER}\s*\+\s*(?:career\s+)?goals?\b')
+HEIGHT_PATTERN = re.compile(rf'\b{BOUND}\s+(?P<number>\d+(?:\.\d+)?)\s*cm\b')
+AGE_UNIT = r'(?P<unit>\s*-?\s*(?:years?(?:[\s-]+old)?|yo)\b)?'
+AGE_RANGE_PATTERN = re.compile(rf'\b(?:aged?|between)\s+{NUMBER}\s+(?:and|to|-)\s+{NUMBER}\b{AGE_UNIT}')
+AGE_PATTERN = re.compile(rf'\b(?:aged?\s+)?{BOUND}\s+(?P<number>\d+(?:\.\d+)?)\b{AGE_UNIT}')
+# a number followed by one of these counts something else: "over 20 appearances" is not an age
+STAT_FOLLOWS = re.compile(r'\s*\+?\s*(?:(?:career|league|international|senior)\s+)?'
+                          r'(?:goals?|assists?|appearances?|apps|caps|games|matches|minutes|cm|kg)\b')
+BORN_PATTERN = re.compile(r'\bborn\s+(after|before|in)\s+(\d{4})\b')
+
+
+class ParsedQuery:
+    def __init__(self, text, filters, original):
+        self.text = text
+        self.filters = filters
+        self.original = original
+
+    def to_dict(self):
+        return {'text': self.text, 'filters': self.filters}
+
+
+class QueryParser:
+    """Turn natural-language constraints into structured filters before vector search
+
+    gazetteer matching runs on spaCy's tokenizer with a PhraseMatcher built from the
+    nationalities, clubs and positions in the AttributeIndex; numeric constraints are
+    regular expressions. No statistical pipeline component runs, which keeps a parse
+    well under a millisecond. spaCy itself is imported on first use.
+    """
+
+    def __init__(self, attribute_index, budget_ms=5.0):
+        self.attribute_index = attribute_index
+        self.budget_ms = budget_ms
+        self._nlp = None
+        self._matcher = None
+        self._lock = threading.Lock()
+        self.parses = 0
+        self.over_budget = 0
+        self.total_ms = 0.0
+
+    def _load(self):
+        with self._lock:
+            if self._matcher is not None:
+                return
+            import spacy
+            from spacy.matcher import PhraseMatcher
+
+            nlp = spacy.blank('en')  # tokenizer only, no model download or pipeline needed
+            matcher = PhraseMatcher(nlp.vocab, attr='LOWER')
+            index = self.attribute_index
+
+            def add(label, phrases):
+                phrases = [phrase for phrase in phrases if len(phrase) > 3]  # skip ISO codes like "br"
+                if phrases:
+                    matcher.add(label, [nlp.make_doc(phrase) for phrase in phrases])
+
+            for value in index.values('nationality'):
+                add(f'nationality|{value}', [value])
+            for value in set(index.values('played_for')) | set(index.values('club')):
+                add(f'club|{value}', [value])
+            positions = set(index.values('position'))
+            for value, synonyms in POSITION_SYNONYMS.items():
+                if value in positions:
+                    add(f'position|{value}', synonyms)
+            feet = set(index.values('preferred_foot'))
+            for value, phrases in FOOT_PATTERNS.items():
+                if value in feet:
+                    add(f'preferred_foot|{value}', phrases)
+
+            self._nlp = nlp
+            self._matcher = matcher
+
+    def warm_up(self):
+        self._load()
+        return self
+
+    def parse(self, query):
+        start = time.perf_counter()
+        self._load()
+        text = query.lower()
+        filters = {}
+        spans = []  # character spans consumed by a constraint
+
+        def consume(match):
+            spans.append(match.span())
+
+        for match in GOALS_PATTERN.finditer(text):
+            upper = self._upper(match)
+            filters['max_career_goals' if upper else 'min_career_goals'] = self._bound(match)
+            consume(match)
+        for match in GOALS_PLUS_PATTERN.finditer(text):
+            filters['min_career_goals'] = float(match.group(1))
+            consume(match)
+        for match in HEIGHT_PATTERN.finditer(text):
+            filters['max_height' if self._upper(match) else 'min_height'] = self._bound(match)
+            consume(match)
+        for match in AGE_RANGE_PATTERN.finditer(text):
+            if self._overlaps(match.span(), spans) or self._counts_stat(text, match):
+                continue
+            low, high = sorted(float(n) for n in match.groups()[:2])
+            filters['min_age'], filters['max_age'] = low, high
+            consume(match)
+        for match in AGE_PATTERN.finditer(text):
+            if self._overlaps(match.span(), spans) or self._counts_stat(text, match):
+                continue
+            if not 10 <= float(match.group('number')) <= 60:  # not an age, leave it to the text search
+                continue
+            filters['max_age' if self._upper(match) else 'min_age'] = self._bound(match)
+            consume(match)
+        for match in BORN_PATTERN.finditer(text):
+            relation, year = match.group(1), int(match.group(2))
+            current_year = datetime.now().year
+            if relation == 'after':
+                filters['max_age'] = float(current_year - year - 1)
+            elif relation == 'before':
+                filters['min_age'] = float(current_year - year)
+            else:
+                filters['min_age'], filters['max_age'] = float(current_year - year - 1), float(current_year - year)
+            consume(match)
+
+        doc = self._nlp.make_doc(query)
+        for match_id, token_start, token_end in self._matcher(doc):
+            field, value = self._nlp.vocab.strings[match_id].split('|', 1)
+            span = doc[token_start:token_end]
+            if self._overlaps((span.start_char, span.end_char), spans):
+                continue
+            if field == 'club':
+                preceding = {token.lower_ for token in doc[max(0, token_start - 3):token_start]}
+                field = 'club' if preceding & CURRENT_CLUB_CUES else 'played_for'
+            values = filters.setdefault(field, [])
+            if value not in values:
+                values.append(value)
+            spans.append((span.start_char, span.end_char))
+
+        leftover = self._strip(query, spans)
+        # a query made only of constraints still ranks the filtered players by its full wording
+        text = leftover if tokenize(leftover) else query
+
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        self.parses += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.budget_ms:
+            self.over_budget += 1
+        return ParsedQuery(text, filters, query)
+
+    @staticmethod
+    def _upper(match):
+        return bool(match.group('less') or match.group('at_most'))
+
+    @staticmethod
+    def _bound(match):
+        # ages, goals and heights in cm are whole numbers: "under 25" is at most 24, "over 30"
+        # at least 31, the same for every attribute
+        value = float(match.group('number'))
+        if match.group('at_most') or match.group('at_least'):
+            return value
+        return value - 1 if match.group('less') else value + 1
+
+    @staticmethod
+    def _counts_stat(text, match):
+        # "years" or "yo" after the number make it an age, otherwise a stat noun after it rules one out
+        return not match.group('unit') and STAT_FOLLOWS.match(text, match.end()) is not None
+
+    @staticmethod
+    def _overlaps(span, spans):
+        return any(span[0] < end and start < span[1] for start, end in spans)
+
+    @staticmethod
+    def _strip(query, spans):
+        kept, position = [], 0
+        for start, end in sorted(spans):
+            if start >= position:
+                kept.append(query[position:start])
+                position = end
+        kept.append(query[position:])
+        return ' '.join(''.join(kept).split())
+
+    def stats(self):
+        return {
+            'loaded': self._matcher is not None,
+            'parses': self.parses,
+            'avg_ms': round(self.total_ms / self.parses, 3) if self.parses else 0.0,
+            'budget_ms': self.budget_ms,
+            'over_budget': self.over_budget,
+        }
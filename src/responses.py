@@ -0,0 +1,22 @@
+import json
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+class JSONFragment(str):
+    """JSON text encoded ahead of time, spliced into a response as is"""
+
+
+def dumps(value):
+    """compact JSON for a response body, JSONFragment values are copied without re-encoding
+
+    dicts and lists are walked here so that fragments can sit anywhere in the payload;
+    everything else goes through the standard encoder
+    """
+    if isinstance(value, JSONFragment):
+        return value
+    if isinstance(value, dict):
+        return '{' + ','.join(f'{_encoder.encode(str(key))}:{dumps(item)}' for key, item in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(dumps(item) for item in value) + ']'
+    return _encoder.encode(value)
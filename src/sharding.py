@@ -0,0 +1,515 @@
+import os
+import heapq
+import queue
+import threading
+import multiprocessing
+from itertools import islice
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+import numpy as np
+from src.cache import normalize_query
+from src.embedding import FUSION_STRATEGIES, RRF_K, load_model, normalize_rows, similarity
+from src.encoders import encoder_id
+from src.storage import IndexStore, open_search
+from src.streaming import JsonlDataset, iter_json_records, partition_of, write_jsonl
+
+SHARD_FILE = 'shard-{:03d}.jsonl'
+SHARD_INDEX_DIR = 'shard-{:03d}'
+# partition by -> record field whose value picks the shard, None for the playerId hash
+PARTITION_KEYS = {'hash': None, 'league': 'current_club.league'}
+SUGGEST_ORDER = {'exact': 0, 'prefix': 1, 'fuzzy': 2}
+SHARD_METHODS = frozenset((
+    'info', 'keyword_stats', 'use_keyword_stats', 'candidates', 'rank_vector', 'vector', 'exact_players',
+    'records', 'suggest',
+))
+
+
+class ShardError(RuntimeError):
+    """a shard could not be reached or failed to answer"""
+
+
+def shard_key(player, by='hash'):
+    """the value a player is partitioned on: a record field (dotted path) or its playerId
+
+    players without the field (free agents have no league) fall back to their id
+    """
+    field = PARTITION_KEYS.get(by, by)
+    value = player
+    for part in field.split('.') if field else ():
+        value = value.get(part) if isinstance(value, dict) else None
+    return player['playerId'] if not field or value in (None, '') else value
+
+
+def shard_of(player, num_shards, by='hash'):
+    """shard of a player record, stable across processes and runs"""
+    return partition_of(shard_key(player, by), num_shards)
+
+
+def partition_players(data_path, output_dir, num_shards, by='hash'):
+    """split the players of data_path into one JSON Lines file per shard, streamed
+
+    data_path: JSON array, JSON Lines file or chunked directory. by: 'hash' spreads
+    players evenly by id, 'league' (or any dotted record field) keeps every player
+    sharing the value on one shard. Files are written beside their targets and renamed
+    over them, so a shard whose players did not change keeps its checksum and its index.
+    Returns the shard file paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(output_dir, SHARD_FILE.format(i)) for i in range(num_shards)]
+    records = JsonlDataset(data_path) if os.path.isdir(data_path) else iter_json_records(data_path)
+    counts = [0] * num_shards
+    files = [open(path + '.tmp', 'w', encoding='utf-8') for path in paths]
+    try:
+        for record in records:
+            shard = shard_of(record, num_shards, by)
+            write_jsonl(files[shard], record)
+            counts[shard] += 1
+    finally:
+        for file in files:
+            file.close()
+    if 0 in counts:
+        for path in paths:
+            os.remove(path + '.tmp')
+        raise ValueError(f"Shard {counts.index(0)} of {num_shards} received no players partitioned by {by}, "
+                         f"use fewer shards")
+    for path in paths:
+        os.replace(path + '.tmp', path)
+    return paths
+
+
+class ShardService:
+    """The calls a coordinator makes on one shard's HybridPlayerSearch
+
+    everything is addressed by player id, rows never leave the shard. Queries arrive
+    already encoded, so a shard only loads the model when it has to build its index.
+    """
+
+    def __init__(self, search):
+        self.search = search
+        self.engine = search.embedding_engine
+
+    def call(self, method, kwargs):
+        if method not in SHARD_METHODS:
+            raise ValueError(f"Unknown shard method {method!r}")
+        return getattr(self, method)(**kwargs)
+
+    def info(self):
+        return {
+            'players': self.engine.live_count,
+            'model_name': self.engine.model_name,
+            'encoder': self.engine.encoder,
+            'dimension': self.engine.index.d,
+            'index_backend': self.engine.index_backend,
+        }
+
+    def keyword_stats(self):
+        """this shard's BM25 statistics over its live players, tombstones left out"""
+        with self.engine.lock:
+            deleted = np.array(sorted(self.engine.deleted), dtype='int64')
+            return self.search.keyword_index.collection_stats(exclude=deleted)
+
+    def use_keyword_stats(self, num_docs, total_length, document_frequencies):
+        with self.engine.lock:
+            self.search.keyword_index.use_collection_stats(num_docs, total_length, document_frequencies)
+
+    def candidates(self, query, query_embedding, top_k, filters=None, semantic_floor=None, score=True):
+        """this shard's semantic and BM25 top_k for one query
+
+        returns (semantic, keyword, scores): ranked (player_id, similarity) and
+        (player_id, bm25) pairs, best first, and with score player_id -> (similarity,
+        bm25) for every candidate of either list, what weighted fusion needs
+        """
+        engine = self.engine
+        allowed = self.search.select(filters)
+        if allowed is not None and len(allowed) == 0:
+            return [], [], {}
+        semantic = engine.rank_vectors(query_embedding[None, :], top_k, allowed=allowed, min_score=semantic_floor)[0]
+
+        with engine.lock:
+            deleted = np.array(sorted(engine.deleted), dtype='int64')
+            keyword_rows, keyword_scores = self.search.keyword_index.top_k(query, top_k, exclude=deleted, allowed=allowed)
+            keyword = [
+                (engine.player_ids[row], float(bm25)) for row, bm25 in zip(keyword_rows.tolist(), keyword_scores)
+            ]
+            if not score:
+                return semantic, keyword, {}
+
+            # semantic candidates deleted since the search are skipped, like HybridPlayerSearch does
+            semantic_rows = [engine.id_to_row.get(player_id, -1) for player_id, _ in semantic]
+            rows = np.union1d(np.array([row for row in semantic_rows if row >= 0], dtype='int64'), keyword_rows)
+            bm25 = self.search.keyword_index.score_rows(query, rows)
+            similarities = similarity(np.asarray(engine.embeddings[rows], dtype='float32') @ query_embedding)
+            scores = {
+                engine.player_ids[row]: (float(cosine), float(keyword_score))
+                for row, cosine, keyword_score in zip(rows.tolist(), similarities, bm25)
+            }
+        return semantic, keyword, scores
+
+    def rank_vector(self, vector, top_k, filters=None, min_score=None):
+        """ranked (player_id, similarity) pairs closest to a unit vector"""
+        allowed = self.search.select(filters)
+        return self.engine.rank_vectors(vector[None, :], top_k, allowed=allowed, min_score=min_score)[0]
+
+    def vector(self, player_id):
+        """the stored unit vector of a player, None when the player is not on this shard"""
+        with self.engine.lock:
+            row = self.engine.id_to_row.get(player_id)
+            return None if row is None else np.asarray(self.engine.embeddings[row], dtype='float32')
+
+    def exact_players(self, query, filters=None):
+        """ids of the players on this shard whose full name is exactly the query"""
+        search = self.search
+        if search.name_index is None:
+            return []
+        player_ids = search.name_index.exact_players(query, is_live=search.is_live)
+        allowed = search.select(filters)
+        if allowed is not None and player_ids:
+            allowed_ids = {self.engine.player_ids[row] for row in allowed.tolist()}
+            player_ids = [player_id for player_id in player_ids if player_id in allowed_ids]
+        return player_ids
+
+    def records(self, player_ids, fields=None):
+        """player_id -> player data of the live players among player_ids"""
+        metadata = self.engine.player_metadata
+        records = {}
+        for player_id in player_ids:
+            row = metadata.id_to_row.get(player_id)
+            if row is not None:
+                records[player_id] = metadata.record(row, fields=fields)
+        return records
+
+    def suggest(self, query, limit=10):
+        return self.search.suggest(query, limit)
+
+
+def _serve_connection(service, connection, stop, wake):
+    with connection:
+        while True:
+            try:
+                method, kwargs = connection.recv()
+            except (EOFError, OSError):
+                return
+            if method == 'shutdown':
+                connection.send(('ok', None))
+                stop.set()
+                wake()
+                return
+            try:
+                reply = ('ok', service.call(method, kwargs))
+            except Exception as e:
+                reply = ('error', f"{type(e).__name__}: {e}")
+            connection.send(reply)
+
+
+def serve_shard(data_path, index_dir, model_name, address=('127.0.0.1', 0), authkey=None, ready=None,
+                index_config=None, neighbor_k=0, encoder_backend='torch', encoder_path=None):
+    """open one shard's indexes (building them when stale) and answer coordinator calls until shut down
+
+    every connection is served by its own thread, so concurrent queries of a coordinator
+    run in parallel. ready: optional connection that receives the bound address once the
+    shard serves, or the exception that kept it from starting. authkey: None uses the
+    parent process's key, which local shards share with their coordinator.
+    """
+    try:
+        search = open_search(data_path, IndexStore(index_dir), model_name, index_config=index_config,
+                             neighbor_k=neighbor_k, encoder_backend=encoder_backend, encoder_path=encoder_path)
+        listener = Listener(address, authkey=authkey)
+    except BaseException as e:
+        if ready is not None:
+            ready.send(e)
+        raise
+    service = ShardService(search)
+    stop = threading.Event()
+
+    def wake():
+        # accept() does not return on close, a last connection unblocks it
+        Client(listener.address, authkey=authkey).close()
+
+    if ready is not None:
+        ready.send(listener.address)
+    with listener:
+        while not stop.is_set():
+            try:
+                connection = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            threading.Thread(
+                target=_serve_connection, args=(service, connection, stop, wake), name='shard-connection', daemon=True
+            ).start()
+
+
+def start_local_shards(data_paths, index_dir, model_name, authkey=None, index_config=None, neighbor_k=0,
+                       host='127.0.0.1', encoder_backend='torch', encoder_path=None):
+    """one serve_shard process per shard file on this machine, standing in for shard nodes
+
+    shard i keeps its indexes in index_dir/shard-00i and builds them in parallel with the
+    others when stale. Returns (processes, addresses) once every shard serves.
+    """
+    # spawn: the parent may already run faiss or model threads, which do not survive fork
+    context = multiprocessing.get_context('spawn')
+    processes, receivers = [], []
+    for i, data_path in enumerate(data_paths):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=serve_shard, name=f'shard-{i}', daemon=True,
+            args=(data_path, os.path.join(index_dir, SHARD_INDEX_DIR.format(i)), model_name),
+            kwargs=dict(address=(host, 0), authkey=authkey, ready=sender, index_config=index_config,
+                        neighbor_k=neighbor_k, encoder_backend=encoder_backend, encoder_path=encoder_path),
+        )
+        process.start()
+        sender.close()
+        processes.append(process)
+        receivers.append(receiver)
+
+    addresses = []
+    for i, receiver in enumerate(receivers):
+        try:
+            message = receiver.recv()
+        except EOFError:
+            message = ShardError("the process exited before serving")
+        if isinstance(message, BaseException):
+            for process in processes:
+                process.terminate()
+            raise ShardError(f"Shard {i} failed to start: {message}") from message
+        addresses.append(message)
+    return processes, addresses
+
+
+def top_merged(ranked_lists, k):
+    """the k best (player_id, score, shard) items of lists already sorted best first"""
+    return list(islice(heapq.merge(*ranked_lists, key=lambda item: -item[1]), k))
+
+
+class ShardedSearch:
+    """Scatter-gather search over player shards served by separate processes (serve_shard)
+
+    a query is encoded once here, sent to every shard at once, and the per-shard top-k
+    lists are merged with a heap. Scores are made comparable across shards before the
+    merge: similarities come from one model over unit vectors, BM25 uses the idf and
+    average document length of the whole corpus (sync_keyword_stats) and weighted fusion
+    divides by the best keyword score of all shards, so the ranking is the one a single
+    index over the same players gives. Results have the shape of HybridPlayerSearch's.
+
+    model: an already loaded encoder or a Future of one; loaded on first use when None.
+    encoder_backend, encoder_path: how the model runs (see load_model), every shard must
+    have been encoded the same way
+    """
+
+    def __init__(self, addresses, model_name, model=None, authkey=None, fusion='weighted', encoder_backend='torch',
+                 encoder_path=None):
+        if fusion not in FUSION_STRATEGIES:
+            raise ValueError(f"Unknown fusion strategy '{fusion}', use one of {FUSION_STRATEGIES}")
+        self.addresses = list(addresses)
+        self.model_name = model_name
+        self._model = model
+        self.encoder_backend = encoder_backend
+        self.encoder_path = encoder_path
+        self.authkey = authkey
+        self.fusion = fusion
+        self._idle = [queue.SimpleQueue() for _ in self.addresses]  # open connections per shard
+        self.pool = ThreadPoolExecutor(max_workers=4 * len(self.addresses), thread_name_prefix='shard-call')
+
+        self.shards = self.scatter('info')
+        for i, info in enumerate(self.shards):
+            if info['model_name'] != model_name:
+                raise ValueError(f"Shard {i} was built with {info['model_name']!r}, not {model_name!r}")
+            if info['encoder'] != encoder_id(encoder_backend, encoder_path):
+                raise ValueError(f"Shard {i} was encoded with {info['encoder']!r}, not the {encoder_backend} encoder")
+        self.sync_keyword_stats()
+
+    @property
+    def model(self):
+        if isinstance(self._model, Future):
+            self._model = self._model.result()
+        elif self._model is None:
+            self._model = load_model(self.model_name, self.encoder_backend, self.encoder_path)
+        return self._model
+
+    @property
+    def live_count(self):
+        return sum(info['players'] for info in self.shards)
+
+    def call(self, shard, method, **kwargs):
+        """run method on one shard, over a connection no other call is using"""
+        idle = self._idle[shard]
+        try:
+            connection = idle.get_nowait()
+        except queue.Empty:
+            try:
+                connection = Client(self.addresses[shard], authkey=self.authkey)
+            except OSError as e:
+                raise ShardError(f"Shard {shard} at {self.addresses[shard]} is unreachable: {e}") from e
+        try:
+            connection.send((method, kwargs))
+            status, result = connection.recv()
+        except (OSError, EOFError) as e:
+            connection.close()
+            raise ShardError(f"Shard {shard} at {self.addresses[shard]} dropped the connection: {e}") from e
+        idle.put(connection)
+        if status == 'error':
+            raise ShardError(f"Shard {shard}: {result}")
+        return result
+
+    def scatter(self, method, **kwargs):
+        """method on every shard at once, results in shard order"""
+        futures = [self.pool.submit(self.call, shard, method, **kwargs) for shard in range(len(self.addresses))]
+        return [future.result() for future in futures]
+
+    def sync_keyword_stats(self):
+        """hand every shard the BM25 statistics of the whole corpus
+
+        runs on connect; again whenever a shard was rebuilt from new data or took
+        upserts and deletes, tombstoned players no longer count
+        """
+        stats = self.scatter('keyword_stats')
+        num_docs = sum(shard_stats['num_docs'] for shard_stats in stats)
+        total_length = sum(shard_stats['total_length'] for shard_stats in stats)
+        document_frequencies = {}
+        for shard_stats in stats:
+            for term, df in shard_stats['document_frequencies'].items():
+                document_frequencies[term] = document_frequencies.get(term, 0) + df
+        futures = [
+            # a shard only scores its own terms
+            self.pool.submit(
+                self.call, shard, 'use_keyword_stats', num_docs=num_docs, total_length=total_length,
+                document_frequencies={term: document_frequencies[term] for term in shard_stats['document_frequencies']},
+            )
+            for shard, shard_stats in enumerate(stats)
+        ]
+        for future in futures:
+            future.result()
+
+    def encode(self, query):
+        return normalize_rows(self.model.encode([normalize_query(query)]))[0]
+
+    def materialize(self, ranked, score_field, fields=None):
+        """turn ranked (player_id, score, shard) items into result dicts, fetching player data from the owners"""
+        by_shard = {}
+        for player_id, _, shard in ranked:
+            by_shard.setdefault(shard, []).append(player_id)
+        futures = [
+            self.pool.submit(self.call, shard, 'records', player_ids=player_ids, fields=fields)
+            for shard, player_ids in by_shard.items()
+        ]
+        records = {}
+        for future in futures:
+            records.update(future.result())
+
+        results = []
+        for player_id, score, _ in ranked:
+            if player_id in records:
+                results.append({
+                    'rank': len(results) + 1,
+                    'player_id': player_id,
+                    score_field: score,
+                    'player_data': records[player_id],
+                })
+        return results
+
+    def _rank_vector(self, vector, top_k, filters=None, min_score=None):
+        lists = self.scatter('rank_vector', vector=vector, top_k=top_k, filters=filters, min_score=min_score)
+        return top_merged([[(player_id, score, shard) for player_id, score in ranked]
+                           for shard, ranked in enumerate(lists)], top_k)
+
+    def _similar(self, player_id, k, filters=None, min_score=None):
+        """ranked (player_id, similarity, shard) closest to a stored player, None when unknown"""
+        vectors = self.scatter('vector', player_id=player_id)
+        vector = next((vector for vector in vectors if vector is not None), None)
+        if vector is None:
+            return None
+        ranked = self._rank_vector(vector, k + 1, filters, min_score)
+        return [item for item in ranked if item[0] != player_id][:k]
+
+    def name_match(self, query, top_k=10, filters=None, min_score=None):
+        """ranked (player_id, score, shard) when the query is exactly a player's name, see HybridPlayerSearch"""
+        named = [
+            (player_id, shard) for shard, player_ids in enumerate(self.scatter('exact_players', query=query, filters=filters))
+            for player_id in player_ids
+        ]
+        if not named:
+            return None
+        ranked = [(player_id, 1.0, shard) for player_id, shard in named[:top_k]]
+        if len(ranked) < top_k:
+            named_ids = {player_id for player_id, _ in named}
+            similar = self._similar(named[0][0], top_k, filters, min_score) or []
+            ranked += [item for item in similar if item[0] not in named_ids][:top_k - len(ranked)]
+        return ranked
+
+    def _fuse(self, responses, top_k, alpha, fusion, min_score):
+        """merge the shards' candidates into the global top_k as (player_id, score, shard)"""
+        semantic = top_merged([[(player_id, score, shard) for player_id, score in response[0]]
+                               for shard, response in enumerate(responses)], top_k)
+        keyword = top_merged([[(player_id, score, shard) for player_id, score in response[1]]
+                              for shard, response in enumerate(responses)], top_k)
+        final_scores = {}
+        if fusion == 'rrf':
+            for weight, ranked in ((alpha, semantic), (1 - alpha, keyword)):
+                for rank, (player_id, _, shard) in enumerate(ranked, 1):
+                    final_scores[player_id, shard] = final_scores.get((player_id, shard), 0.0) + weight / (RRF_K + rank)
+        else:
+            # the best keyword hit of all shards is the BM25 peak, as in a single index
+            peak = keyword[0][1] if keyword else 0.0
+            for player_id, _, shard in semantic + keyword:
+                cosine, bm25 = responses[shard][2][player_id]
+                final_scores[player_id, shard] = alpha * cosine + (1 - alpha) * (bm25 / peak if peak > 0 else bm25)
+
+        best = heapq.nlargest(top_k, final_scores.items(), key=lambda item: item[1])
+        if min_score is not None and fusion == 'weighted':
+            best = [item for item in best if item[1] >= min_score]
+        return [(player_id, score, shard) for (player_id, shard), score in best]
+
+    def hybrid_search(self, query, top_k=10, alpha=0.7, fusion=None, filters=None, min_score=None, fields=None):
+        """HybridPlayerSearch.hybrid_search over every shard"""
+        fusion = fusion or self.fusion
+        if fusion not in FUSION_STRATEGIES:
+            raise ValueError(f"Unknown fusion strategy '{fusion}', use one of {FUSION_STRATEGIES}")
+
+        ranked = self.name_match(query, top_k, filters=filters, min_score=min_score)
+        if ranked is None:
+            responses = self.scatter(
+                'candidates', query=query, query_embedding=self.encode(query), top_k=top_k, filters=filters,
+                semantic_floor=min_score if fusion == 'rrf' else None, score=fusion == 'weighted',
+            )
+            ranked = self._fuse(responses, top_k, alpha, fusion, min_score)
+        return self.materialize(ranked, 'combined_score', fields)
+
+    def semantic_search(self, query, top_k=10, filters=None, min_score=None, fields=None):
+        """HybridPlayerSearch.semantic_search over every shard"""
+        ranked = self._rank_vector(self.encode(query), top_k, filters, min_score)
+        return self.materialize(ranked, 'similarity_score', fields)
+
+    def similar_players(self, player_id, k=10, filters=None, min_score=None, fields=None):
+        """players like player_id from its stored vector on any shard, None when the player is unknown"""
+        ranked = self._similar(player_id, k, filters, min_score)
+        if ranked is None:
+            return None
+        return self.materialize(ranked, 'similarity_score', fields)
+
+    def suggest(self, query, limit=10):
+        """name completions of all shards, exact before prefix before typo matches; clubs appear once"""
+        candidates = []
+        for shard, suggestions in enumerate(self.scatter('suggest', query=query, limit=limit)):
+            for position, suggestion in enumerate(suggestions):
+                key = (SUGGEST_ORDER.get(suggestion['match'], len(SUGGEST_ORDER)), len(suggestion['name']), position)
+                candidates.append((key, shard, suggestion))
+        candidates.sort(key=lambda item: item[:2])
+
+        merged, clubs = [], set()
+        for _, _, suggestion in candidates:
+            if suggestion['type'] != 'player':
+                if suggestion['name'] in clubs:
+                    continue
+                clubs.add(suggestion['name'])
+            merged.append(suggestion)
+            if len(merged) == limit:
+                break
+        return merged
+
+    def close(self, shutdown=False):
+        """close the connections; shutdown also stops the shard processes"""
+        if shutdown:
+            self.scatter('shutdown')
+        for idle in self._idle:
+            while not idle.empty():
+                idle.get_nowait().close()
+        self.pool.shutdown()
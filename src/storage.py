@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import threading
+import faiss
+from contextlib import contextmanager
+import numpy as np
+from src.ann import configure_index, index_backend
+from src.bm25 import BM25Index
+from src.cache import EmbeddingCache
+from src.filters import AttributeIndex
+from src.names import NameIndex
+from src.neighbors import NeighborGraph
+from src.player_store import PlayerStore
+from src.utils import atomic_write, file_checksum, timed
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
+
+# bump when the layout of the files below changes
+INDEX_FORMAT_VERSION = 4  # 2: unit-length vectors in an inner-product index, 3: columnar metadata,
+# 4: metadata values as mapped JSON text
+
+MANIFEST_FILE = 'manifest.json'
+INDEX_FILE = 'players.faiss'
+IDS_FILE = 'player_ids.json'
+EMBEDDINGS_FILE = 'embeddings.npy'
+METADATA_DIR = 'metadata'
+EMBEDDING_CACHE_DIR = 'embedding_cache'
+KEYWORD_DIR = 'keyword'
+NEIGHBORS_DIR = 'neighbors'
+ATTRIBUTES_DIR = 'attributes'
+NAMES_DIR = 'names'
+LOCK_FILE = '.build.lock'
+JOURNAL_FILE = 'journal.jsonl'
+
+
+class IndexStore:
+    """Versioned on-disk artifact holding a built PlayerEmbeddingEngine"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def read_manifest(self):
+        try:
+            with open(self._file(MANIFEST_FILE), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def published_checksum(self):
+        """source checksum of the stored artifact, None when nothing complete is stored"""
+        return (self.read_manifest() or {}).get('source_checksum')
+
+    @contextmanager
+    def lock(self, shared=False):
+        """hold the store's build lock across processes: exclusive to build, shared to load
+
+        workers started together take turns, the first one builds and the others load
+        its files; readers never block each other
+        """
+        if shared:
+            try:
+                file = open(self._file(LOCK_FILE), 'r')
+            except OSError:
+                yield  # never built here, or a read-only copy: nothing to wait for
+                return
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            file = open(self._file(LOCK_FILE), 'a')
+        with file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    def matches(self, model_name, dimension, source_checksum, backend=None, encoder='torch'):
+        """check the stored artifact was built from the same model, encoder, source data and index backend
+
+        dimension: None while the model is still loading, HybridPlayerSearch.warm_up checks it later
+        """
+        manifest = self.read_manifest()
+        if not manifest:
+            return False
+        return (
+            manifest.get('format_version') == INDEX_FORMAT_VERSION
+            and manifest.get('model_name') == model_name
+            and manifest.get('encoder', 'torch') == encoder
+            and (dimension is None or manifest.get('dimension') == dimension)
+            and manifest.get('source_checksum') == source_checksum
+            and (backend is None or manifest.get('index_backend') == backend)
+        )
+
+    def save(self, engine, source_checksum):
+        """write index, id map, embeddings and metadata, manifest last"""
+        os.makedirs(self.path, exist_ok=True)
+
+        # drop the old manifest first so a crash mid-save never looks valid
+        if os.path.exists(self._file(MANIFEST_FILE)):
+            os.remove(self._file(MANIFEST_FILE))
+
+        tmp_index = self._file(INDEX_FILE + '.tmp')
+        faiss.write_index(engine.index, tmp_index)
+        os.replace(tmp_index, self._file(INDEX_FILE))
+        atomic_write(
+            self._file(EMBEDDINGS_FILE),
+            lambda file: np.save(file, np.ascontiguousarray(engine.embeddings, dtype='float32')),
+            'wb',
+        )
+        atomic_write(self._file(IDS_FILE), lambda file: json.dump(engine.player_ids, file))
+        engine.player_metadata.save(self._file(METADATA_DIR))
+
+        manifest = {
+            'format_version': INDEX_FORMAT_VERSION,
+            'model_name': engine.model_name,
+            'encoder': engine.encoder,
+            'dimension': engine.dimension,
+            'num_players': len(engine.player_ids),
+            'index_backend': engine.index_backend,
+            'source_checksum': source_checksum,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        atomic_write(self._file(MANIFEST_FILE), lambda file: json.dump(manifest, file, indent=2))
+        return manifest
+
+    def load(self, engine, read_only=False):
+        """memory-map the stored artifact into engine
+
+        read_only: the engine never takes upserts, so IVF-PQ lists and, where faiss supports
+        it, flat and HNSW vector storage are mapped as well instead of copied per process
+        """
+        manifest = self.read_manifest() or {}
+        # memory-mapped IVF lists come back read-only and would reject upserts; IVF-PQ codes
+        # are small enough to read into memory unless nothing will be written
+        mapped = read_only or manifest.get('index_backend') != 'ivfpq'
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mapped else 0
+        if read_only:
+            # adding to such an index aborts the process, hence read-only only
+            if hasattr(faiss, 'IO_FLAG_MMAP_IFC'):
+                flags |= faiss.IO_FLAG_MMAP_IFC
+            else:
+                print(f"faiss {faiss.__version__} cannot memory-map flat or HNSW vectors, "
+                      f"every worker reads its own copy (see requirements.txt)")
+        engine.index = faiss.read_index(self._file(INDEX_FILE), flags)
+        engine.read_only = read_only
+        configure_index(engine.index, engine.index_config)  # efSearch / nprobe may have changed since the build
+        engine.index_backend = index_backend(engine.index)
+        engine.embeddings = np.load(self._file(EMBEDDINGS_FILE), mmap_mode='r')
+        with open(self._file(IDS_FILE), 'r', encoding='utf-8') as file:
+            engine.player_ids = json.load(file)
+        engine.player_metadata = PlayerStore.load(self._file(METADATA_DIR), engine.player_ids)
+        engine.deleted = set()
+        engine.rebuild_id_map()
+        return engine.index
+
+
+class WriteJournal:
+    """Append-only log of live upserts and deletes, replayed onto every newly loaded engine
+
+    the stored indexes and the data file only change on a rebuild, so live writes would
+    otherwise be gone after a restart or a reload. One JSON line per write, synced to disk
+    before the write is acknowledged. The first line holds the checksum of the data file
+    the writes were made on: once the indexes are built from a different data file, the
+    writes are stale and the journal starts over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.source_checksum = None  # data file of the engine taking the writes, set by replay()
+        self._lock = threading.Lock()
+
+    def append(self, op, player_id, player=None):
+        entry = {'op': op, 'player_id': player_id}
+        if player is not None:
+            entry['player'] = player
+        line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as file:
+                if file.tell() == 0:
+                    file.write(json.dumps({'source_checksum': self.source_checksum}) + '\n')
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def read(self):
+        """(source checksum, logged writes in order); a line cut off by a crash mid-append ends the log"""
+        try:
+            file = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return None, []
+        checksum, entries = None, []
+        with file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if 'op' in entry:
+                    entries.append(entry)
+                else:
+                    checksum = entry.get('source_checksum')
+        return checksum, entries
+
+    def entries(self):
+        return self.read()[1]
+
+    def replay(self, search):
+        """apply the logged writes to a HybridPlayerSearch, only the last one per player
+
+        writes logged against another data file than search.source_checksum are dropped
+        instead; either way the journal is rewritten with what is still current. Returns
+        the number of writes applied
+        """
+        with self._lock:
+            checksum, entries = self.read()
+            self.source_checksum = search.source_checksum
+            if checksum != search.source_checksum:
+                if entries:
+                    print(f"Dropping {len(entries)} live writes from {self.path}, "
+                          f"they were made on another version of the data file")
+                entries = []
+
+            latest = {}
+            for entry in entries:
+                latest.pop(entry['player_id'], None)  # keep the order of the last writes
+                latest[entry['player_id']] = entry
+            for entry in latest.values():
+                if entry['op'] == 'upsert':
+                    search.upsert_player(entry['player'])
+                else:
+                    search.delete_player(entry['player_id'])
+
+            if os.path.exists(self.path):  # also drops a line cut off by a crash
+                lines = [{'source_checksum': search.source_checksum}, *latest.values()]
+                atomic_write(self.path, lambda file: file.writelines(
+                    json.dumps(line, ensure_ascii=False, default=str) + '\n' for line in lines
+                ))
+        return len(latest)
+
+
+def load_or_build_index(engine, players_data, store, source_checksum, read_only=False):
+    """load the stored index when its manifest matches, otherwise rebuild and save it
+
+    read_only: never build, a missing or stale index is an error
+    """
+    manifest = store.read_manifest() or {}
+    # the stored count spares parsing the data file when it has not changed
+    same_source = manifest.get('source_checksum') == source_checksum and 'num_players' in manifest
+    if read_only and not same_source:
+        raise RuntimeError(f"No complete index in {store.path}, run the build step first")
+    backend = engine.index_config.resolve(manifest['num_players'] if same_source else len(players_data))
+    # loading does not need the model, so it is not waited for
+    dimension = engine.dimension if engine.model_ready else None
+    if store.matches(engine.model_name, dimension, source_checksum, backend, engine.encoder):
+        print(f"Loading embedding index from {store.path}...")
+        store.load(engine, read_only=read_only)
+        return False
+    if read_only:
+        raise RuntimeError(f"No {backend} index for {engine.model_name} ({engine.encoder}) in {store.path}, "
+                           f"run the build step first")
+
+    print("Building embedding index...")
+    cache = EmbeddingCache(os.path.join(store.path, EMBEDDING_CACHE_DIR), engine.model_name, engine.encoder).load()
+    engine.build_index(players_data, cache=cache)
+    store.save(engine, source_checksum)
+    return True
+
+
+def load_or_build_keyword_index(search, players_data, store, source_checksum, read_only=False):
+    """load the stored BM25 index when it was built from the same source data, otherwise rebuild and save it"""
+    path = os.path.join(store.path, KEYWORD_DIR)
+    meta = BM25Index.read_meta(path)
+    rows = len(search.embedding_engine.player_ids)
+    if meta and meta.get('source_checksum') == source_checksum and meta.get('num_docs') == rows:
+        print(f"Loading keyword index from {path}...")
+        search.keyword_index = BM25Index.load(path)
+        search.embedding_engine.release_corpus()  # profiles of a fresh embedding build are not needed
+        return False
+    if read_only:
+        raise RuntimeError(f"The keyword index in {path} does not match the embedding index, run the build step")
+
+    print("Building keyword index...")
+    search.build_keyword_index(players_data)
+    search.keyword_index.save(path, source_checksum=source_checksum)
+    return True
+
+
+def load_or_build_neighbor_graph(engine, store, source_checksum, k, read_only=False):
+    """load the stored k-NN graph when it was built from the same index, otherwise rebuild and save it"""
+    path = os.path.join(store.path, NEIGHBORS_DIR)
+    meta = NeighborGraph.read_meta(path)
+    if (
+        meta and meta.get('source_checksum') == source_checksum and meta.get('k') == k
+        and meta.get('num_rows') == len(engine.player_ids) and meta.get('index_backend') == engine.index_backend
+        and meta.get('encoder', 'torch') == engine.encoder
+    ):
+        print(f"Loading neighbour graph from {path}...")
+        engine.neighbor_graph = NeighborGraph.load(path)
+        return False
+    if read_only:
+        raise RuntimeError(f"No {k}-NN graph of the embedding index in {path}, run the build step")
+
+    print(f"Building {k}-NN neighbour graph...")
+    engine.build_neighbor_graph(k)
+    engine.neighbor_graph.save(path, source_checksum=source_checksum, index_backend=engine.index_backend,
+                               encoder=engine.encoder)
+    return True
+
+
+def load_or_build_attribute_index(search, store, source_checksum, read_only=False):
+    """load the stored filter index when it was built from the same metadata, otherwise rebuild and save it"""
+    path = os.path.join(store.path, ATTRIBUTES_DIR)
+    meta = AttributeIndex.read_meta(path)
+    rows = len(search.embedding_engine.player_ids)
+    if meta and meta.get('source_checksum') == source_checksum and meta.get('num_rows') == rows:
+        print(f"Loading attribute index from {path}...")
+        search.use_attribute_index(AttributeIndex.load(path))
+        return False
+    if read_only:
+        raise RuntimeError(f"No attribute index of the embedding index in {path}, run the build step")
+
+    print("Building attribute index...")
+    search.build_attribute_index()
+    search.attribute_index.save(path, source_checksum=source_checksum)
+    return True
+
+
+def load_or_build_name_index(search, store, source_checksum, read_only=False):
+    """map the stored name index when read_only, otherwise build it in memory (upserts change it)
+
+    a stale stored copy is replaced for read-only workers
+    """
+    path = os.path.join(store.path, NAMES_DIR)
+    meta = NameIndex.read_meta(path)
+    rows = len(search.embedding_engine.player_ids)
+    current = bool(meta) and meta.get('source_checksum') == source_checksum and meta.get('num_rows') == rows
+    if read_only:
+        if not current:
+            raise RuntimeError(f"No name index of the embedding index in {path}, run the build step")
+        print(f"Loading name index from {path}...")
+        search.name_index = NameIndex.load(path)
+        return False
+
+    search.build_name_index()
+    if current:
+        return False
+    search.name_index.save(path, source_checksum=source_checksum, num_rows=rows)
+    return True
+
+
+def open_search(data_path, store, model_name, model=None, index_config=None, neighbor_k=0, read_only=False,
+                timings=None, encoder_backend='torch', encoder_path=None, **options):
+    """a HybridPlayerSearch over the vector, keyword, filter, name and neighbour indexes in store
+
+    stale or missing indexes are rebuilt from data_path (JSON file or chunked JSON Lines
+    directory) and saved first; read_only serves what the build step published as is and
+    fails instead of building. neighbor_k: neighbours per player in the k-NN graph, 0 for
+    none. timings receives the seconds of every phase; encoder_backend and encoder_path
+    pick the encoder (see load_model); options go to HybridPlayerSearch.
+    """
+    from src.embedding import HybridPlayerSearch, PlayerEmbeddingEngine
+    from src.streaming import LazyPlayers
+
+    timings = {} if timings is None else timings
+    players_data = LazyPlayers(data_path)  # parsed only if an index has to be rebuilt
+    embedding_engine = PlayerEmbeddingEngine(model_name, model=model, index_config=index_config,
+                                             encoder_backend=encoder_backend, encoder_path=encoder_path)
+    search = HybridPlayerSearch(embedding_engine, **options)
+
+    # processes starting together take turns: the first one builds, the others map its files
+    with store.lock(shared=read_only):
+        with timed(timings, 'checksum'):
+            # read-only workers serve what was published, the data file is not even read
+            checksum = store.published_checksum() if read_only else file_checksum(data_path)
+        search.source_checksum = checksum
+        with timed(timings, 'vector_index'):
+            load_or_build_index(embedding_engine, players_data, store, checksum, read_only=read_only)
+        with timed(timings, 'keyword_index'):
+            load_or_build_keyword_index(search, players_data, store, checksum, read_only=read_only)
+        with timed(timings, 'attribute_index'):
+            load_or_build_attribute_index(search, store, checksum, read_only=read_only)
+        with timed(timings, 'name_index'):
+            load_or_build_name_index(search, store, checksum, read_only=read_only)
+        if neighbor_k > 0:
+            with timed(timings, 'neighbor_graph'):
+                load_or_build_neighbor_graph(embedding_engine, store, checksum, neighbor_k, read_only=read_only)
+    return search
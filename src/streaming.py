@@ -0,0 +1,276 @@
+import os
+import json
+import heapq
+import shutil
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from src.preprocessing import PreProcessing
+
+MANIFEST_FILE = 'manifest.json'
+CHUNK_PATTERN = 'players-{:05d}.jsonl'
+PARTITION_BYTES = 16 * 2 ** 20  # raw input per partition, bounds a worker's memory
+READ_SIZE = 1 << 20
+MAX_OPEN_FILES = 128  # partition files open at once while spilling or merging, well under a ulimit -n of 1024
+
+_decoder = json.JSONDecoder()
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str).encode
+
+
+def iter_json_records(path, read_size=READ_SIZE):
+    """records of a JSON array or a JSON Lines file, parsed incrementally
+
+    only the current read buffer and the record being decoded are held in memory
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer, position, eof = '', 0, False
+        in_array = None
+        while True:
+            # skip whitespace and separators between records
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                chunk = file.read(read_size)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+
+            if position >= len(buffer):
+                return
+            if in_array is None:
+                in_array = buffer[position] == '['
+                if in_array:
+                    position += 1
+                    continue
+            if in_array and buffer[position] == ']':
+                return
+
+            try:
+                record, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                end = None
+            if end is None or (end == len(buffer) and not eof):
+                # record cut off by the read buffer, or possibly so for a trailing number
+                if eof:
+                    raise ValueError(f"Malformed JSON record in {path} at offset {position}")
+                chunk = file.read(read_size)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+                continue
+            position = end
+            yield record
+
+
+def write_jsonl(file, record):
+    file.write(_encode(record))
+    file.write('\n')
+
+
+def read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield _decoder.decode(line)
+
+
+def partition_of(player_id, num_partitions):
+    # stable across processes, unlike hash() of a str
+    return zlib.crc32(str(player_id).encode('utf-8')) % num_partitions
+
+
+def spill(records, directory, name, num_partitions, numbered=False, max_open=MAX_OPEN_FILES):
+    """split records into per-partition JSON Lines files by playerId, in input order
+
+    numbered: write [sequence number, record] so the input order can be restored.
+    With more than max_open partitions the records go to max_open group files first
+    and each group is split again, so no more than max_open files are ever open.
+    """
+    if numbered:
+        records = ([sequence, record] for sequence, record in enumerate(records))
+
+    def partition(item):
+        return partition_of((item[1] if numbered else item)['playerId'], num_partitions)
+
+    return _spill(records, directory, name, range(num_partitions), partition, max_open)
+
+
+def _spill(items, directory, name, partitions, partition, max_open):
+    start = partitions.start
+    if len(partitions) <= max_open:
+        paths = [os.path.join(directory, f'{name}-{i:05d}.jsonl') for i in partitions]
+        _write_buckets(items, paths, lambda item: partition(item) - start)
+        return paths
+
+    size = -(-len(partitions) // max_open)
+    groups = [partitions[i:i + size] for i in range(0, len(partitions), size)]
+    group_paths = [os.path.join(directory, f'{name}-{group.start:05d}-{group.stop:05d}.group') for group in groups]
+    _write_buckets(items, group_paths, lambda item: (partition(item) - start) // size)
+    paths = []
+    for group, group_path in zip(groups, group_paths):
+        paths.extend(_spill(read_jsonl(group_path), directory, name, group, partition, max_open))
+        os.remove(group_path)
+    return paths
+
+
+def _write_buckets(items, paths, bucket_of):
+    files = [open(path, 'w', encoding='utf-8') for path in paths]
+    try:
+        for item in items:
+            write_jsonl(files[bucket_of(item)], item)
+    finally:
+        for file in files:
+            file.close()
+
+
+def merge_numbered(paths, directory, max_open=MAX_OPEN_FILES):
+    """[sequence, record] files, each sorted by sequence, as one stream in sequence order
+
+    more than max_open files are merged in rounds of max_open into intermediate files
+    (the inputs are removed as they are consumed) until one heap merge can finish it
+    """
+    def merge(group):
+        return heapq.merge(*(read_jsonl(path) for path in group), key=lambda item: item[0])
+
+    round_number = 0
+    while len(paths) > max_open:
+        merged = []
+        for start in range(0, len(paths), max_open):
+            group = paths[start:start + max_open]
+            merged.append(os.path.join(directory, f'merged-{round_number}-{start:05d}.jsonl'))
+            with open(merged[-1], 'w', encoding='utf-8') as file:
+                for item in merge(group):
+                    write_jsonl(file, item)
+            for path in group:
+                os.remove(path)
+        paths, round_number = merged, round_number + 1
+    return merge(paths)
+
+
+_lookups = {}  # clubs and nationalities, set once per worker process
+
+
+def _init_worker(clubs, nationalities):
+    _lookups['clubs'], _lookups['nationalities'] = clubs, nationalities
+
+
+def process_partition(players_path, stats_path, output_path):
+    """enrich, merge and normalize one partition, keeping the sequence numbers"""
+    numbered = list(read_jsonl(players_path))
+    processor = PreProcessing(
+        _lookups['clubs'], _lookups['nationalities'], [player for _, player in numbered], list(read_jsonl(stats_path))
+    )
+    processed = processor.process_all_data()
+    with open(output_path, 'w', encoding='utf-8') as file:
+        for (sequence, _), player in zip(numbered, processed):
+            write_jsonl(file, [sequence, player])
+    return len(processed)
+
+
+def run_streaming_pipeline(clubs_path, nationalities_path, players_path, stats_path, output_dir,
+                           workers=None, chunk_size=10000, num_partitions=None, tmp_dir=None):
+    """preprocess raw dumps of any size with flat memory
+
+    players and season rows are streamed into hash partitions by playerId, each
+    partition runs PreProcessing in a process pool, and the results are merged back
+    into input order as JSON Lines chunks of chunk_size players plus a manifest.
+    Returns the manifest.
+    """
+    workers = workers or os.cpu_count() or 1
+    if num_partitions is None:
+        raw_bytes = os.path.getsize(players_path) + os.path.getsize(stats_path)
+        num_partitions = max(workers, -(-raw_bytes // PARTITION_BYTES))
+
+    # clubs and nationalities are small lookup tables every partition needs
+    clubs = list(iter_json_records(clubs_path))
+    nationalities = list(iter_json_records(nationalities_path))
+
+    work_dir = tempfile.mkdtemp(prefix='preprocess-', dir=tmp_dir)
+    try:
+        player_parts = spill(iter_json_records(players_path), work_dir, 'players', num_partitions, numbered=True)
+        stats_parts = spill(iter_json_records(stats_path), work_dir, 'stats', num_partitions)
+        output_parts = [os.path.join(work_dir, f'processed-{i:05d}.jsonl') for i in range(num_partitions)]
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(clubs, nationalities)) as pool:
+            list(pool.map(process_partition, player_parts, stats_parts, output_parts))
+
+        manifest = write_chunks(merge_numbered(output_parts, work_dir), output_dir, chunk_size)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return manifest
+
+
+def write_chunks(numbered_records, output_dir, chunk_size):
+    """write [sequence, record] pairs as JSON Lines chunks, manifest last"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)  # a crash mid-write never looks complete
+    for name in os.listdir(output_dir):
+        if name.startswith('players-') and name.endswith('.jsonl'):
+            os.remove(os.path.join(output_dir, name))
+
+    chunks, count, file = [], 0, None
+    try:
+        for _, record in numbered_records:
+            if count % chunk_size == 0:
+                if file is not None:
+                    file.close()
+                chunks.append(CHUNK_PATTERN.format(len(chunks)))
+                file = open(os.path.join(output_dir, chunks[-1]), 'w', encoding='utf-8')
+            write_jsonl(file, record)
+            count += 1
+    finally:
+        if file is not None:
+            file.close()
+
+    manifest = {'num_players': count, 'chunk_size': chunk_size, 'chunks': chunks}
+    with open(manifest_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+class JsonlDataset:
+    """Players stored as JSON Lines chunks, streamed from disk on every iteration
+
+    stands in for the list of player dicts wherever players are only iterated and
+    counted, so an index can be built without the whole dump in memory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as file:
+            self.manifest = json.load(file)
+
+    def __len__(self):
+        return self.manifest['num_players']
+
+    def __iter__(self):
+        for chunk in self.manifest['chunks']:
+            yield from read_jsonl(os.path.join(self.path, chunk))
+
+
+def load_players(path):
+    """players from a chunked output directory (streamed), a .jsonl file or a JSON array file"""
+    if os.path.isdir(path):
+        return JsonlDataset(path)
+    return list(iter_json_records(path))
+
+
+class LazyPlayers:
+    """load_players(path) on first use, so a start that only loads stored indexes never parses the data"""
+
+    def __init__(self, path):
+        self.path = path
+        self._players = None
+
+    @property
+    def players(self):
+        if self._players is None:
+            self._players = load_players(self.path)
+        return self._players
+
+    def __len__(self):
+        return len(self.players)
+
+    def __iter__(self):
+        return iter(self.players)
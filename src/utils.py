@@ -1,5 +1,11 @@
+import os
+import time
+import hashlib
 import json
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import islice
+import numpy as np
 
 def load_json(json_path):
     with open(json_path, "r", encoding='utf-8') as file:
@@ -23,3 +29,96 @@ def calculate_age(birth_date):
             (today.month, today.day) < (birth_date.month, birth_date.day)
         )
     return None
+
+def file_checksum(file_path, chunk_size=1 << 20):
+    """sha256 of a file, read in chunks so large dumps are not loaded at once
+
+    a directory (chunked JSON Lines output) hashes its file names and contents in name order
+    """
+    digest = hashlib.sha256()
+    directory = os.path.isdir(file_path)
+    names = sorted(os.listdir(file_path)) if directory else [None]
+    for name in names:
+        if directory:
+            digest.update(name.encode('utf-8') + b'\0')
+        with open(os.path.join(file_path, name) if directory else file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def chunked(iterable, size):
+    """lists of up to size consecutive items, read lazily from any iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def atomic_write(path, write_fn, mode='w'):
+    """write_fn(file) into a file beside path, then rename it over path
+
+    processes that still have the old file memory-mapped keep reading the old inode,
+    and a crash mid-write never leaves a truncated file behind
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as file:
+        write_fn(file)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def timed(timings, name):
+    """record the seconds spent in the block as timings[name]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.perf_counter() - start, 3)
+
+
+class StringArray:
+    """read-only sequence of strings kept as one UTF-8 buffer and offsets, memory-mappable"""
+
+    def __init__(self, offsets, buffer):
+        self.offsets = offsets
+        self.buffer = buffer
+        # plain memoryviews index an order of magnitude faster than (memory-mapped) arrays
+        self._offsets = memoryview(np.ascontiguousarray(offsets, dtype='int64'))
+        self._buffer = memoryview(np.ascontiguousarray(buffer, dtype='uint8'))
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype='int64')
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype='uint8'))
+
+    def save(self, path, name):
+        """store name.offsets.npy and name.utf8.npy in path"""
+        atomic_write(os.path.join(path, f'{name}.offsets.npy'),
+                     lambda file: np.save(file, np.asarray(self.offsets, dtype='int64')), 'wb')
+        atomic_write(os.path.join(path, f'{name}.utf8.npy'),
+                     lambda file: np.save(file, np.asarray(self.buffer, dtype='uint8')), 'wb')
+
+    @classmethod
+    def load(cls, path, name, mmap_mode='r'):
+        return cls(*(
+            np.load(os.path.join(path, f'{name}.{suffix}.npy'), mmap_mode=mmap_mode) for suffix in ('offsets', 'utf8')
+        ))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return str(self._buffer[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+    def tolist(self):
+        """every string decoded into a list, faster than iterating"""
+        data = bytes(self._buffer)
+        offsets = np.asarray(self.offsets).tolist()
+        return [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
@@ -0,0 +1,92 @@
+import zlib
+import numpy as np
+import pytest
+from src.ann import IndexConfig
+from src.bm25 import tokenize
+from src.embedding import HybridPlayerSearch, PlayerEmbeddingEngine
+
+DIMENSION = 64
+
+
+class FakeEncoder:
+    """Deterministic bag-of-words encoder standing in for the SentenceTransformer
+
+    texts sharing words get similar vectors, which is all the search tests rely on
+    """
+
+    def __init__(self, dimension=DIMENSION):
+        self.dimension = dimension
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, show_progress_bar=False, **kwargs):
+        self.calls += 1
+        single = isinstance(sentences, str)
+        vectors = np.zeros((1 if single else len(sentences), self.dimension), dtype='float32')
+        for row, text in enumerate([sentences] if single else sentences):
+            vectors[row, 0] = 0.1  # no all-zero rows
+            for token in tokenize(text):
+                vectors[row, zlib.crc32(token.encode('utf-8')) % self.dimension] += 1.0
+        return vectors[0] if single else vectors
+
+
+def make_player(player_id, name, age, nationality, position, club, height=180.0, foot='Right', goals=0,
+                assists=0, demonym=None):
+    return {
+        'playerId': player_id,
+        'fullName': name,
+        'age': age,
+        'nationality': nationality,
+        'position': position,
+        'current_club': {'clubName': club},
+        'heightCm': height,
+        'weightKg': 75.0,
+        'preferredFoot': foot,
+        'season_statistics': [{
+            'seasonId': 2023, 'clubId': 1, 'appearances': 30, 'goals': goals, 'assists': assists,
+            'minutesPlayed': 2500,
+        }],
+        'nationality_details': {'name': nationality, 'demonym': demonym or nationality},
+        'club_history': [{'clubId': 1, 'clubName': club, 'seasons': [2023]}],
+    }
+
+
+PLAYERS = [
+    make_player('1', 'Lionel Messi', 36, 'Argentina', 'Forward', 'Inter Miami', 170.0, 'Left', 20, 15, 'Argentinian'),
+    make_player('2', 'Erling Haaland', 23, 'Norway', 'Forward', 'Manchester City', 195.0, 'Left', 36, 8, 'Norwegian'),
+    make_player('3', 'Virgil van Dijk', 32, 'Netherlands', 'Defender', 'Liverpool', 193.0, 'Right', 3, 1, 'Dutch'),
+    make_player('4', 'Kevin De Bruyne', 32, 'Belgium', 'Midfielder', 'Manchester City', 181.0, 'Right', 7, 18,
+                'Belgian'),
+    make_player('5', 'Vinicius Junior', 23, 'Brazil', 'Forward', 'Real Madrid', 176.0, 'Right', 15, 9, 'Brazilian'),
+    make_player('6', 'Alisson Becker', 31, 'Brazil', 'Goalkeeper', 'Liverpool', 193.0, 'Right', 0, 0, 'Brazilian'),
+    make_player('7', 'Pedri', 21, 'Spain', 'Midfielder', 'Barcelona', 174.0, 'Right', 4, 6, 'Spanish'),
+    make_player('8', 'William Saliba', 23, 'France', 'Defender', 'Arsenal', 192.0, 'Right', 2, 0, 'French'),
+]
+
+
+def result_ids(results):
+    return [result['player_id'] for result in results]
+
+
+def build_search(players, encoder=None):
+    """a HybridPlayerSearch over players with every index built in memory"""
+    engine = PlayerEmbeddingEngine('fake-encoder', model=encoder or FakeEncoder(),
+                                   index_config=IndexConfig(backend='flat'))
+    engine.build_index([dict(player) for player in players])
+    search = HybridPlayerSearch(engine)
+    search.build_keyword_index()
+    search.build_attribute_index()
+    search.build_name_index()
+    return search
+
+
+@pytest.fixture
+def players():
+    return [dict(player) for player in PLAYERS]
+
+
+@pytest.fixture
+def search(players):
+    return build_search(players)
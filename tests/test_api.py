@@ -0,0 +1,90 @@
+import time
+import threading
+import pytest
+from fastapi.testclient import TestClient
+import manage
+from src.executor import SearchExecutor
+
+
+@pytest.fixture
+def client(monkeypatch, search):
+    monkeypatch.setattr(manage, 'search_engine', search)
+    return TestClient(manage.app)  # no lifespan: the engine above is used as is
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    """run_search waits until the event is set"""
+    release = threading.Event()
+    real_run_search = manage.run_search
+
+    def run_search(*args):
+        release.wait(5)
+        return real_run_search(*args)
+
+    monkeypatch.setattr(manage, 'run_search', run_search)
+    yield release
+    release.set()
+
+
+def test_search_answers(client):
+    response = client.post('/search', json={'query': 'Lionel Messi', 'top_k': 1})
+    assert response.status_code == 200
+    assert response.json()['results'][0]['player_id'] == '1'
+    assert client.post('/search', json={'query': 'Messi', 'top_k': 0}).status_code == 422
+
+
+def test_full_queue_is_rejected_with_429(client, blocked, monkeypatch):
+    executor = SearchExecutor(max_workers=1, max_queue=0)
+    monkeypatch.setattr(manage, 'search_executor', executor)
+
+    first = threading.Thread(target=client.post, args=('/search',), kwargs={'json': {'query': 'Messi'}})
+    first.start()
+    for _ in range(500):
+        if executor.stats()['in_flight']:
+            break
+        time.sleep(0.01)
+
+    response = client.post('/search', json={'query': 'Haaland'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert executor.stats()['rejected'] == 1
+
+    blocked.set()
+    first.join(5)
+    assert client.post('/search', json={'query': 'Haaland'}).status_code == 200
+
+
+def test_slow_search_times_out_with_504(client, blocked, monkeypatch):
+    executor = SearchExecutor(max_workers=1, max_queue=1, timeout=0.05)
+    monkeypatch.setattr(manage, 'search_executor', executor)
+
+    response = client.post('/search', json={'query': 'Messi'})
+    assert response.status_code == 504
+    assert executor.stats()['timed_out'] == 1
+
+    blocked.set()
+    for _ in range(500):  # the abandoned call keeps its slot until it finishes
+        if not executor.stats()['in_flight']:
+            break
+        time.sleep(0.01)
+    assert executor.stats()['in_flight'] == 0
+
+
+def test_batch_body_is_rendered_on_a_search_worker(client, monkeypatch):
+    threads = []
+    real_dumps = manage.dumps
+
+    def dumps(content):
+        threads.append(threading.current_thread().name)
+        return real_dumps(content)
+
+    monkeypatch.setattr(manage, 'dumps', dumps)
+    response = client.post('/search/batch', json=[{'query': 'Lionel Messi', 'top_k': 1}, {'query': 'Liverpool'}])
+    assert response.status_code == 200
+    body = response.json()
+    assert body['total_searches'] == 2 and body['responses'][0]['results'][0]['player_id'] == '1'
+    assert len(threads) == 1 and threads[0].startswith('search')
+
+    lines = client.post('/search/batch?stream=true', json=[{'query': 'Lionel Messi', 'top_k': 1}]).text.splitlines()
+    assert len(lines) == 1 and '"player_id":"1"' in lines[0]
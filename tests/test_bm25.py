@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from src.bm25 import BM25Index, tokenize
+
+WORDS = [f'w{i}' for i in range(40)]
+# a skewed vocabulary gives long and short postings, so MaxScore prunes
+WORD_WEIGHTS = np.linspace(2, 0.1, len(WORDS)) / np.linspace(2, 0.1, len(WORDS)).sum()
+
+
+def random_document(rng):
+    return {'text': ' '.join(rng.choice(WORDS, size=rng.integers(3, 30), p=WORD_WEIGHTS))}
+
+
+def exhaustive(index, documents, query):
+    """BM25 of every row from the raw documents, with the index's idf and average length"""
+    scores = np.zeros(len(documents))
+    for row, document in enumerate(documents):
+        counts, length = index._term_frequencies(document)
+        norm = index.k1 * (1 - index.b + index.b * length / index.avgdl)
+        for token in tokenize(query):
+            tf = counts.get(token, 0.0)
+            if token in index.vocab and tf:
+                scores[row] += index.idf[index.vocab[token]] * tf * (index.k1 + 1) / (tf + norm)
+    return scores
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_maxscore_matches_exhaustive_scoring(seed):
+    rng = np.random.default_rng(seed)
+    documents = [random_document(rng) for _ in range(150)]
+    index = BM25Index().fit(documents)
+    for _ in range(20):  # delta postings of live upserts
+        documents.append(random_document(rng))
+        index.add(documents[-1])
+
+    deleted = np.sort(rng.choice(len(documents), size=15, replace=False))
+    allowed = np.sort(rng.choice(len(documents), size=80, replace=False))
+    for exclude, allow in ((None, None), (deleted, None), (deleted, allowed)):
+        query = ' '.join(rng.choice(WORDS, size=rng.integers(1, 6)))
+        k = int(rng.integers(1, 15))
+
+        expected = exhaustive(index, documents, query)
+        eligible = np.ones(len(documents), dtype=bool)
+        if exclude is not None:
+            eligible[exclude] = False
+        if allow is not None:
+            eligible &= np.isin(np.arange(len(documents)), allow)
+        expected[~eligible] = 0.0
+        best = np.sort(expected[expected > 0])[::-1][:k]
+
+        rows, scores = index.top_k(query, k, exclude=exclude, allowed=allow)
+        assert scores == pytest.approx(best, rel=1e-5)
+        assert scores == pytest.approx(expected[rows], rel=1e-5)  # ties may pick either row
+        assert eligible[rows].all()
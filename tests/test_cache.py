@@ -0,0 +1,68 @@
+import src.cache
+from src.cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(src.cache.time, 'monotonic', clock)
+    cache = LRUCache(maxsize=4, ttl=10.0)
+    cache.put('a', 1)
+
+    clock.now += 9.5
+    assert cache.get('a') == 1
+    clock.now += 1.0
+    assert cache.get('a', 'gone') == 'gone'
+    assert cache.stats()['size'] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the oldest
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    cache.put('a', 10)  # replacing refreshes too
+    cache.put('d', 4)
+    assert cache.get('c') is None and cache.get('a') == 10
+
+
+def test_size_zero_caches_nothing():
+    cache = LRUCache(maxsize=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_searches_without_caches_encode_every_query(search):
+    engine = search.embedding_engine
+    assert engine.result_cache is None and engine.query_embedding_cache is None
+    calls = engine.model.calls
+    first = search.semantic_search('Brazilian forward', top_k=3)
+    assert search.semantic_search('Brazilian forward', top_k=3) == first
+    assert engine.model.calls == calls + 2
+
+
+def test_result_cache_is_keyed_by_index_version(search):
+    engine = search.embedding_engine
+    engine.result_cache = LRUCache(maxsize=16)
+    engine.query_embedding_cache = LRUCache(maxsize=16)
+    calls = engine.model.calls
+
+    search.hybrid_search('Liverpool defender', top_k=2)
+    search.hybrid_search('liverpool  DEFENDER', top_k=2)  # same normalized query
+    assert engine.model.calls == calls + 1
+
+    search.delete_player('3')  # a write bumps the version, the cached ranking no longer applies
+    assert '3' not in [result['player_id'] for result in search.hybrid_search('Liverpool defender', top_k=2)]
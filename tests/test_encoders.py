@@ -0,0 +1,53 @@
+import pytest
+from src.ann import IndexConfig
+from src.cache import EmbeddingCache
+from src.embedding import PlayerEmbeddingEngine
+from src.encoders import encoder_id
+from src.storage import IndexStore, load_or_build_index
+from tests.conftest import PLAYERS, FakeEncoder
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+def engine_for(backend='torch', path=None):
+    return PlayerEmbeddingEngine('fake-encoder', model=FakeEncoder(), index_config=IndexConfig(backend='flat'),
+                                 encoder_backend=backend, encoder_path=path)
+
+
+def test_cache_entries_are_per_encoder(tmp_path):
+    keys = {
+        EmbeddingCache(str(tmp_path), 'fake-encoder', encoder).key('profile')
+        for encoder in ('torch', encoder_id('onnx', 'onnx_encoder'), encoder_id('onnx', 'other_export'))
+    }
+    assert len(keys) == 3
+
+
+def test_index_of_another_encoder_is_rebuilt(tmp_path):
+    store = IndexStore(str(tmp_path))
+    players = [dict(player) for player in PLAYERS]
+    assert load_or_build_index(engine_for(), players, store, 'checksum')
+    assert not load_or_build_index(engine_for(), players, store, 'checksum')
+
+    onnx = engine_for('onnx', str(tmp_path / 'onnx_encoder'))
+    assert load_or_build_index(onnx, players, store, 'checksum')
+    assert store.read_manifest()['encoder'] == onnx.encoder
+    with pytest.raises(RuntimeError):
+        load_or_build_index(engine_for(), players, store, 'checksum', read_only=True)
+
+
+def test_onnx_export_agrees_with_pytorch(tmp_path):
+    for module in ('torch', 'sentence_transformers', 'onnxruntime', 'tokenizers'):
+        pytest.importorskip(module)
+    from src.encoders import check_consistency, export_onnx, load_encoder
+
+    try:
+        reference = load_encoder(MODEL_NAME)
+    except OSError as e:
+        pytest.skip(f"{MODEL_NAME} is not available: {e}")
+    export_onnx(MODEL_NAME, str(tmp_path), quantize=False)
+    candidate = load_encoder(MODEL_NAME, 'onnx', str(tmp_path))
+
+    report = check_consistency(reference, candidate, ["left-footed Brazilian strikers", "young goalkeeper",
+                                                      "Lionel Messi", "tall centre back good in the air"], k=2)
+    assert report['cosine_min'] > 0.999
+    assert report['recall_at_2'] == 1.0
@@ -0,0 +1,55 @@
+import pytest
+from src.filters import AttributeIndex, filter_key
+from tests.conftest import PLAYERS, make_player
+
+
+@pytest.fixture
+def index():
+    return AttributeIndex().build(PLAYERS)
+
+
+def rows(selected):
+    return selected.tolist()
+
+
+def test_categorical_values_are_ored_within_a_field_and_anded_across(index):
+    assert rows(index.select({'position': 'forward'})) == [0, 1, 4]
+    assert rows(index.select({'nationality': ['Brazil', 'Spain']})) == [4, 5, 6]
+    assert rows(index.select({'position': 'Forward', 'nationality': ['Brazil', 'Spain']})) == [4]
+    assert rows(index.select({'position': 'Forward', 'preferred_foot': 'Left', 'club': 'Manchester City'})) == [1]
+
+
+def test_range_bounds_are_inclusive(index):
+    assert rows(index.select({'min_age': 23, 'max_age': 23})) == [1, 4, 7]
+    assert rows(index.select({'position': 'Defender', 'min_height': 193})) == [2]
+    assert index.select({}) is None
+
+
+def test_unknown_values_select_nothing(index):
+    assert rows(index.select({'club': 'Atlantis FC'})) == []
+    assert rows(index.select({'position': 'Forward', 'max_age': 10})) == []
+
+
+def test_add_and_compact_keep_rows_aligned(index):
+    assert index.add(make_player('9', 'Jude Bellingham', 20, 'England', 'Midfielder', 'Real Madrid')) == 8
+    assert rows(index.select({'club': 'Real Madrid'})) == [4, 8]
+
+    index.compact([0, 1, 2, 3, 5, 6, 7, 8])  # drop Vinicius
+    assert index.num_rows == 8
+    assert rows(index.select({'club': 'Real Madrid'})) == [7]
+    assert rows(index.select({'max_age': 21})) == [5, 7]
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    index.save(str(tmp_path), source_checksum='abc')
+    loaded = AttributeIndex.load(str(tmp_path))
+
+    assert AttributeIndex.read_meta(str(tmp_path))['source_checksum'] == 'abc'
+    for filters in ({'position': 'Midfielder'}, {'played_for': 'Liverpool', 'min_age': 30}, {'max_height': 176}):
+        assert rows(loaded.select(filters)) == rows(index.select(filters))
+
+
+def test_filter_key_ignores_order_case_and_empty_values():
+    assert filter_key({'position': ['Forward', 'defender'], 'club': None}) == \
+        filter_key({'position': ['Defender', 'forward']})
+    assert filter_key({}) is None
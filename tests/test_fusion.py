@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from src.embedding import RRF_K, similarity
+
+
+def fuse(search, fusion, alpha=0.7, top_k=4, min_score=None):
+    engine = search.embedding_engine
+    query_embedding = np.asarray(engine.embeddings[0], dtype='float32')  # row 0 is the closest to itself
+    bm25 = {5: 4.0, 2: 2.0, 0: 1.0}
+    return search._fuse(
+        semantic_rows=np.array([0, 3]), keyword_rows=np.array([5, 2, 0]), keyword_scores=np.array([4.0, 2.0, 1.0]),
+        score_keywords=lambda rows: [bm25.get(int(row), 0.0) for row in rows], query_embedding=query_embedding,
+        top_k=top_k, alpha=alpha, fusion=fusion, min_score=min_score,
+    )
+
+
+def test_rrf_sums_weighted_reciprocal_ranks(search):
+    ranked = dict(fuse(search, 'rrf'))
+    ids = search.embedding_engine.player_ids
+
+    assert ranked[ids[0]] == pytest.approx(0.7 / (RRF_K + 1) + 0.3 / (RRF_K + 3))
+    assert ranked[ids[3]] == pytest.approx(0.7 / (RRF_K + 2))
+    assert ranked[ids[5]] == pytest.approx(0.3 / (RRF_K + 1))
+    assert ranked[ids[2]] == pytest.approx(0.3 / (RRF_K + 2))
+    assert [player_id for player_id, _ in fuse(search, 'rrf')] == [ids[0], ids[3], ids[5], ids[2]]
+
+
+def test_weighted_mixes_relative_bm25_with_cosine_similarity(search):
+    engine = search.embedding_engine
+    embeddings = np.asarray(engine.embeddings, dtype='float32')
+    cosine = similarity(embeddings @ embeddings[0])
+    bm25 = {0: 1.0, 2: 2.0, 3: 0.0, 5: 4.0}
+    expected = {engine.player_ids[row]: 0.3 * score / 4.0 + 0.7 * cosine[row] for row, score in bm25.items()}
+
+    ranked = fuse(search, 'weighted')
+    assert dict(ranked) == pytest.approx(expected)
+    assert [player_id for player_id, _ in ranked] == sorted(expected, key=expected.get, reverse=True)
+
+    # alpha 0 ranks by BM25 alone, the cutoff applies to the combined score
+    assert [player_id for player_id, _ in fuse(search, 'weighted', alpha=0.0)][:3] == [
+        engine.player_ids[5], engine.player_ids[2], engine.player_ids[0]]
+    assert all(score >= 0.8 for _, score in fuse(search, 'weighted', min_score=0.8))
+
+
+def test_hybrid_search_encodes_the_query_once(search):
+    engine = search.embedding_engine
+    assert engine.query_embedding_cache is None
+    for fusion in ('weighted', 'rrf'):
+        calls = engine.model.calls
+        assert search.hybrid_search('Brazilian forward Real Madrid', top_k=3, fusion=fusion)
+        assert engine.model.calls == calls + 1
@@ -0,0 +1,31 @@
+import threading
+import pytest
+from src.generation import BuildInProgress, SearchEngineManager
+
+
+def test_writes_are_refused_while_a_generation_builds():
+    release = threading.Event()
+    engines = iter(['first', 'second'])
+
+    def build(timings):
+        engine = next(engines)
+        if engine == 'second':
+            release.wait(5)
+        return engine
+
+    manager = SearchEngineManager(build)
+    manager.build()
+    assert manager.write(lambda engine, value: (engine, value), 1) == ('first', 1)
+
+    generation = manager.rebuild_in_background()
+    with pytest.raises(BuildInProgress):
+        manager.write(lambda engine: engine)
+
+    release.set()
+    for _ in range(500):
+        if manager.pending is None:
+            break
+        threading.Event().wait(0.01)
+    assert generation.status == 'ready'
+    # writes go to the manager's active engine, never one picked up before the swap
+    assert manager.write(lambda engine: engine) == 'second'
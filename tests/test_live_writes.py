@@ -0,0 +1,92 @@
+import json
+from src.ann import IndexConfig
+from src.storage import IndexStore, WriteJournal, open_search
+from tests.conftest import FakeEncoder, build_search, make_player, result_ids
+
+
+def test_upsert_adds_a_searchable_player(search):
+    search.upsert_player(make_player('9', 'Jude Bellingham', 20, 'England', 'Midfielder', 'Real Madrid'))
+
+    assert search.embedding_engine.live_count == 9
+    assert result_ids(search.hybrid_search('Jude Bellingham', top_k=1)) == ['9']
+    assert '9' in result_ids(search.semantic_search('Bellingham England midfielder', top_k=3))
+
+
+def test_upsert_replaces_the_previous_version(search):
+    search.upsert_player(make_player('1', 'Lionel Messi', 37, 'Argentina', 'Forward', 'Barcelona'))
+
+    engine = search.embedding_engine
+    assert engine.live_count == 8
+    assert engine.player_metadata.record(engine.id_to_row['1'])['current_club']['clubName'] == 'Barcelona'
+    assert result_ids(search.semantic_search('Lionel Messi', top_k=8)).count('1') == 1
+
+
+def test_deleted_players_leave_every_search(search):
+    assert search.delete_player('2')
+    assert not search.delete_player('2')
+
+    assert '2' not in result_ids(search.hybrid_search('Haaland Manchester City', top_k=8))
+    assert '2' not in result_ids(search.semantic_search('Haaland', top_k=8))
+    assert '2' not in result_ids(search.hybrid_search('striker', top_k=8, filters={'position': 'Forward'}))
+    assert search.suggest('Haaland') == []
+
+
+def test_compaction_drops_tombstones_and_keeps_results(search):
+    search.delete_player('3')
+    search.upsert_player(make_player('9', 'Jude Bellingham', 20, 'England', 'Midfielder', 'Real Madrid'))
+    before = search.hybrid_search('Real Madrid midfielder', top_k=5)
+
+    assert search.compact()
+    engine = search.embedding_engine
+    assert engine.deleted == set()
+    assert len(engine.player_ids) == engine.live_count == 8
+    assert search.keyword_index.num_docs == 8
+    assert result_ids(search.hybrid_search('Real Madrid midfielder', top_k=5)) == result_ids(before)
+
+
+def test_journal_replays_the_last_write_per_player(tmp_path, players):
+    journal = WriteJournal(str(tmp_path / 'journal.jsonl'))
+    journal.append('upsert', '9', make_player('9', 'Jude Bellingham', 20, 'England', 'Midfielder', 'Real Madrid'))
+    journal.append('delete', '2')
+    journal.append('upsert', '2', make_player('2', 'Erling Haaland', 24, 'Norway', 'Forward', 'Manchester City'))
+    journal.append('delete', '9')
+    with open(journal.path, 'a', encoding='utf-8') as file:
+        file.write('{"op": "upsert", "player_id": "10", "pla')  # cut off by a crash
+
+    search = build_search(players)
+    assert journal.replay(search) == 2
+
+    engine = search.embedding_engine
+    assert '9' not in engine.id_to_row
+    assert engine.player_metadata.record(engine.id_to_row['2'])['age'] == 24
+    assert engine.live_count == 8
+
+
+def test_journal_is_dropped_once_the_data_file_changes(tmp_path, players):
+    data_path = str(tmp_path / 'players.json')
+    store = IndexStore(str(tmp_path / 'index_store'))
+    journal = WriteJournal(str(tmp_path / 'journal.jsonl'))
+
+    def open_data(data):
+        with open(data_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        search = open_search(data_path, store, 'fake-encoder', model=FakeEncoder(),
+                             index_config=IndexConfig(backend='flat'))
+        return search, journal.replay(search)
+
+    search, _ = open_data(players)
+    search.upsert_player(make_player('1', 'Lionel Messi', 37, 'Argentina', 'Forward', 'Barcelona'))
+    journal.append('upsert', '1', make_player('1', 'Lionel Messi', 37, 'Argentina', 'Forward', 'Barcelona'))
+    search.delete_player('2')
+    journal.append('delete', '2')
+
+    assert open_data(players)[1] == 2  # same data file: the writes still apply
+
+    refreshed = [dict(player) for player in players]
+    refreshed[0] = make_player('1', 'Lionel Messi', 38, 'Argentina', 'Forward', 'Inter Miami')
+    search, replayed = open_data(refreshed)
+    engine = search.embedding_engine
+    assert replayed == 0
+    assert journal.entries() == []
+    assert engine.player_metadata.record(engine.id_to_row['1'])['age'] == 38
+    assert '2' in engine.id_to_row
@@ -0,0 +1,78 @@
+import pytest
+from src.names import PREFIX_SCAN_LIMIT, NameIndex
+from tests.conftest import PLAYERS, make_player
+
+EXTRA = [
+    make_player('9', 'Ben Whiteman', 27, 'England', 'Midfielder', 'Preston'),
+    make_player('10', 'Ben White', 26, 'England', 'Defender', 'Arsenal'),
+    make_player('11', 'Benjamin Pavard', 28, 'France', 'Defender', 'Inter'),
+    make_player('12', 'Kevin Benson', 30, 'England', 'Forward', 'Benfica'),
+    make_player('13', 'Bernardo Silva', 29, 'Portugal', 'Midfielder', 'Manchester City'),
+]
+
+
+def names(suggestions):
+    return [suggestion['name'] for suggestion in suggestions]
+
+
+@pytest.fixture(params=['built', 'loaded'])
+def index(request, tmp_path):
+    built = NameIndex().build((player['playerId'], player) for player in PLAYERS + EXTRA)
+    if request.param == 'built':
+        return built
+    built.save(str(tmp_path))
+    return NameIndex.load(str(tmp_path))
+
+
+def test_suggestions_rank_exact_then_prefix_then_typos(index):
+    # names starting with the query first, shorter ones ahead, then later words
+    assert names(index.suggest('ben')) == ['Benfica', 'Ben White', 'Ben Whiteman', 'Benjamin Pavard', 'Kevin Benson']
+    ranked = index.suggest('Ben White')
+    assert names(ranked) == ['Ben White', 'Ben Whiteman']
+    assert [suggestion['match'] for suggestion in ranked] == ['exact', 'prefix']
+    assert ranked[0] == {'type': 'player', 'name': 'Ben White', 'match': 'exact', 'player_id': '10',
+                         'club': 'Arsenal'}
+
+    fuzzy = index.suggest('Haalnd')
+    assert names(fuzzy) == ['Erling Haaland'] and fuzzy[0]['match'] == 'fuzzy'
+    # prefix matches come before typo matches of the same query
+    assert names(index.suggest('bernard', limit=3)) == ['Bernardo Silva']
+    assert names(index.suggest('ben', limit=2)) == ['Benfica', 'Ben White']
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('', []),
+    ('  -- ', []),
+    ('ÁLISSON', ['Alisson Becker']),  # case and accents fold away
+    ('van-dijk', ['Virgil van Dijk']),  # punctuation is a word boundary
+    ('virgil   van', ['Virgil van Dijk']),
+    ('lionel ', ['Lionel Messi']),
+    ('irgil', []),  # only word starts complete, a wrong first letter is not corrected
+    ('manchester c', ['Manchester City']),
+])
+def test_prefix_edge_cases(index, query, expected):
+    assert names(index.suggest(query)) == expected
+
+
+def test_deleted_and_renamed_players_are_skipped(index, tmp_path):
+    assert names(index.suggest('ben white', is_live=lambda player_id: player_id != '10')) == ['Ben Whiteman']
+    assert index.exact_players('BEN white') == ['10']
+
+    built = NameIndex().build((player['playerId'], player) for player in PLAYERS)
+    built.add('2', make_player('2', 'Erling Braut Haaland', 23, 'Norway', 'Forward', 'Manchester City'))
+    built.save(str(tmp_path / 'renamed'))
+    for renamed in (built, NameIndex.load(str(tmp_path / 'renamed'))):
+        assert names(renamed.suggest('erling')) == ['Erling Braut Haaland']
+        assert renamed.exact_players('Erling Haaland') == []
+
+
+def test_loaded_index_suggests_like_the_built_one(tmp_path):
+    players = [make_player(str(i), f"Player {('Kevin', 'Karim')[i % 3 == 0]} {i % 97}", 25, 'Spain', 'Forward',
+                           f'Club {i % 13}') for i in range(8 * PREFIX_SCAN_LIMIT)]
+    built = NameIndex().build((player['playerId'], player) for player in players)
+    built.save(str(tmp_path))
+    loaded = NameIndex.load(str(tmp_path))
+
+    # 'kevn' matches more names than the typo scan keeps, both must keep the same ones
+    for query in ('p', 'player k', 'kevin 1', 'kevn', 'karm 5', 'club 1', 'plyer'):
+        assert loaded.suggest(query) == built.suggest(query), query
@@ -0,0 +1,99 @@
+import json
+import pytest
+import src.player_store
+from src.player_store import SUMMARY_FIELDS, PlayerStore
+from tests.conftest import PLAYERS, make_player
+
+
+def players():
+    odd = [
+        {'playerId': '9', 'fullName': 'No Stats', 'age': 1, 'heightCm': 1.0, 'active': True},
+        {'playerId': '10', 'fullName': 'Odd Stats', 'season_statistics': 'n/a', 'age': 1.0},
+    ]
+    many = make_player('11', 'Two Seasons', 27, 'Italy', 'Defender', 'Inter')
+    many['season_statistics'] = many['season_statistics'] + [{'seasonId': 2022, 'goals': 1, 'rating': None}]
+    return [dict(player) for player in PLAYERS] + odd + [many]
+
+
+def build(records):
+    store = PlayerStore()
+    store.extend([record['playerId'] for record in records], records)
+    return store
+
+
+def assert_same(record, expected):
+    assert record == expected
+    # 1, 1.0 and True are equal but must keep their type
+    assert {name: type(value) for name, value in record.items()} == {
+        name: type(value) for name, value in expected.items()}
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+def test_saved_store_loads_the_same_records(tmp_path, monkeypatch, mapped):
+    if mapped:  # serve every column from the mapped values file
+        monkeypatch.setattr(src.player_store, 'MAPPED_VALUES_MIN', 1)
+    records = players()
+    build(records).save(str(tmp_path))
+
+    loaded = PlayerStore.load(str(tmp_path), [record['playerId'] for record in records])
+    assert len(loaded) == len(records)
+    for record in records:
+        assert_same(loaded[record['playerId']], record)
+        assert json.loads(loaded.get_fragment(record['playerId'])) == record
+    assert loaded.get('missing') is None
+
+
+def test_projection_decodes_only_the_named_fields():
+    store = build(players())
+
+    assert store.record(0, fields=SUMMARY_FIELDS) == {
+        'playerId': '1', 'fullName': 'Lionel Messi', 'current_club': {'clubName': 'Inter Miami'},
+        'position': 'Forward', 'nationality': 'Argentina',
+    }
+    assert store.record(0, fields=['current_club.missing', 'nationality_details.demonym', 'age']) == {
+        'nationality_details': {'demonym': 'Argentinian'}, 'age': 36,
+    }
+    assert store.record(8, fields=SUMMARY_FIELDS) == {'playerId': '9', 'fullName': 'No Stats'}
+    assert store.record(10, fields=['season_statistics'])['season_statistics'][1]['rating'] is None
+
+    summary = store.record(0, detail=False)
+    assert 'season_statistics' not in summary and summary['current_club'] == {'clubName': 'Inter Miami'}
+
+
+def test_appending_to_a_loaded_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.player_store, 'MAPPED_VALUES_MIN', 1)
+    records = players()
+    build(records).save(str(tmp_path))
+    store = PlayerStore.load(str(tmp_path), [record['playerId'] for record in records])
+
+    new = make_player('12', 'Lionel Messi', 36, 'Argentina', 'Forward', 'Inter Miami')
+    new['age'] = {'years': 36}  # turns a plain column into JSON text
+    new['agent'] = 'someone'  # a column no earlier row has
+    assert store.append('12', new) == len(records)
+    replacement = dict(records[0], age=37)
+    store.append('1', replacement)  # a repeated id points at its last row
+
+    assert_same(store['12'], new)
+    assert_same(store['1'], replacement)
+    assert store.record(0) == records[0]
+    assert 'agent' not in store['2'] and store['2']['age'] == 23
+    assert len(store) == len(records) + 1 and store.num_rows == len(records) + 2
+
+
+def test_compact_renumbers_rows_and_their_seasons():
+    records = players()
+    store = build(records)
+    stale = store.get_fragment('11')
+    for player_id in ('1', '4', '9'):
+        assert store.remove(player_id) is not None
+    assert store.remove('1') is None and '1' not in store
+
+    keep = sorted(store.id_to_row.values())
+    store.compact(keep)
+
+    assert store.ids == [records[row]['playerId'] for row in keep]
+    assert store.num_rows == len(store) == len(records) - 3
+    for row in keep:
+        assert_same(store[records[row]['playerId']], records[row])
+    assert store.get_fragment('11') == stale  # row moved, the fragment is encoded again
+    assert len(store['11']['season_statistics']) == 2 and store.get('1') is None
@@ -0,0 +1,46 @@
+import pytest
+
+
+@pytest.fixture
+def parse(search):
+    return lambda query: search.query_parser.parse(query).filters
+
+
+def test_gazetteer_and_age_bound(parse):
+    filters = parse('left-footed Brazilian strikers under 25')
+    assert filters == {'preferred_foot': ['left'], 'position': ['forward'], 'max_age': 24}
+
+
+def test_stat_counts_are_not_ages(parse):
+    filters = parse('midfielders under 25 with more than 30 assists')
+    assert filters['max_age'] == 24
+    assert 'min_age' not in filters
+
+    assert 'min_age' not in parse('defenders over 20 appearances')
+    assert 'min_age' not in parse('forwards over 20 league goals')
+
+
+def test_age_cues(parse):
+    assert parse('strikers over 30 years old')['min_age'] == 31
+    assert parse('players aged over 30')['min_age'] == 31
+    assert parse('keepers under 25 yo')['max_age'] == 24
+    assert parse('defenders aged 20 to 25') == {'position': ['defender'], 'min_age': 20, 'max_age': 25}
+    assert 'min_age' not in parse('forwards with between 20 and 30 goals')
+
+
+def test_inclusive_bounds(parse):
+    assert parse('players at least 30 years old')['min_age'] == 30
+    assert parse('players at most 21')['max_age'] == 21
+    assert parse('forwards with at least 10 goals')['min_career_goals'] == 10
+    assert parse('forwards with over 10 goals')['min_career_goals'] == 11
+    assert parse('defenders taller than 190cm')['min_height'] == 191
+
+
+@pytest.mark.parametrize('bound, field, value', [
+    ('under', 'max', 24), ('less than', 'max', 24), ('up to', 'max', 25), ('at most', 'max', 25),
+    ('over', 'min', 26), ('more than', 'min', 26), ('at least', 'min', 25),
+])
+def test_every_bound_means_the_same_for_every_attribute(parse, bound, field, value):
+    assert parse(f'players {bound} 25')[f'{field}_age'] == value
+    assert parse(f'players with {bound} 25 goals')[f'{field}_career_goals'] == value
+    assert parse(f'players {bound} 185cm')[f'{field}_height'] == value + 160
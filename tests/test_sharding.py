@@ -0,0 +1,20 @@
+from src.sharding import ShardService
+from tests.conftest import build_search, make_player
+
+
+def test_keyword_stats_count_live_players_only(players):
+    service = ShardService(build_search(players))
+    assert service.search.delete_player('3')
+    service.search.upsert_player(make_player('9', 'Jude Bellingham', 20, 'England', 'Midfielder', 'Real Madrid'))
+    service.search.upsert_player(make_player('1', 'Lionel Messi', 37, 'Argentina', 'Forward', 'Barcelona'))
+
+    live = [player for player in players if player['playerId'] not in ('1', '3')] + [
+        make_player('9', 'Jude Bellingham', 20, 'England', 'Midfielder', 'Real Madrid'),
+        make_player('1', 'Lionel Messi', 37, 'Argentina', 'Forward', 'Barcelona'),
+    ]
+    expected = build_search(live).keyword_index.collection_stats()
+
+    stats = service.keyword_stats()
+    assert stats['num_docs'] == expected['num_docs'] == 8
+    assert stats['total_length'] == expected['total_length']
+    assert stats['document_frequencies'] == expected['document_frequencies']
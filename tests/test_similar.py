@@ -0,0 +1,25 @@
+from tests.conftest import make_player, result_ids
+
+
+def test_filters_left_with_only_deleted_players_return_nothing(search):
+    assert search.delete_player('6')  # the only goalkeeper
+
+    assert search.semantic_search('goalkeeper', top_k=5, filters={'position': 'Goalkeeper'}) == []
+    assert search.hybrid_search('goalkeeper', top_k=5, filters={'position': 'Goalkeeper'}) == []
+    assert search.similar_players('3', k=5, filters={'position': 'Goalkeeper'}) == []
+
+
+def test_similar_excludes_the_player_itself(search):
+    search.embedding_engine.build_neighbor_graph(k=3)
+
+    ranked = result_ids(search.similar_players('4', k=3))
+    assert len(ranked) == 3 and '4' not in ranked
+    assert search.similar_players('unknown') is None
+
+
+def test_similar_lists_players_upserted_after_the_graph_build(search):
+    search.embedding_engine.build_neighbor_graph(k=2)
+    search.upsert_player(make_player('9', 'Kevin De Bruyne Junior', 19, 'Belgium', 'Midfielder', 'Manchester City',
+                                     181.0, 'Right', 7, 18, 'Belgian'))
+
+    assert result_ids(search.similar_players('4', k=2))[0] == '9'
@@ -0,0 +1,39 @@
+import os
+import json
+import faiss
+from src.ann import IndexConfig
+from src.embedding import PlayerEmbeddingEngine
+from src.storage import IndexStore, open_search
+from tests.conftest import PLAYERS, FakeEncoder, result_ids
+
+
+def test_read_only_worker_serves_what_the_build_wrote(tmp_path):
+    data_path = str(tmp_path / 'players.json')
+    with open(data_path, 'w', encoding='utf-8') as file:
+        json.dump(PLAYERS, file)
+    store = IndexStore(str(tmp_path / 'index_store'))
+
+    def open_store(read_only):
+        return open_search(data_path, store, 'fake-encoder', model=FakeEncoder(),
+                           index_config=IndexConfig(backend='flat'), neighbor_k=3, read_only=read_only)
+
+    built = open_store(read_only=False)
+    loaded = open_store(read_only=True)
+
+    assert not any(name.endswith('.tmp') for _, _, names in os.walk(store.path) for name in names)
+    for query in ('Liverpool defender', 'Lionel Messi', 'Brazilian'):
+        assert result_ids(loaded.hybrid_search(query, 3)) == result_ids(built.hybrid_search(query, 3))
+    assert result_ids(loaded.similar_players('4', 3)) == result_ids(built.similar_players('4', 3))
+    assert loaded.select({'position': 'Defender'}).tolist() == built.select({'position': 'Defender'}).tolist()
+    assert loaded.embedding_engine.player_metadata.record(0)['fullName'] == 'Lionel Messi'
+
+
+def test_read_only_load_says_when_faiss_cannot_map_vectors(tmp_path, monkeypatch, capsys, search):
+    store = IndexStore(str(tmp_path / 'index_store'))
+    store.save(search.embedding_engine, source_checksum='x')
+    monkeypatch.delattr(faiss, 'IO_FLAG_MMAP_IFC', raising=False)
+
+    engine = PlayerEmbeddingEngine('fake-encoder', model=FakeEncoder(), index_config=IndexConfig(backend='flat'))
+    store.load(engine, read_only=True)
+    assert 'cannot memory-map' in capsys.readouterr().out
+    assert engine.index.ntotal == len(PLAYERS)
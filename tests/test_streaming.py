@@ -0,0 +1,18 @@
+import os
+from src.streaming import merge_numbered, partition_of, read_jsonl, spill
+
+
+def test_spill_and_merge_stay_within_the_open_file_limit(tmp_path):
+    directory = str(tmp_path)
+    records = [{'playerId': player_id, 'name': f'player {player_id}'} for player_id in range(500)]
+
+    paths = spill(iter(records), directory, 'players', 11, numbered=True, max_open=3)
+    assert len(paths) == 11
+    for partition, path in enumerate(paths):
+        numbered = list(read_jsonl(path))
+        assert all(partition_of(record['playerId'], 11) == partition for _, record in numbered)
+        assert [sequence for sequence, _ in numbered] == sorted(sequence for sequence, _ in numbered)
+
+    merged = list(merge_numbered(paths, directory, max_open=3))
+    assert [record for _, record in merged] == records
+    assert not any(name.endswith('.group') for name in os.listdir(directory))